@@ -1,132 +1,38 @@
 import streamlit as st
-import gspread
 import pandas as pd
 from datetime import datetime, timedelta
 import pytz
 import json
 import requests
-import random
 import time
-from pathlib import Path
+from data_layer import append_row, get_records_df, invalidate, update_range
+import archive
+import schema
+import theme
+import storage
+import journal
+import perf
+import metrics
 st.set_page_config(page_title="Client Management System — Techware Hub", layout="wide")
+perf.start_rerun("agent")
 
 # ==============================
-# Load external CSS (theme.css)
+# Theme (CSS compiled once per process; switching reruns only the picker fragment)
 # ==============================
-def load_css():
-    try:
-        css = Path("theme.css").read_text(encoding="utf-8")
-        st.markdown(f"<style>{css}</style>", unsafe_allow_html=True)
-    except Exception as e:
-        st.warning(f"theme.css not found or failed to load: {e}")
-
-load_css()
-
-# ==============================
-# Theme definitions (unchanged)
-# ==============================
-light_themes = {
-    "Sunlit Coral":    {"bg1": "#fff8f2", "bg2": "#ffe8df", "accent": "#ff6f61"},
-    "Skyline Blue":    {"bg1": "#f0f8ff", "bg2": "#dcefff", "accent": "#3b82f6"},
-    "Golden Sand":     {"bg1": "#fffbea", "bg2": "#fff2d1", "accent": "#f59e0b"},
-    "Lilac Mist":      {"bg1": "#faf5ff", "bg2": "#f3e8ff", "accent": "#a78bfa"},
-    "Mint Breeze":     {"bg1": "#f0fff9", "bg2": "#d7fff0", "accent": "#10b981"},
-    "Blush Quartz":    {"bg1": "#fff5f7", "bg2": "#ffe3eb", "accent": "#ec4899"},
-    "Azure Frost":     {"bg1": "#f5fbff", "bg2": "#e0f2fe", "accent": "#0284c7"},
-    "Citrus Bloom":    {"bg1": "#fffef2", "bg2": "#fff8d6", "accent": "#facc15"},
-    "Pearl Sage":      {"bg1": "#f9fff9", "bg2": "#e6f7e6", "accent": "#65a30d"},
-    "Creamy Mocha":    {"bg1": "#fffaf5", "bg2": "#f5ebe0", "accent": "#c08457"},
-}
-dark_themes = {
-    "Midnight Gold":   {"bg1": "#0d0d0d", "bg2": "#1a1a1a", "accent": "#ffd700"},
-    "Obsidian Night":  {"bg1": "#0b0c10", "bg2": "#1f2833", "accent": "#66fcf1"},
-    "Crimson":  {"bg1": "#1c0b0b", "bg2": "#2a0f0f", "accent": "#ff4444"},
-    "Neon Violet":     {"bg1": "#12001e", "bg2": "#1e0033", "accent": "#bb00ff"},
-    "Emerald Abyss":   {"bg1": "#001a14", "bg2": "#00322b", "accent": "#00ff99"},
-    "Cyber Pink":      {"bg1": "#0a0014", "bg2": "#1a0033", "accent": "#ff00aa"},
-    "Deep Ocean":      {"bg1": "#0a1b2a", "bg2": "#0d2c4a", "accent": "#1f8ef1"},
-    "Steel Indigo":    {"bg1": "#0c0f1a", "bg2": "#1c2333", "accent": "#7dd3fc"},
-    "Velvet Crimson":  {"bg1": "#1a0000", "bg2": "#330000", "accent": "#e11d48"},
-    "Arctic Noir":     {"bg1": "#050b12", "bg2": "#0e1822", "accent": "#38bdf8"},
-}
-
-if "theme_mode" not in st.session_state:
-    st.session_state.theme_mode = "Dark"
-if "selected_theme" not in st.session_state:
-    theme_set = dark_themes if st.session_state.theme_mode == "Dark" else light_themes
-    random_theme_name = random.choice(list(theme_set.keys()))
-    st.session_state.selected_theme = random_theme_name
-
-def get_contrast_color(hex_color: str) -> str:
-    hex_color = hex_color.lstrip('#')
-    r, g, b = tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-    brightness = (r * 299 + g * 587 + b * 114) / 1000
-    return "#000000" if brightness > 155 else "#ffffff"
-
-def apply_theme_vars():
-    themes = light_themes if st.session_state.theme_mode == "Light" else dark_themes
-    if st.session_state.selected_theme not in themes:
-        st.session_state.selected_theme = list(themes.keys())[0]
-    selected = themes[st.session_state.selected_theme]
-    bg1, bg2, accent = selected["bg1"], selected["bg2"], selected["accent"]
-    text_color = "#111" if st.session_state.theme_mode == "Light" else "#e6e6e6"
-    st.markdown(
-        f"<style>:root{{--bg1:{bg1};--bg2:{bg2};--accent:{accent};--text:{text_color};}}</style>",
-        unsafe_allow_html=True,
-    )
-    return bg1, bg2, accent, text_color
-
-bg1, bg2, accent, text_color = apply_theme_vars()
-title_text_color = get_contrast_color(accent)
-
-st.markdown(
-    f"""
-<div class="app-title" style="font-size:22px; margin: 12px 0 22px;">
-  Client Management System — Techware Hub
-</div>
-""",
-    unsafe_allow_html=True,
-)
-
-col_tm1, col_tm2, _ = st.columns([1, 1, 6])
-with col_tm1:
-    st.markdown("<div style='display:flex; justify-content:center;'>", unsafe_allow_html=True)
-    if st.button("Light Mode", use_container_width=True):
-        if st.session_state.theme_mode != "Light":
-            st.session_state.theme_mode = "Light"
-            st.session_state.selected_theme = list(light_themes.keys())[0]
-            st.rerun()
-    st.markdown("</div>", unsafe_allow_html=True)
-
-with col_tm2:
-    st.markdown("<div style='display:flex; justify-content:center;'>", unsafe_allow_html=True)
-    if st.button("Dark Mode", use_container_width=True):
-        if st.session_state.theme_mode != "Dark":
-            st.session_state.theme_mode = "Dark"
-            st.session_state.selected_theme = list(dark_themes.keys())[0]
-            st.rerun()
-    st.markdown("</div>", unsafe_allow_html=True)
-
-themes = light_themes if st.session_state.theme_mode == "Light" else dark_themes
-
-cols_palette = st.columns(len(themes))
-for i, (theme_name, data) in enumerate(themes.items()):
-    if cols_palette[i].button(theme_name.replace(" ", "\n"), key=f"theme_{theme_name}"):
-        if st.session_state.selected_theme != theme_name:
-            st.session_state.selected_theme = theme_name
-            st.rerun()
+theme.apply_theme()
 
 tz = pytz.timezone("Asia/Karachi")
 
 # --- GOOGLE SHEET SETUP ---
-creds = st.secrets["gcp_service_account"]
-gc = gspread.service_account_from_dict(creds)
+# Google Sheets in production; [storage] in secrets / TWH_STORAGE selects sqlite or memory offline
 SHEET_NAME = "Company_Transactions"
-worksheet = gc.open(SHEET_NAME).sheet1
+sh = storage.open_spreadsheet(SHEET_NAME, storage.secrets_config(st.secrets))
+journal.attach(sh)  # status / field changes are journaled to the "Journal" worksheet
+worksheet = sh.sheet1
 
-AGENTS = ["Select Agent", "Arham Kaleem", "Arham Ali", "Haziq"]
-LLC_OPTIONS = ["Select LLC", "Visionary Pathways"]
-PROVIDERS = ["Select Provider", "Spectrum", "Insurance", "Xfinity", "Frontier", "Optimum"]
+AGENTS = ["Select Agent"] + schema.AGENTS
+LLC_OPTIONS = ["Select LLC"] + schema.AGENT_LLCS
+PROVIDERS = ["Select Provider"] + schema.PROVIDERS
 
 def clear_form():
     st.session_state.agent_name = "Select Agent"
@@ -150,18 +56,20 @@ def clear_form():
 col_button1, col_button2 = st.columns(2)
 with col_button1:
     if st.button("Refresh Page"):
+        invalidate(worksheet)
         st.rerun()
 with col_button2:
     if st.button("Clear Form"):
         clear_form()
 
+perf.lap("Theme & setup", "render")
+
 # --- FORM ---
 st.title("Client Management System")
 st.write("Fill out all client details below:")
 
 try:
-    all_records = worksheet.get_all_records()
-    df_all = pd.DataFrame(all_records) if all_records else pd.DataFrame()
+    df_all = get_records_df(worksheet)
 except Exception as e:
     st.error(f"Error loading sheet data: {e}")
     df_all = pd.DataFrame()
@@ -188,78 +96,42 @@ with st.form("transaction_form"):
     submitted = st.form_submit_button("Submit")
 
 if submitted:
-    missing_fields = []
-
-    record_id_input = st.session_state.get("order_id", "").strip()
-    if not record_id_input:
-        missing_fields.append("Order ID")
-
-    if not df_all.empty and record_id_input in df_all["Record_ID"].values:
-        st.error("Order ID already exists. Please enter a unique Order ID.")
-        st.stop()
-
-    agent_name = st.session_state.get("agent_name", "Select Agent")
-    name = st.session_state.get("name", "")
-    phone = st.session_state.get("phone", "")
-    address = st.session_state.get("address", "")
-    email = st.session_state.get("email", "")
-    card_holder = st.session_state.get("card_holder", "")
-    card_number = st.session_state.get("card_number", "")
-    expiry = st.session_state.get("expiry", "")
-    charge = st.session_state.get("charge", "")
-    llc = st.session_state.get("llc", "Select LLC")
-    provider = st.session_state.get("provider", "Select Provider")
-    date_of_charge = st.session_state.get("date_of_charge", datetime.now().date())
-    pin_code = st.session_state.get("pin_code", "").strip()
-
-    # Required fields validation
-    if agent_name == "Select Agent": missing_fields.append("Agent Name")
-    if not name: missing_fields.append("Client Name")
-    if not phone: missing_fields.append("Phone Number")
-    if not address: missing_fields.append("Address")
-    if not email: missing_fields.append("Email")
-    if not card_holder: missing_fields.append("Card Holder Name")
-    if not card_number: missing_fields.append("Card Number")
-    if not expiry: missing_fields.append("Expiry Date")
-    if not charge: missing_fields.append("Charge Amount")
-    if llc == "Select LLC": missing_fields.append("LLC")
-    if provider == "Select Provider": missing_fields.append("Provider")
-
-    # PIN Code validation conditional on provider
-    if provider == "Spectrum":
-        if not (pin_code.isdigit() and len(pin_code) == 4):
-            st.error("PIN Code must be exactly 4 digits when Provider is Spectrum.")
-            st.stop()
-    else:
-        pin_code = "Nil"
-
-    if missing_fields:
-        st.error(f"Please fill in all required fields: {', '.join(missing_fields)}")
-        st.stop()
-
-    # Clean formatting
-    card_number = card_number.replace(" ", "").replace("-", "")
-    expiry = expiry.replace("/", "").replace("-", "").replace(" ", "")
-
-    # Format Charge
-    try:
-        charge_value = float(charge.replace("$", "").strip())
-        charge = f"${charge_value:.2f}"
-    except ValueError:
-        st.error("Charge amount must be numeric (e.g., 29 or 29.00).")
+    record, errors = schema.validate_record(
+        {
+            "Record_ID": st.session_state.get("order_id", ""),
+            "Agent Name": st.session_state.get("agent_name", "Select Agent"),
+            "Name": st.session_state.get("name", ""),
+            "Ph Number": st.session_state.get("phone", ""),
+            "Address": st.session_state.get("address", ""),
+            "Email": st.session_state.get("email", ""),
+            "Card Holder Name": st.session_state.get("card_holder", ""),
+            "Card Number": st.session_state.get("card_number", ""),
+            "Expiry Date": st.session_state.get("expiry", ""),
+            "CVC": cvc,
+            "Charge": st.session_state.get("charge", ""),
+            "LLC": st.session_state.get("llc", "Select LLC"),
+            "Provider": st.session_state.get("provider", "Select Provider"),
+            "Date of Charge": st.session_state.get("date_of_charge", datetime.now().date()),
+            "Status": "Pending",
+            "Timestamp": datetime.now(tz).strftime("%Y-%m-%d %I:%M:%S %p"),
+            "PIN CODE": st.session_state.get("pin_code", ""),
+        },
+        "Sheet1",
+        existing_ids=df_all["Record_ID"].astype(str) if not df_all.empty else None,
+        choices={"LLC": schema.AGENT_LLCS},
+    )
+    if errors:
+        for message in errors:
+            st.error(message)
         st.stop()
 
-    record_id = record_id_input.strip()
-    timestamp = datetime.now(tz).strftime("%Y-%m-%d %I:%M:%S %p")
-
-    data = [
-        record_id, agent_name, name, phone, address, email, card_holder,
-        card_number, expiry, cvc, charge, llc, provider,
-        date_of_charge.strftime("%Y-%m-%d"), "Pending", timestamp,
-        pin_code
-    ]
+    agent_name, name, phone = record["Agent Name"], record["Name"], record["Ph Number"]
+    address, email, card_holder = record["Address"], record["Email"], record["Card Holder Name"]
+    card_number, expiry, cvc, charge = record["Card Number"], record["Expiry Date"], record["CVC"], record["Charge"]
+    llc, provider, date_of_charge = record["LLC"], record["Provider"], record["Date of Charge"]
+    data = schema.to_row(record, "Sheet1")
 
-    worksheet.append_row(data)
+    append_row(worksheet, data)
     st.success(f"Details for {name} added successfully!")
 
     try:
@@ -279,14 +151,15 @@ if submitted:
         CVC: {cvc}
         LLC: {llc}
         Provider: {provider}
-        Date of Charge: {date_of_charge.strftime("%Y-%m-%d")}
+        Date of Charge: {date_of_charge}
         Submitted At: {datetime.now(tz).strftime("%Y-%m-%d %I:%M:%S %p")}
         """
-        response = requests.post(
-            "https://api.pushbullet.com/v2/pushes",
-            headers={"Access-Token": token, "Content-Type": "application/json"},
-            json={"type": "note", "title": title, "body": body.strip()}
-        )
+        with metrics.pushbullet_timer():
+            response = requests.post(
+                "https://api.pushbullet.com/v2/pushes",
+                headers={"Access-Token": token, "Content-Type": "application/json"},
+                json={"type": "note", "title": title, "body": body.strip()}
+            )
         if response.status_code == 200:
             st.info("Notification sent successfully!")
         else:
@@ -294,6 +167,7 @@ if submitted:
     except Exception as e:
         st.error(f"Error sending Pushbullet notification: {e}")
 
+perf.lap("Submit form", "render")
 DELETE_AFTER_MINUTES = 20
 st.divider()
 st.subheader("Edit Lead")
@@ -341,15 +215,22 @@ elif mode.startswith("All-time"):
     record_id_value = record["Record_ID"] if record and "Record_ID" in record else ""
     record_id_input = st.text_input("Order ID", value=record_id_value)
 
-    if record_id_input and not df_all.empty:
+    if record_id_input:
         # Normalize types
-        df_all["Record_ID"] = df_all["Record_ID"].astype(str).str.strip()
         record_id_input = str(record_id_input).strip()
+        if not df_all.empty:
+            df_all["Record_ID"] = df_all["Record_ID"].astype(str).str.strip()
 
-        if record_id_input in df_all["Record_ID"].values:
+        if not df_all.empty and record_id_input in df_all["Record_ID"].values:
             record = df_all[df_all["Record_ID"] == record_id_input].iloc[0]
         else:
-            st.warning("No matching Record ID found.")
+            # Settled leads older than the archive window live in monthly partitions
+            archived = archive.find_record(worksheet.title, record_id_input, sh)
+            if not archived.empty:
+                st.info(f"Order ID {record_id_input} is archived ({archived['Partition'].iloc[0]}); archived leads are read-only.")
+                st.dataframe(archived.drop(columns=["Partition"]))
+            else:
+                st.warning("No matching Record ID found.")
 
 # --- EDIT FORM ---
 if record is not None:
@@ -421,54 +302,35 @@ if record is not None:
         updated = st.form_submit_button("Update Lead")
 
     if updated:
-        # Mandatory field validation (except PIN Code)
-        missing_fields = []
-        if new_agent_name == "Select Agent": missing_fields.append("Agent Name")
-        if not new_name.strip(): missing_fields.append("Client Name")
-        if not new_phone.strip(): missing_fields.append("Phone Number")
-        if not new_address.strip(): missing_fields.append("Address")
-        if not new_email.strip(): missing_fields.append("Email")
-        if not new_card_holder.strip(): missing_fields.append("Card Holder Name")
-        if not new_card_number.strip(): missing_fields.append("Card Number")
-        if not new_expiry.strip(): missing_fields.append("Expiry Date")
-        if not new_cvc.strip(): missing_fields.append("CVC")
-        if not new_charge.strip(): missing_fields.append("Charge Amount")
-        if new_llc == "Select LLC": missing_fields.append("LLC")
-        if new_provider == "Select Provider": missing_fields.append("Provider")
-        # Date of Charge is selected by default, so no need to check empty.
-
-        if missing_fields:
-            st.error(f"Please fill in all required fields: {', '.join(missing_fields)}")
-            st.stop()
-
-        # PIN code validation
-        if new_provider == "Spectrum":
-            if not (new_pin_code.isdigit() and len(new_pin_code) == 4):
-                st.error("PIN Code must be exactly 4 digits when Provider is Spectrum.")
-                st.stop()
-        else:
-            new_pin_code = "Nil"
-
         # Determine timestamp to save
         if selected_timestamp_option == "Update Timestamp":
             new_timestamp = datetime.now(tz).strftime("%Y-%m-%d %I:%M:%S %p")
         else:
             new_timestamp = selected_timestamp_option
 
+        updated_record, errors = schema.validate_record(
+            {
+                "Record_ID": record["Record_ID"], "Agent Name": new_agent_name, "Name": new_name,
+                "Ph Number": new_phone, "Address": new_address, "Email": new_email,
+                "Card Holder Name": new_card_holder, "Card Number": new_card_number,
+                "Expiry Date": new_expiry, "CVC": new_cvc, "Charge": new_charge, "LLC": new_llc,
+                "Provider": new_provider, "Date of Charge": new_date_of_charge,
+                "Status": new_status, "Timestamp": new_timestamp, "PIN CODE": new_pin_code,
+            },
+            "Sheet1",
+            choices={"LLC": schema.AGENT_LLCS},
+        )
+        if errors:
+            for message in errors:
+                st.error(message)
+            st.stop()
+
         try:
             row_index = df_all.index[df_all["Record_ID"] == record["Record_ID"]].tolist()
             if row_index:
                 row_num = row_index[0] + 2  # Sheet rows start at 1, plus header row
 
-                updated_data = [
-                    record["Record_ID"], new_agent_name, new_name, new_phone, new_address, new_email,
-                    new_card_holder, new_card_number, new_expiry, new_cvc, new_charge,
-                    new_llc, new_provider, new_date_of_charge.strftime("%Y-%m-%d"),
-                    new_status, new_timestamp,
-                    new_pin_code
-                ]
-
-                worksheet.update(f"A{row_num}", [updated_data])
+                update_range(worksheet, schema.row_range("Sheet1", row_num), [schema.to_row(updated_record, "Sheet1")], key=record["Record_ID"])
                 st.success(f"Lead for {new_name} updated successfully!")
                 st.rerun()
             else:
@@ -477,6 +339,7 @@ if record is not None:
             st.error(f"Error updating lead: {e}")
 
 
+perf.lap("Edit lead", "render")
 from datetime import datetime, time, timedelta
 import pytz
 import pandas as pd
@@ -526,51 +389,47 @@ if not df_all.empty:
 else:
     total_night_charge_str = "$0.00"
 
-amount_text_color = get_contrast_color(accent)
-label_text_color = get_contrast_color(accent)
-
-# --- NIGHT WINDOW TOTAL WIDGET ---
-amount_text_color = get_contrast_color(accent)
-label_text_color = get_contrast_color(accent)
-
+# --- NIGHT WINDOW TOTAL WIDGET (colours from the theme's CSS variables) ---
 st.markdown(f"""
 <div style="
     position: fixed;
     top: 20px;
     right: 30px;
-    background: {accent};
+    background: var(--accent);
     padding: 16px 24px;
     border-radius: 16px;
     font-size: 18px;
     font-weight: 700;
-    box-shadow: 0 8px 24px {accent}77;
+    box-shadow: 0 8px 24px color-mix(in srgb, var(--accent) 47%, transparent);
     z-index: 9999;
     text-align: center;
     transition: all 0.3s ease;
     backdrop-filter: blur(6px);
 ">
     <!-- Label -->
-    <div style='font-size:14px; opacity:0.85; color:{label_text_color}; margin-bottom:2px;'>
+    <div style='font-size:14px; opacity:0.85; color:var(--on-accent); margin-bottom:2px;'>
         🌙 Night Charged Total
     </div>
     <!-- Sub-label -->
-    <div style='font-size:12px; opacity:0.75; color:{label_text_color}; margin-bottom:4px;'>
+    <div style='font-size:12px; opacity:0.75; color:var(--on-accent); margin-bottom:4px;'>
         Today's Total
     </div>
     <!-- Amount -->
-    <div style='font-size:26px; font-weight:800; color:{amount_text_color};'>
+    <div style='font-size:26px; font-weight:800; color:var(--on-accent);'>
         {total_night_charge_str}
     </div>
 </div>
 
 <style>
 @keyframes pulseGlow {{
-    0% {{ box-shadow: 0 0 0px {accent}44; }}
-    50% {{ box-shadow: 0 0 20px {accent}aa; }}
-    100% {{ box-shadow: 0 0 0px {accent}44; }}
+    0% {{ box-shadow: 0 0 0px color-mix(in srgb, var(--accent) 27%, transparent); }}
+    50% {{ box-shadow: 0 0 20px color-mix(in srgb, var(--accent) 67%, transparent); }}
+    100% {{ box-shadow: 0 0 0px color-mix(in srgb, var(--accent) 27%, transparent); }}
 }}
 div[style*="{total_night_charge_str}"] {{
     animation: pulseGlow 2s infinite;
 }}
 </style>
 """, unsafe_allow_html=True)
+perf.lap("Night badge", "parse")
+perf.finish_rerun()
@@ -0,0 +1,316 @@
+# archive.py
+# Time-partitioned archival of old transactions.
+#
+# Sheet1 / Sheet2 only need recent rows for the pending queues and the night badge, so settled
+# history is moved out of the live worksheets: rows older than --days whose Status is no longer
+# Pending go into one partition per month, either
+#   parquet : <TWH_ARCHIVE_DIR>/<sheet>/<YYYY-MM>.parquet   (default, local disk)
+#   sheets  : an "Archive <sheet> <YYYY-MM>" worksheet in the same spreadsheet
+# catalog.json in TWH_ARCHIVE_DIR lists every partition with its Timestamp range and Record_ID
+# range, so readers open only the partitions that can hold what they ask for:
+#   find_record(sheet, record_id, sh)   "All-time - Record ID" lookups
+#   load_range(sheet, start, end, sh)   analytics date ranges reaching before the live sheet
+# Archived rows are kept exactly as the sheet stored them (strings) and are read-only.
+#
+# Partitions are written and the catalog saved before any live row is deleted, and a rerun never
+# duplicates rows already archived, so an interrupted job is safe to run again.
+#
+# Usage (cron, after the shift closes):
+#   python archive.py --days 30 --creds service_account.json
+#   python archive.py --days 30 --target sheets --dry-run
+
+import json
+import os
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from functools import lru_cache
+from pathlib import Path
+
+import pandas as pd
+import pytz
+
+import journal
+
+tz = pytz.timezone("Asia/Karachi")
+SHEET_NAME = "Company_Transactions"
+ARCHIVE_DIR = Path(os.environ.get("TWH_ARCHIVE_DIR", ".archive"))
+ARCHIVE_SHEETS = ["Sheet1", "Sheet2"]
+TARGETS = ["parquet", "sheets"]
+DEFAULT_DAYS = 30
+RANGE_SLACK = timedelta(days=1)   # apps shift Timestamps between PKT and UTC when filtering
+
+_catalog_lock = threading.Lock()
+
+
+# ==============================
+# Partition catalog
+# ==============================
+def catalog_path() -> Path:
+    return ARCHIVE_DIR / "catalog.json"
+
+
+def catalog_version() -> float:
+    """Changes whenever the catalog is rewritten (used in cache keys)."""
+    try:
+        return catalog_path().stat().st_mtime
+    except OSError:
+        return 0.0
+
+
+def load_catalog() -> list:
+    """Partition entries: sheet, month, target, location, rows, first_ts, last_ts, min_id, max_id."""
+    return list(_read_catalog(catalog_version()))
+
+
+@lru_cache(maxsize=4)
+def _read_catalog(version: float) -> tuple:
+    if not version:
+        return ()
+    return tuple(json.loads(catalog_path().read_text()).get("partitions", []))
+
+
+def save_catalog(partitions: list):
+    path = catalog_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    ordered = sorted(partitions, key=lambda p: (p["sheet"], p["month"]))
+    tmp.write_text(json.dumps({"partitions": ordered}, indent=2) + "\n")
+    os.replace(tmp, path)
+
+
+def describe(sheet: str, month: str, target: str, location: str, frame: pd.DataFrame) -> dict:
+    ts = pd.to_datetime(frame["Timestamp"], errors="coerce", format="mixed")
+    ids = frame["Record_ID"].astype(str).str.strip()
+    return {
+        "sheet": sheet,
+        "month": month,
+        "target": target,
+        "location": location,
+        "rows": len(frame),
+        "first_ts": ts.min().isoformat(),
+        "last_ts": ts.max().isoformat(),
+        "min_id": ids.min(),
+        "max_id": ids.max(),
+    }
+
+
+def partitions_for_id(sheet: str, record_id: str) -> list:
+    record_id = str(record_id).strip()
+    return [p for p in load_catalog() if p["sheet"] == sheet and p["min_id"] <= record_id <= p["max_id"]]
+
+
+def partitions_for_range(sheet: str, start: datetime, end: datetime) -> list:
+    start, end = _naive(start) - RANGE_SLACK, _naive(end) + RANGE_SLACK
+    return [
+        p for p in load_catalog()
+        if p["sheet"] == sheet
+        and datetime.fromisoformat(p["first_ts"]) <= end
+        and datetime.fromisoformat(p["last_ts"]) >= start
+    ]
+
+
+def _naive(value: datetime) -> datetime:
+    """PKT wall-clock time without tzinfo, like the Timestamp column."""
+    if getattr(value, "tzinfo", None) is not None:
+        value = value.astimezone(tz).replace(tzinfo=None)
+    return value
+
+
+# ==============================
+# Partition storage
+# ==============================
+def archive_title(sheet: str, month: str) -> str:
+    return f"Archive {sheet} {month}"
+
+
+def parquet_location(sheet: str, month: str) -> str:
+    return f"{sheet}/{month}.parquet"
+
+
+@lru_cache(maxsize=16)
+def _read_parquet(path: str, mtime: float) -> pd.DataFrame:
+    return pd.read_parquet(path)
+
+
+def read_partition(entry: dict, sh=None) -> pd.DataFrame:
+    """Rows of one partition as sheet-style strings, with a Partition column."""
+    if entry["target"] == "parquet":
+        path = ARCHIVE_DIR / entry["location"]
+        if not path.exists():
+            return pd.DataFrame()
+        df = _read_parquet(str(path), path.stat().st_mtime).copy()
+    else:
+        if sh is None:
+            return pd.DataFrame()
+        values = sh.worksheet(entry["location"]).get_all_values()
+        df = pd.DataFrame(values[1:], columns=values[0]) if values else pd.DataFrame()
+    df["Partition"] = entry["month"]
+    return df
+
+
+def read_partitions(entries: list, sh=None) -> pd.DataFrame:
+    frames = [read_partition(e, sh) for e in entries]
+    frames = [f for f in frames if not f.empty]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def _open_archive_sheet(sh, title: str, header: list):
+    import gspread
+
+    try:
+        ws = sh.worksheet(title)
+    except gspread.WorksheetNotFound:
+        ws = sh.add_worksheet(title=title, rows=1000, cols=len(header))
+    if not any(cell for row in ws.get("A1:A1") for cell in row):  # the local backends return [[]]
+        ws.update(values=[header], range_name="A1")
+    return ws
+
+
+def _not_held(rows: list, held: list) -> list:
+    """
+    rows minus one copy per copy already in held. Identical rows the sheet holds twice are both
+    archived, while a rerun after an interrupted job adds nothing twice.
+    """
+    left = Counter(tuple(r) for r in held)
+    new = []
+    for r in rows:
+        if left[tuple(r)]:
+            left[tuple(r)] -= 1
+        else:
+            new.append(r)
+    return new
+
+
+def write_partition(sh, sheet: str, month: str, target: str, rows: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add rows to the month's partition, skipping rows it already holds (a rerun after an
+    interrupted job). Returns the whole partition after the write.
+    """
+    rows = rows.astype(str)
+    if target == "parquet":
+        path = ARCHIVE_DIR / parquet_location(sheet, month)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        existing = pd.read_parquet(path) if path.exists() else pd.DataFrame(columns=rows.columns)
+        new = _not_held(rows.values.tolist(), existing.reindex(columns=rows.columns, fill_value="").astype(str).values.tolist())
+        merged = pd.concat([existing, pd.DataFrame(new, columns=rows.columns)], ignore_index=True)
+        merged.to_parquet(path, index=False)
+        return merged
+
+    ws = _open_archive_sheet(sh, archive_title(sheet, month), list(rows.columns))
+    values = ws.get_all_values()
+    new = _not_held(rows.values.tolist(), values[1:])
+    if new:
+        ws.append_rows(new, value_input_option="RAW")
+    return pd.DataFrame(values[1:] + new, columns=values[0])
+
+
+# ==============================
+# Archival job
+# ==============================
+def select_rows(values: list, days: int, now: datetime = None) -> pd.DataFrame:
+    """
+    Rows of a worksheet (get_all_values) that are due for archiving, with their sheet row number
+    in "_row" and partition month in "_month".
+    """
+    if len(values) < 2:
+        return pd.DataFrame()
+    header = values[0]
+    df = pd.DataFrame([r + [""] * (len(header) - len(r)) for r in values[1:]], columns=header)
+    df["_row"] = range(2, len(values) + 1)
+    ts = pd.to_datetime(df["Timestamp"], errors="coerce", format="mixed")
+    cutoff = _naive(now or datetime.now(tz)) - timedelta(days=days)
+    due = df[(ts < cutoff) & (df["Status"].astype(str).str.strip() != "Pending")].copy()
+    due["_month"] = ts[due.index].dt.strftime("%Y-%m")
+    return due
+
+
+def row_runs(rows: list) -> list:
+    """Sorted sheet rows -> [(start, end), ...] contiguous runs, last run first (safe delete order)."""
+    runs = []
+    for r in sorted(rows):
+        if runs and r == runs[-1][1] + 1:
+            runs[-1][1] = r
+        else:
+            runs.append([r, r])
+    return [tuple(run) for run in reversed(runs)]
+
+
+def archive_sheet(sh, sheet: str, days: int = DEFAULT_DAYS, target: str = "parquet",
+                  now: datetime = None, dry_run: bool = False) -> dict:
+    """Move one worksheet's due rows into monthly partitions. Returns {month: rows moved}."""
+    ws = sh.worksheet(sheet)
+    values = ws.get_all_values()
+    due = select_rows(values, days, now)
+    if due.empty:
+        return {}
+    moved = due.groupby("_month").size().to_dict()
+    if dry_run:
+        return moved
+
+    columns = values[0]
+    with _catalog_lock:
+        catalog = {(p["sheet"], p["month"]): p for p in load_catalog()}
+        for month, group in due.groupby("_month"):
+            location = parquet_location(sheet, month) if target == "parquet" else archive_title(sheet, month)
+            partition = write_partition(sh, sheet, month, target, group[columns])
+            catalog[(sheet, month)] = describe(sheet, month, target, location, partition)
+        save_catalog(list(catalog.values()))
+
+    # Delete from the live sheet only if nobody inserted or removed rows since the read
+    ids = ws.col_values(1)
+    expected = due.set_index("_row")["Record_ID"].astype(str)
+    if any(r > len(ids) or ids[r - 1] != rid for r, rid in expected.items()):
+        raise RuntimeError(
+            f"{sheet} changed while archiving; partitions were written but no rows were deleted. "
+            "Run the job again."
+        )
+    for start, end in row_runs(list(expected.index)):
+        ws.delete_rows(start, end)
+    if sheet in journal.JOURNAL_SHEETS:
+        journal.record([journal.reload(sheet, "archive.py")])  # the apps download the sheet again
+    return moved
+
+
+# ==============================
+# Readers used by the apps
+# ==============================
+def find_record(sheet: str, record_id: str, sh=None) -> pd.DataFrame:
+    """Archived rows with this Record_ID, reading only partitions whose ID range covers it."""
+    record_id = str(record_id).strip()
+    df = read_partitions(partitions_for_id(sheet, record_id), sh)
+    if df.empty:
+        return df
+    return df[df["Record_ID"].astype(str).str.strip() == record_id].reset_index(drop=True)
+
+
+def load_range(sheet: str, start: datetime, end: datetime, sh=None) -> pd.DataFrame:
+    """Archived rows of partitions overlapping [start, end]; callers apply the exact filter."""
+    return read_partitions(partitions_for_range(sheet, start, end), sh)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Move settled rows older than N days into monthly partitions.")
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS, help="keep this many days in the live sheets")
+    parser.add_argument("--target", choices=TARGETS, default="parquet")
+    parser.add_argument("--sheets", default=",".join(ARCHIVE_SHEETS), help="comma separated worksheets")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be moved")
+    parser.add_argument("--creds", default=os.environ.get("GOOGLE_APPLICATION_CREDENTIALS"),
+                        help="Service account JSON file")
+    args = parser.parse_args()
+
+    import storage
+
+    sh = storage.open_spreadsheet(SHEET_NAME, storage.env_config(args.creds))
+    journal.attach(sh)
+    for sheet in [s.strip() for s in args.sheets.split(",") if s.strip()]:
+        moved = archive_sheet(sh, sheet, args.days, args.target, dry_run=args.dry_run)
+        verb = "would move" if args.dry_run else "moved"
+        total = sum(moved.values())
+        print(f"{sheet}: {verb} {total} row(s)" + "".join(f"\n  {m}: {n}" for m, n in sorted(moved.items())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+# benchmark.py
+# Rerun-latency benchmark for the dashboard hot paths on synthetic data.
+#
+# For each size (default 1k, 10k, 100k, 1M rows) the Spectrum sheet is generated with
+# synthetic_data, served from the in-memory storage backend, and every operation below is timed
+# (best of --repeat runs). The operations mirror what a manager rerun does in manager.py /
+# manager-spec.py. Results go to a JSON file together with the snapshot's memory as fetched and as
+# stored; pass --compare with an earlier file to fail when any operation got slower than
+# --tolerance, so regressions are caught before deploy.
+#
+# Usage:
+#   python benchmark.py --out bench/main.json
+#   python benchmark.py --sizes 1000,10000 --out bench/branch.json --compare bench/main.json
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import warnings
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pandas as pd
+import pytz
+
+import storage
+from synthetic_data import generate_rows
+
+tz = pytz.timezone("Asia/Karachi")
+SIZES = [1_000, 10_000, 100_000, 1_000_000]
+REPEAT = 3
+TOLERANCE = 1.25        # --compare fails when an operation is this many times slower
+MIN_COMPARE_MS = 5.0    # ignore jitter on operations faster than this
+SEARCH_TEXT = "moore"
+SLOW_OPS_MAX_ROWS = 100_000   # row-wise operations are skipped above this unless --all
+
+warnings.filterwarnings("ignore", message="Could not infer format")  # same parsing as the apps
+
+
+# ==============================
+# Operations (same pandas work as the dashboards)
+# ==============================
+def op_snapshot_load(ctx):
+    """data_layer snapshot: get_all_records() -> DataFrame."""
+    ctx["fetched"] = pd.DataFrame(ctx["ws"].get_all_records())
+
+
+def op_snapshot_compact(ctx):
+    """Compact storage form of the snapshot (schema.compact_frame), as data_layer keeps it."""
+    import schema
+
+    ctx["raw"] = schema.compact_frame(ctx["fetched"])
+
+
+def op_typed_parsing(ctx):
+    """Timestamp / Charge / Expiry Date parsing done by load_data and the analysis block."""
+    df = ctx["raw"].copy()
+    df["Expiry Date"] = df["Expiry Date"].astype(str).str.replace("/", "", regex=False).str.strip().str.zfill(4)
+    df["Timestamp"] = pd.to_datetime(df["Timestamp"], errors="coerce")
+    df["ChargeFloat"] = pd.to_numeric(df["Charge"].replace(r"[\$,]", "", regex=True), errors="coerce")
+    ctx["df"] = df
+
+
+def op_night_window_total(ctx):
+    """Night badge: Charged total between 7 PM and 6 AM of the latest night in the data."""
+    df = ctx["df"]
+    ts = df["Timestamp"].dt.tz_localize("Asia/Karachi", nonexistent="shift_forward", ambiguous="NaT")
+    day = df["Timestamp"].max().normalize() - timedelta(days=1)
+    start = tz.localize(datetime.combine(day.date(), datetime.min.time()) + timedelta(hours=19))
+    end = start + timedelta(hours=11)
+    ctx["night_total"] = df.loc[(df["Status"] == "Charged") & (ts >= start) & (ts <= end), "ChargeFloat"].sum()
+
+
+def op_pending_queue(ctx):
+    """process_dataframe: Pending rows plus recently processed ones."""
+    df = ctx["df"]
+    cutoff = df["Timestamp"].max() - timedelta(minutes=5)
+    kept = df[(df["Status"] == "Pending") | (df["Status"].isin(["Charged", "Declined"]) & (df["Timestamp"] >= cutoff))]
+    ctx["pending"] = kept[kept["Status"] == "Pending"]
+
+
+def op_table_search(ctx):
+    """display_pandas_table search box (row-wise contains over every column)."""
+    df = ctx["raw"]
+    mask = df.apply(lambda row: row.astype(str).str.contains(SEARCH_TEXT, case=False, na=False).any(), axis=1)
+    ctx["search_hits"] = int(mask.sum())
+
+
+op_table_search.row_wise = True
+
+
+def op_duplicate_detection(ctx):
+    """Duplicate finder: rows sharing a Record_ID and their counts."""
+    df = ctx["raw"]
+    duplicates = df[df.duplicated(subset=["Record_ID"], keep=False)]
+    ctx["dup_counts"] = duplicates.groupby("Record_ID").size().sort_values(ascending=False)
+
+
+def op_analytics_aggregation(ctx):
+    """Analysis tab: hourly sums, top agents, status distribution."""
+    df = ctx["df"]
+    hourly = df.groupby(df["Timestamp"].dt.floor("h"))["ChargeFloat"].sum().reset_index()
+    ctx["hourly"] = hourly.rename(columns={"Timestamp": "Hour"})
+    ctx["top_agents"] = df.groupby("Agent Name")["ChargeFloat"].sum().sort_values(ascending=False).head(5)
+    ctx["status_counts"] = df["Status"].value_counts()
+
+
+def op_cube_build(ctx):
+    """cube.py: aggregate the snapshot into (hour, agent, status, LLC, provider, sheet) cells."""
+    import cube
+
+    ctx["cube"] = cube.aggregate(cube._source(ctx["raw"]), "Sheet1")
+
+
+def op_cube_query(ctx):
+    """Analysis tab answered from the cube: one agent's range, hourly sums, top agents, statuses."""
+    import cube
+
+    end = tz.localize(ctx["df"]["Timestamp"].max().to_pydatetime())
+    cells = cube.select(ctx["cube"], end - timedelta(days=30), end, tz, where={"Agent Name": "Haziq"})
+    ctx["cube_hourly"] = cube.hourly(cells)
+    ctx["cube_top_agents"] = cube.total(cells, "Agent Name").head(5)
+    ctx["cube_status_counts"] = cube.total(cells, "Status", "Count")
+
+
+def op_chargeback_rates(ctx):
+    """chargebacks.py: weekly rates for every agent / LLC / provider grouping, then one lookup."""
+    import chargebacks
+
+    rates = chargebacks.Rates(ctx["cube"], ctx["cube"]["Hour"].min())
+    ctx["chargeback_rate"] = rates.lookup(rates.weeks[-1], **{"Agent Name": "Haziq"})
+
+
+def op_chart_render(ctx):
+    """Static chart of the hourly totals, downsampled to the point budget (no cache)."""
+    from charts import POINT_BUDGET, RENDERERS, render_chart
+
+    df = ctx["df"].assign(Hour=ctx["df"]["Timestamp"].dt.floor("h"))
+    render_chart(object(), ctx["hourly"], df, "Bar", "benchmark", RENDERERS[0], max_points=POINT_BUDGET)  # fresh key: always a miss
+
+
+OPERATIONS = [
+    op_snapshot_load, op_snapshot_compact, op_typed_parsing, op_night_window_total, op_pending_queue,
+    op_table_search, op_duplicate_detection, op_analytics_aggregation, op_cube_build, op_cube_query,
+    op_chargeback_rates, op_chart_render,
+]
+
+
+# ==============================
+# Runner
+# ==============================
+def snapshot_memory(fetched: pd.DataFrame, stored: pd.DataFrame) -> dict:
+    """Snapshot size as fetched (get_all_records frame) and as data_layer stores it (MB)."""
+    import schema
+
+    return {
+        "fetched_mb": round(fetched.memory_usage(deep=True).sum() / 2**20, 2),
+        "stored_mb": round(stored.memory_usage(deep=True).sum() / 2**20, 2),
+        "typed_mb": round(schema.typed_columns(stored).memory_usage(deep=True).sum() / 2**20, 2),
+    }
+
+
+def run_size(rows: int, repeat: int, run_all: bool) -> tuple:
+    sheet = storage.MemoryBackend({"Sheet1": generate_rows("Sheet1", rows)}).open("bench").worksheet("Sheet1")
+    ctx = {"ws": sheet}
+    results = {}
+    for op in OPERATIONS:
+        name = op.__name__[3:]
+        if getattr(op, "row_wise", False) and rows > SLOW_OPS_MAX_ROWS and not run_all:
+            results[name] = None
+            print(f"  {name:<22} skipped (row-wise, > {SLOW_OPS_MAX_ROWS:,} rows)")
+            continue
+        best = float("inf")
+        for _ in range(repeat if rows < 1_000_000 else 1):
+            start = time.perf_counter()
+            op(ctx)
+            best = min(best, time.perf_counter() - start)
+        results[name] = round(best * 1000, 2)
+        print(f"  {name:<22} {results[name]:>10.1f} ms")
+    memory = snapshot_memory(ctx["fetched"], ctx["raw"])
+    print(f"  {'snapshot memory':<22} {memory['fetched_mb']:>7.1f} MB fetched -> {memory['stored_mb']:.1f} MB stored"
+          f" (+{memory['typed_mb']:.1f} MB typed view)")
+    return results, memory
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "commit": commit,
+        "created": datetime.now(tz).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    """Operations that got slower than tolerance x baseline (same size)."""
+    regressions = []
+    for size, ops in current["results"].items():
+        for name, ms in ops.items():
+            base = baseline.get("results", {}).get(size, {}).get(name)
+            if ms is None or base is None or max(ms, base) < MIN_COMPARE_MS:
+                continue
+            ratio = ms / base
+            flag = "  <-- slower" if ratio > tolerance else ""
+            print(f"  {size:>9} {name:<22} {base:>10.1f} -> {ms:>10.1f} ms  x{ratio:.2f}{flag}")
+            if ratio > tolerance:
+                regressions.append(f"{name} @ {size} rows: {base:.1f} -> {ms:.1f} ms")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark dashboard operations on synthetic data.")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in SIZES), help="comma separated row counts")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="best of N (1M rows always runs once)")
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--all", action="store_true", help="also run row-wise operations on large sizes")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    import charts, matplotlib.pyplot  # noqa: F401,E401  (import cost is not part of a rerun)
+    report = {"environment": environment(), "results": {}, "memory": {}}
+    for rows in sizes:
+        print(f"{rows:,} rows")
+        report["results"][str(rows)], report["memory"][str(rows)] = run_size(rows, args.repeat, args.all)
+
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2) + "\n")
+    print(f"\nWrote {out}")
+
+    if args.compare:
+        print(f"\nCompared with {args.compare} (tolerance x{args.tolerance})")
+        regressions = compare(report, json.loads(Path(args.compare).read_text()), args.tolerance)
+        if regressions:
+            print("\nFAILED")
+            for r in regressions:
+                print(f"  - {r}")
+            return 1
+        print("\nOK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
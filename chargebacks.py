@@ -0,0 +1,192 @@
+# chargebacks.py
+# Chargeback and decline rates per agent, LLC and provider, week by week.
+#
+# The payment processor judges us on the share of charges that come back:
+#   chargeback rate = Charge Back / (Charged + Charge Back)          (by count and by cents)
+#   decline rate    = Declined / (Charged + Declined + Charge Back)
+# A group is flagged once it has MIN_SETTLED decided charges in the week and a rate reaches the
+# WARN / ALERT level in LIMITS.
+#
+# Counts and cents per status come from the analysis cube (cube.py), which is kept up to date
+# from the rows that changed between snapshots, so a status flip (Charged -> Charge Back) moves
+# one row between two cells instead of rescanning the history. Rates rolls the cube up into
+# weekly totals once per snapshot, for every combination of agent / LLC / provider (grouping
+# sets), each indexed by (Week, members...): a rate for any group and week is one index lookup.
+# Weeks start on Monday and follow the Timestamp column's wall clock (PKT), like the night window.
+
+from datetime import datetime, timedelta
+from itertools import combinations
+
+import pandas as pd
+import pytz
+
+import archive
+import cube
+from charts import ChartCache
+from data_layer import snapshot_version
+
+tz = pytz.timezone("Asia/Karachi")
+DIMENSIONS = ["Agent Name", "LLC", "Provider"]
+OUTCOMES = ["Charged", "Declined", "Charge Back", "Pending"]
+HISTORY_WEEKS = 12
+MIN_SETTLED = 20
+ALERTS_SHOWN = 8
+LIMITS = {
+    # rate: (warn, alert). Card schemes start monitoring merchants around 0.9% chargebacks.
+    "Chargeback Rate": (0.0065, 0.009),
+    "Chargeback $ Rate": (0.0065, 0.009),
+    "Decline Rate": (0.15, 0.25),
+}
+ROLLUPS = [dims for n in range(len(DIMENSIONS) + 1) for dims in combinations(DIMENSIONS, n)]
+
+_rates = ChartCache(8)
+
+
+def week_start(value) -> pd.Timestamp:
+    """Monday 00:00 of the week holding value (naive PKT)."""
+    value = pd.Timestamp(value)
+    if value.tzinfo is not None:
+        value = value.tz_convert(tz).tz_localize(None)
+    return (value - pd.Timedelta(days=value.weekday())).normalize()
+
+
+def _ratios(totals: pd.DataFrame) -> pd.DataFrame:
+    charged, back, declined = totals["Charged"], totals["Charge Back"], totals["Declined"]
+    settled = charged + back
+    out = totals.copy()
+    out["Settled"] = settled
+    out["Chargeback Rate"] = (back / settled).where(settled > 0, 0.0)
+    cents = totals["Charged Cents"] + totals["Charge Back Cents"]
+    out["Chargeback $ Rate"] = (totals["Charge Back Cents"] / cents).where(cents > 0, 0.0)
+    decided = settled + declined
+    out["Decline Rate"] = (declined / decided).where(decided > 0, 0.0)
+    return out
+
+
+class Rates:
+    """Weekly counts, cents and rates for every grouping of DIMENSIONS, built from cube cells."""
+
+    def __init__(self, cells: pd.DataFrame, since: pd.Timestamp):
+        self.since = since
+        weeks = cells["Hour"].dt.normalize() - pd.to_timedelta(cells["Hour"].dt.weekday, unit="D")
+        facts = cells.assign(Week=weeks)
+        facts = facts[facts["Week"] >= since]
+        base = facts.groupby(["Week", *DIMENSIONS, "Status"], sort=False)[cube.MEASURES].sum()
+        base = base.unstack("Status", fill_value=0)
+        columns = {}
+        for status in OUTCOMES:
+            has = status in base.columns.get_level_values(1)
+            columns[status] = base[("Count", status)] if has else 0
+            columns[f"{status} Cents"] = base[("Cents", status)] if has else 0
+        base = pd.DataFrame(columns, index=base.index)
+        self.views = {
+            dims: _ratios(base.groupby(["Week", *dims], sort=True).sum()) for dims in ROLLUPS
+        }
+        self.weeks = sorted(base.index.get_level_values("Week").unique())
+
+    def lookup(self, week, **where) -> pd.Series:
+        """
+        Totals and rates of one group in one week, e.g. lookup(week, **{"Agent Name": "Haziq"});
+        dimensions left out are summed over. Empty when the group had no rows that week.
+        """
+        dims = tuple(d for d in DIMENSIONS if where.get(d) is not None)
+        key = (week_start(week), *(where[d] for d in dims)) if dims else week_start(week)
+        view = self.views[dims]
+        if key not in view.index:
+            return pd.Series(dtype=float)
+        return view.loc[key]
+
+    def table(self, by: str = None) -> pd.DataFrame:
+        """Totals and rates per week (and per member of by), as a flat frame."""
+        return self.views[(by,) if by else ()].reset_index()
+
+    def alerts(self, by: str = None, week=None) -> pd.DataFrame:
+        """Groups (members of by) over a LIMITS level in week (default: every week), worst first."""
+        rows = self.table(by)
+        if week is not None:
+            rows = rows[rows["Week"] == week_start(week)]
+        rows = rows[rows["Settled"] + rows["Declined"] >= MIN_SETTLED]
+        found = []
+        for rate, (warn, alert) in LIMITS.items():
+            hit = rows[rows[rate] >= warn]
+            found.append(hit.assign(
+                Rate=rate, Value=hit[rate], Level=(hit[rate] >= alert).map({True: "alert", False: "warn"})
+            ))
+        if not found or all(f.empty for f in found):
+            return pd.DataFrame(columns=["Week", *([by] if by else []), "Rate", "Value", "Level"])
+        out = pd.concat(found, ignore_index=True)
+        return out.sort_values(["Level", "Value"], ascending=[True, False], ignore_index=True)
+
+
+def for_worksheets(worksheets, sh=None, weeks: int = HISTORY_WEEKS, now: datetime = None) -> Rates:
+    """Rates over the last weeks weeks of these sheets (archived months included), cached per snapshot."""
+    now = now or datetime.now(tz)
+    since = week_start(now) - pd.Timedelta(weeks=weeks - 1)
+    key = (tuple(snapshot_version(ws) for ws in worksheets), archive.catalog_version(), since)
+    rates = _rates.get(key)
+    if rates is None:
+        start = tz.localize(since.to_pydatetime())
+        cubes = [cube.for_worksheet(ws) for ws in worksheets]
+        cubes += [cube.for_archive(ws.title, start, now, sh)[0] for ws in worksheets]
+        rates = Rates(cube.merge(*cubes), since)
+        _rates.put(key, rates)
+    return rates
+
+
+# ==============================
+# Manager-view panel
+# ==============================
+def _percent(frame: pd.DataFrame) -> pd.DataFrame:
+    return frame.style.format({rate: "{:.2%}" for rate in LIMITS})
+
+
+def chargeback_panel(worksheets, sh=None):
+    """Chargeback and decline rates by agent / LLC / provider, with this week's and last week's alerts."""
+    import streamlit as st
+
+    st.subheader("Chargeback & Decline Rates")
+    rates = for_worksheets(worksheets, sh)
+    if not rates.weeks:
+        st.info(f"No transactions in the last {HISTORY_WEEKS} weeks.")
+        return
+
+    c1, c2 = st.columns(2)
+    with c1:
+        by = st.selectbox("Group by", DIMENSIONS, key="cb_group_by")
+    with c2:
+        week = st.selectbox(
+            "Week starting", rates.weeks[::-1], format_func=lambda w: w.strftime("%Y-%m-%d"), key="cb_week"
+        )
+
+    recent = [w for w in rates.weeks if w >= week_start(datetime.now(tz)) - timedelta(weeks=1)]
+    alerts = pd.concat([rates.alerts(d, w) for d in DIMENSIONS for w in recent] or [pd.DataFrame()],
+                       ignore_index=True)
+    if not alerts.empty:
+        alerts = alerts.sort_values(["Level", "Value"], ascending=[True, False], ignore_index=True)
+    for _, a in alerts.head(ALERTS_SHOWN).iterrows():
+        group = next(f"{d} {a[d]}" for d in DIMENSIONS if d in a and pd.notna(a[d]))
+        text = (f"{group}: {a['Rate']} {a['Value']:.2%} in the week of {a['Week']:%Y-%m-%d} "
+                f"({int(a['Charge Back'])} chargebacks, {int(a['Declined'])} declines, "
+                f"{int(a['Settled'])} settled)")
+        (st.error if a["Level"] == "alert" else st.warning)(text)
+    if len(alerts) > ALERTS_SHOWN:
+        st.caption(f"{len(alerts) - ALERTS_SHOWN} more alert(s) this week and last week.")
+
+    overall = rates.lookup(week)
+    if not overall.empty:
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("Chargebacks", f"{int(overall['Charge Back']):,}")
+        m2.metric("Chargeback Rate", f"{overall['Chargeback Rate']:.2%}")
+        m3.metric("Chargeback $ Rate", f"{overall['Chargeback $ Rate']:.2%}")
+        m4.metric("Decline Rate", f"{overall['Decline Rate']:.2%}")
+
+    rows = rates.table(by)
+    rows = rows[rows["Week"] == week].drop(columns="Week")
+    shown = [by, "Charged", "Charge Back", "Declined", "Pending", *LIMITS]
+    st.dataframe(_percent(rows[shown].sort_values("Chargeback Rate", ascending=False)),
+                 use_container_width=True, hide_index=True)
+
+    trend = rates.table(by).pivot(index="Week", columns=by, values="Chargeback Rate")
+    trend.index = trend.index.strftime("%Y-%m-%d")
+    st.caption(f"Chargeback rate by week and {by}")
+    st.dataframe(trend.style.format("{:.2%}", na_rep="—"), use_container_width=True)
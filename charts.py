@@ -0,0 +1,231 @@
+# charts.py
+# Rendering for the "Transaction Analysis" charts shared by manager.py and manager-spec.py.
+# Rendered charts are cached per process, keyed by (data version, filters, chart type, renderer),
+# so a rerun with unchanged filters reuses the previous output instead of drawing a new figure.
+# Dense series are downsampled to a fixed point budget (LTTB for lines, min/max buckets for bars)
+# before drawing, so multi-month ranges stay fast while peaks remain visible.
+
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+CHART_TYPES = ["Bar", "Line", "Stacked Bar"]
+RENDERERS = ["Static (Matplotlib)", "Interactive (Plotly)"]
+CHART_CACHE_SIZE = 32
+POINT_BUDGET = 500  # max points/bars drawn per chart unless full resolution is requested
+
+# ==============================
+# Cache
+# ==============================
+class ChartCache:
+    """Small thread-safe LRU shared by every session in the process."""
+
+    def __init__(self, maxsize: int = CHART_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+_chart_cache = ChartCache()
+
+
+def frame_version(df: pd.DataFrame) -> str:
+    """Content hash of a sheet snapshot, used as the data part of the cache key."""
+    if df.empty:
+        return "empty"
+    hashed = pd.util.hash_pandas_object(df.astype(str), index=True)
+    return f"{len(df)}:{int(hashed.sum()) & 0xFFFFFFFFFFFFFFFF:x}"
+
+
+def chart_key(data_version, sheet, agent, status, chart_type, start, end, renderer, max_points=POINT_BUDGET):
+    return (
+        data_version, sheet, agent, status, chart_type,
+        start.isoformat(), end.isoformat(), renderer, max_points,
+    )
+
+
+# ==============================
+# Downsampling
+# ==============================
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: positions of n_out points that keep the visual shape."""
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = x.astype("float64")
+    y = y.astype("float64")
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)  # n_out - 2 buckets between the endpoints
+    out = np.empty(n_out, dtype=int)
+    out[0], out[-1] = 0, n - 1
+    prev = 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        nxt_lo, nxt_hi = hi, edges[b + 2] if b + 2 < len(edges) else n
+        avg_x = x[nxt_lo:nxt_hi].mean()
+        avg_y = y[nxt_lo:nxt_hi].mean()
+        area = np.abs(
+            (x[prev] - avg_x) * (y[lo:hi] - y[prev]) - (x[prev] - x[lo:hi]) * (avg_y - y[prev])
+        )
+        prev = lo + int(area.argmax())
+        out[b + 1] = prev
+    return out
+
+
+def minmax_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """Keep the min and max of each bucket, so spikes and dips survive in bar charts."""
+    n = len(y)
+    if n_out >= n or n_out < 2:
+        return np.arange(n)
+    keep = []
+    for bucket in np.array_split(np.arange(n), n_out // 2):
+        if len(bucket):
+            vals = y[bucket]
+            keep.extend((bucket[vals.argmin()], bucket[vals.argmax()]))
+    return np.unique(keep)
+
+
+def downsample(df: pd.DataFrame, y, max_points: int, method: str = "minmax") -> pd.DataFrame:
+    """
+    Reduce df (one row per time bucket, sorted) to at most max_points rows.
+    y is a column name or a Series aligned with df; time is taken from the "Hour" column or the index.
+    """
+    if not max_points or len(df) <= max_points:
+        return df
+    values = (df[y] if isinstance(y, str) else y).to_numpy(dtype="float64")
+    if method == "lttb":
+        times = df["Hour"] if "Hour" in df.columns else df.index.to_series()
+        x = pd.to_datetime(times).astype("int64").to_numpy()
+        idx = lttb_indices(x, values, max_points)
+    else:
+        idx = minmax_indices(values, max_points)
+    return df.iloc[idx]
+
+
+# ==============================
+# Renderers
+# ==============================
+def _stack_by_status(df_chart: pd.DataFrame) -> pd.DataFrame:
+    return df_chart.pivot_table(
+        index="Hour", columns="Status", values="ChargeFloat", aggfunc="sum", fill_value=0
+    )
+
+
+def _points_for(hourly_sum, df_chart, chart_type, max_points):
+    if chart_type == "Stacked Bar":
+        df_stack = _stack_by_status(df_chart)
+        return downsample(df_stack, df_stack.sum(axis=1), max_points)
+    method = "lttb" if chart_type == "Line" else "minmax"
+    return downsample(hourly_sum, "ChargeFloat", max_points, method)
+
+
+def _render_matplotlib(points, chart_type, title, palette=None, title_style=None) -> bytes:
+    import matplotlib
+    import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+
+    fig, ax = plt.subplots(figsize=(12, 6))
+    try:
+        if chart_type == "Bar":
+            colors = None
+            if palette:
+                base = matplotlib.colormaps[palette].colors
+                colors = [base[i % len(base)] for i in range(len(points))]
+            ax.bar(points["Hour"], points["ChargeFloat"], color=colors)
+        elif chart_type == "Line":
+            ax.plot(points["Hour"], points["ChargeFloat"], marker="o", linestyle="-",
+                    color="tab:blue" if palette else None)
+        else:
+            points.plot(kind="bar", stacked=True, ax=ax, colormap=palette)
+            ax.set_xticklabels([h.strftime("%Y-%m-%d %H:%M:%S") for h in points.index])
+
+        if chart_type != "Stacked Bar":
+            ax.xaxis.set_major_formatter(mdates.DateFormatter("%Y-%m-%d %H:%M:%S"))
+        ax.tick_params(axis="x", labelrotation=45)
+        ax.set_xlabel("Timestamp")
+        ax.set_ylabel("Total Charge ($)")
+        ax.set_title(title, **(title_style or {}))
+        ax.grid(alpha=0.3)
+        fig.tight_layout()
+
+        buf = BytesIO()
+        fig.savefig(buf, format="png", dpi=100)
+        return buf.getvalue()
+    finally:
+        plt.close(fig)
+
+
+def _render_plotly(points, chart_type, title):
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    if chart_type == "Bar":
+        fig.add_trace(go.Bar(x=points["Hour"], y=points["ChargeFloat"], name="Total Charge"))
+    elif chart_type == "Line":
+        fig.add_trace(go.Scatter(x=points["Hour"], y=points["ChargeFloat"],
+                                 mode="lines+markers", name="Total Charge"))
+    else:
+        for status in points.columns:
+            fig.add_trace(go.Bar(x=points.index, y=points[status], name=str(status)))
+        fig.update_layout(barmode="stack")
+    fig.update_layout(
+        title=title,
+        xaxis_title="Timestamp",
+        yaxis_title="Total Charge ($)",
+        height=500,
+    )
+    return fig
+
+
+def render_chart(key, hourly_sum, df_chart, chart_type, title, renderer=RENDERERS[0],
+                 palette=None, title_style=None, max_points=POINT_BUDGET):
+    """
+    Return PNG bytes (Matplotlib) or a Plotly figure for the filtered rows in df_chart
+    (which must carry "Hour", "Status" and "ChargeFloat") and their hourly totals.
+    Results are looked up in the process-wide LRU first; only a miss downsamples and draws.
+    Pass max_points=None to draw every bucket.
+    """
+    cached = _chart_cache.get(key)
+    if cached is not None:
+        return cached
+    points = _points_for(hourly_sum, df_chart, chart_type, max_points)
+    if renderer == "Interactive (Plotly)":
+        out = _render_plotly(points, chart_type, title)
+    else:
+        out = _render_matplotlib(points, chart_type, title, palette, title_style)
+    _chart_cache.put(key, out)
+    return out
+
+
+def show_chart(chart, n_points=None, max_points=POINT_BUDGET):
+    """Display the output of render_chart with the matching Streamlit element."""
+    if isinstance(chart, bytes):
+        st.image(chart, use_container_width=True)
+    else:
+        st.plotly_chart(chart, use_container_width=True)
+    if n_points and max_points and n_points > max_points:
+        st.caption(f"Showing about {max_points:,} of {n_points:,} hourly points (peaks kept).")
@@ -0,0 +1,133 @@
+# check_import_time.py
+# Cold-start import budget for the Streamlit entry points.
+#
+# For each entry point, collects the modules it imports at module level (imports inside functions
+# are lazy and do not count), imports them in a fresh interpreter with `python -X importtime`,
+# and compares the total against import_budget.json. Heavy optional libraries (charts, PDF,
+# exports) must never be imported at startup by our own code; they are only loaded by the feature
+# that needs them. Anything Streamlit/pandas/gspread pull in themselves is the framework floor
+# and is reported separately rather than counted as a violation.
+#
+# Usage:
+#   python check_import_time.py            # report + exit 1 if any budget is exceeded
+#   python check_import_time.py --update   # rewrite the budget from the current timings
+
+import argparse
+import ast
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+BUDGET_FILE = ROOT / "import_budget.json"
+ENTRY_POINTS = ["agents.py", "manager.py", "manager-spec.py"]
+FRAMEWORK = ["streamlit", "pandas", "gspread"]
+RUNS = 5            # best-of-N to smooth out disk cache noise
+HEADROOM = 1.5      # --update writes measured * HEADROOM
+
+# Libraries that must only be imported lazily by the feature that uses them
+LAZY_ONLY = [
+    "matplotlib", "seaborn", "plotly", "reportlab", "litellm",
+    "st_aggrid", "pyarrow", "openpyxl", "tabulate",
+]
+
+
+def module_level_imports(path: Path) -> list:
+    """Top-level module names imported outside of functions/classes in path."""
+    tree = ast.parse(path.read_text(encoding="utf-8"))
+    names = []
+
+    def visit(nodes):
+        for node in nodes:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)):
+                continue
+            if isinstance(node, ast.Import):
+                names.extend(alias.name for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+                names.append(node.module)
+            for field in ("body", "orelse", "finalbody", "handlers"):
+                visit(getattr(node, field, []) or [])
+
+    visit(tree.body)
+    return list(dict.fromkeys(names))
+
+
+def measure(modules: list) -> dict:
+    """Import modules in a fresh interpreter; return total ms and per-module cumulative ms."""
+    code = "; ".join(f"import {m}" for m in modules)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr else "import failed")
+
+    roots = {m.split(".")[0] for m in modules}
+    total_us, per_module, loaded = 0, {}, set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        name = name[1:]  # one separator space, then two spaces per nesting level
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        name = name.strip()
+        loaded.add(name.split(".")[0])
+        if depth == 0 and name.split(".")[0] in roots:  # skip interpreter startup (site, encodings)
+            total_us += int(cumulative_us)
+            per_module[name] = int(cumulative_us) / 1000
+    return {"total_ms": total_us / 1000, "modules": per_module, "loaded": loaded}
+
+
+def best_of(modules: list, runs: int = RUNS) -> dict:
+    results = [measure(modules) for _ in range(runs)]
+    return min(results, key=lambda r: r["total_ms"])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Check cold-start import time of the entry points.")
+    parser.add_argument("--update", action="store_true", help="rewrite import_budget.json from this run")
+    parser.add_argument("--top", type=int, default=8, help="slowest imports to list per entry point")
+    args = parser.parse_args()
+
+    budget = json.loads(BUDGET_FILE.read_text()) if BUDGET_FILE.exists() else {}
+    failures = []
+
+    floor = best_of(FRAMEWORK)
+    print(f"Framework floor ({', '.join(FRAMEWORK)}): {floor['total_ms']:.0f} ms")
+
+    for entry in ENTRY_POINTS:
+        modules = module_level_imports(ROOT / entry)
+        result = best_of(modules)
+        limit = budget.get(entry)
+        print(
+            f"\n{entry}: {result['total_ms']:.0f} ms "
+            f"(app overhead {result['total_ms'] - floor['total_ms']:+.0f} ms"
+            + (f", budget {limit:.0f} ms)" if limit else ")")
+        )
+        for name, ms in sorted(result["modules"].items(), key=lambda kv: -kv[1])[:args.top]:
+            print(f"  {ms:8.1f} ms  {name}")
+
+        eager = sorted(set(LAZY_ONLY) & (result["loaded"] - floor["loaded"]))
+        if eager:
+            failures.append(f"{entry}: imports {', '.join(eager)} at startup (must be lazy)")
+        if args.update:
+            budget[entry] = round(result["total_ms"] * HEADROOM)
+        elif limit and result["total_ms"] > limit:
+            failures.append(f"{entry}: {result['total_ms']:.0f} ms > budget {limit:.0f} ms")
+
+    if args.update:
+        BUDGET_FILE.write_text(json.dumps(budget, indent=2) + "\n")
+        print(f"\nWrote {BUDGET_FILE.name}")
+
+    if failures:
+        print("\nFAILED")
+        for f in failures:
+            print(f"  - {f}")
+        return 1
+    print("\nOK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
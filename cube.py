@@ -0,0 +1,206 @@
+# cube.py
+# Pre-aggregated cube behind the "Transaction Analysis" sections.
+#
+# One cell per (Hour, Agent Name, Status, LLC, Provider, Sheet) holding the number of rows and
+# the charge total in integer cents. The analysis filters (agent, status, date range) and every
+# widget fed by them (Bar / Line / Stacked Bar, the summary metrics, Top Agents, Status
+# Distribution) slice the cube instead of rescanning and pivoting the sheet on each rerun.
+#
+# for_worksheet(ws) builds the cube once per data_layer snapshot. When a snapshot reloads, only
+# the rows that were added, edited or removed since the previous one are aggregated (rows are
+# matched by a hash of the cube's source columns) and folded into the previous cube.
+# Archived partitions get one cube each, cached until the catalog changes.
+#
+# Adding a dimension: append it to DIMENSIONS (the sheet column of the same name is used, ""
+# where a sheet lacks it) or add a function to DERIVED for a computed one.
+# Date ranges are applied in whole hours.
+
+import threading
+
+import pandas as pd
+import pytz
+
+import archive
+import schema
+from data_layer import derived, sheet_key
+
+DIMENSIONS = ["Hour", "Agent Name", "Status", "LLC", "Provider", "Sheet"]
+MEASURES = ["Count", "Cents"]
+REBUILD_RATIO = 0.5    # rebuild from scratch when more than this share of rows changed
+STORED_TZ = pytz.utc   # the analysis sections read sheet Timestamps as UTC
+
+
+def _hour(df: pd.DataFrame, sheet: str) -> pd.Series:
+    return schema.parse_timestamps(df["Timestamp"]).dt.floor("h")
+
+
+def _sheet(df: pd.DataFrame, sheet: str) -> pd.Series:
+    return pd.Series(sheet, index=df.index)
+
+
+DERIVED = {"Hour": _hour, "Sheet": _sheet}
+SOURCE_COLUMNS = ["Timestamp", "Agent Name", "Status", "LLC", "Provider", "Charge"]
+
+
+# ==============================
+# Building
+# ==============================
+def _source(df: pd.DataFrame) -> pd.DataFrame:
+    """The columns the cube reads, as strings ("" for columns this sheet does not have)."""
+    return pd.DataFrame(
+        {c: df[c].astype(str) if c in df.columns else "" for c in SOURCE_COLUMNS}, index=df.index
+    )
+
+
+def _cents(charge: pd.Series) -> pd.Series:
+    dollars = pd.to_numeric(charge.str.replace(r"[\$,]", "", regex=True), errors="coerce")
+    return (dollars.fillna(0.0) * 100).round().astype("int64")
+
+
+def aggregate(source: pd.DataFrame, sheet: str, weight: pd.Series = None) -> pd.DataFrame:
+    """Cells of the cube for these source rows; weight (default 1) counts each row that many times."""
+    if source.empty:
+        return empty()
+    weight = pd.Series(1, index=source.index) if weight is None else weight
+    facts = pd.DataFrame({
+        dim: DERIVED[dim](source, sheet) if dim in DERIVED else source[dim] for dim in DIMENSIONS
+    })
+    facts["Count"] = weight.astype("int64")
+    facts["Cents"] = _cents(source["Charge"]) * facts["Count"]
+    facts = facts.dropna(subset=["Hour"])
+    return facts.groupby(DIMENSIONS, sort=False, as_index=False)[MEASURES].sum()
+
+
+def empty() -> pd.DataFrame:
+    cube = pd.DataFrame({dim: pd.Series(dtype="object") for dim in DIMENSIONS})
+    cube["Hour"] = pd.Series(dtype="datetime64[ns]")
+    for m in MEASURES:
+        cube[m] = pd.Series(dtype="int64")
+    return cube
+
+
+def merge(*cubes: pd.DataFrame) -> pd.DataFrame:
+    """Sum cubes cell by cell (e.g. the live sheet and its archived months, or two sheets)."""
+    cubes = [c for c in cubes if not c.empty]
+    if not cubes:
+        return empty()
+    if len(cubes) == 1:
+        return cubes[0]
+    merged = pd.concat(cubes, ignore_index=True).groupby(DIMENSIONS, sort=False, as_index=False)[MEASURES].sum()
+    return merged[merged["Count"] != 0].reset_index(drop=True)
+
+
+def _row_hashes(source: pd.DataFrame) -> pd.Series:
+    return pd.util.hash_pandas_object(source, index=False)
+
+
+class IncrementalCube:
+    """The cube of one sheet, updated from the difference between consecutive snapshots."""
+
+    def __init__(self, sheet: str):
+        self.sheet = sheet
+        self.source = None      # source columns of the last snapshot
+        self.hashes = None      # their row hashes
+        self.cube = empty()
+        self._lock = threading.Lock()
+
+    def update(self, df: pd.DataFrame) -> pd.DataFrame:
+        with self._lock:
+            source = _source(df)
+            hashes = _row_hashes(source)
+            if self.source is None:
+                self.cube = aggregate(source, self.sheet)
+            else:
+                delta = hashes.value_counts().sub(self.hashes.value_counts(), fill_value=0)
+                delta = delta[delta != 0].astype("int64")
+                if delta.abs().sum() > len(source) * REBUILD_RATIO:
+                    self.cube = aggregate(source, self.sheet)
+                elif not delta.empty:
+                    self.cube = merge(
+                        self.cube,
+                        self._rows(source, hashes, delta[delta > 0]),
+                        self._rows(self.source, self.hashes, delta[delta < 0]),
+                    )
+            self.source, self.hashes = source, hashes
+            return self.cube
+
+    def _rows(self, source, hashes, counts) -> pd.DataFrame:
+        """Cells for rows whose hash is in counts, each weighted by its count (negative = removed)."""
+        if counts.empty:
+            return empty()
+        first = hashes.isin(counts.index) & ~hashes.duplicated()
+        return aggregate(source[first], self.sheet, hashes[first].map(counts))
+
+
+_incremental = {}
+_incremental_guard = threading.Lock()
+
+
+def for_worksheet(ws) -> pd.DataFrame:
+    """Cube of ws's current snapshot (built once per snapshot, shared, read-only)."""
+    sheet = sheet_key(ws)
+    with _incremental_guard:
+        state = _incremental.setdefault(sheet, IncrementalCube(ws.title))
+    return derived(ws, "cube", state.update)
+
+
+_partition_cubes = {}
+_partition_lock = threading.Lock()
+
+
+def for_archive(sheet: str, start, end, sh=None) -> tuple:
+    """
+    (cube, rows, months) of the archived partitions of sheet overlapping [start, end].
+    Each partition is aggregated once per catalog version.
+    """
+    version = archive.catalog_version()
+    entries = archive.partitions_for_range(sheet, start, end)
+    cubes = []
+    for entry in entries:
+        key = (sheet, entry["location"], version)
+        with _partition_lock:
+            cube = _partition_cubes.get(key)
+        if cube is None:
+            cube = aggregate(_source(archive.read_partition(entry, sh)), sheet)
+            with _partition_lock:
+                for stale in [k for k in _partition_cubes if k[2] != version]:
+                    del _partition_cubes[stale]
+                _partition_cubes[key] = cube
+        cubes.append(cube)
+    return merge(*cubes), sum(e["rows"] for e in entries), [e["month"] for e in entries]
+
+
+# ==============================
+# Queries
+# ==============================
+def members(cube: pd.DataFrame, dim: str) -> list:
+    """Values of a dimension, in order of first appearance."""
+    return [v for v in cube[dim].unique().tolist() if v != ""]
+
+
+def select(cube: pd.DataFrame, start, end, tz, where: dict = None) -> pd.DataFrame:
+    """
+    Cells in [start, end] (tz-aware) matching where ({dimension: value}, None = any), with Hour
+    converted to tz and the charge total in dollars as ChargeFloat (the shape charts expects).
+    """
+    lo = start.astimezone(STORED_TZ).replace(tzinfo=None, minute=0, second=0, microsecond=0)
+    hi = end.astimezone(STORED_TZ).replace(tzinfo=None)
+    mask = (cube["Hour"] >= lo) & (cube["Hour"] <= hi)
+    for dim, value in (where or {}).items():
+        if value is not None:
+            mask &= cube[dim] == value
+    cells = cube[mask]
+    cells["Hour"] = cells["Hour"].dt.tz_localize(STORED_TZ).dt.tz_convert(tz)
+    cells["ChargeFloat"] = cells["Cents"] / 100
+    return cells
+
+
+def hourly(cells: pd.DataFrame) -> pd.DataFrame:
+    """Hour, ChargeFloat: total per hour that has rows, sorted by hour."""
+    out = cells.groupby("Hour", as_index=False)[["ChargeFloat"]].sum()
+    return out.sort_values("Hour", ignore_index=True)
+
+
+def total(cells: pd.DataFrame, by: str, measure: str = "ChargeFloat") -> pd.Series:
+    """measure summed per value of dimension by, largest first."""
+    return cells.groupby(by, sort=False)[measure].sum().sort_values(ascending=False)
@@ -0,0 +1,595 @@
+# data_layer.py
+# Shared worksheet snapshots and the in-process change bus.
+#
+# Every Streamlit session in the server process reads worksheets through get_records_df(), which
+# serves a cached snapshot until the worksheet's version on the change bus moves. Writes made
+# through the helpers below (append_row, update_cell, ...) publish a version bump for that one
+# worksheet, so other sessions refetch only what changed. Managers' pending queues poll the
+# version number (auto_refresh) instead of re-reading the sheet.
+#
+# The bus only sees writes made by this process. Edits made elsewhere (the Sheets UI, another
+# app server) are found by a freshness probe (storage.revision: one tiny Drive request) once a
+# snapshot is older than SNAPSHOT_TTL or on "Refresh Now". The full get_all_records() download
+# happens only when the probe reports a change, or at least every SNAPSHOT_MAX_AGE seconds.
+#
+# A snapshot is published once and never modified: get_records_df() and agent_rows() hand out
+# lazy copies (pandas copy-on-write), which cost no data copy and materialize only the columns a
+# session then overwrites, so memory and CPU per session stay flat as more users connect. The
+# sheets themselves change only through the write helpers below.
+#
+# Snapshots are stored compactly (schema.compact_frame: categoricals for Agent Name / Status /
+# LLC / Provider, Arrow string arrays for the other text columns), so the per-session copies
+# handed out by get_records_df share the string buffers instead of duplicating Python objects.
+# memory_report() shows the size as fetched and as stored for every snapshot.
+#
+# Views derived from a snapshot (per-agent partitions, the set of Record IDs, per-agent shift
+# totals) are built once per snapshot by derived() and shared by every session, so an agent's
+# page touches only that agent's rows instead of copying and filtering the whole sheet.
+#
+# Writes to the transaction sheets are also recorded in the journal (journal.py: Record_ID, field,
+# old, new, who, when). A snapshot the probe finds stale is first caught up by replaying only the
+# journal entries after the offset it was loaded at. That is only trusted when the probe shows
+# exactly the revision taken right after this process's last journaled write (each write probes
+# before and after itself); any other change (an edit in the Sheets UI, import_leads.py, another
+# app server, a write landing between those two probes) means a full download, as does a snapshot
+# SNAPSHOT_MAX_AGE old.
+#
+# Rows are addressed by number (snapshot index + 2), and a snapshot can be SNAPSHOT_TTL old when
+# another app process deletes a row above. update_cell / update_range / delete_rows therefore read
+# column A of the target row first and raise StaleRowError instead of writing when it no longer
+# holds the Record_ID the caller saw.
+#
+# prefetch() refreshes several stale snapshots at once on a small shared thread pool, so a page
+# that needs Users, Spectrum and Insurance waits for one round-trip instead of three.
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import pandas as pd
+import streamlit as st
+
+import journal
+import metrics
+import perf
+import schema
+import storage
+
+SNAPSHOT_TTL = 60         # seconds before a snapshot is re-checked with the freshness probe
+SNAPSHOT_MAX_AGE = 600    # seconds before a snapshot is refetched whatever the probe says
+POLL_INTERVAL = "10s"     # how often pending queues check the bus
+MAX_PARALLEL_FETCHES = 4  # worker threads shared by every session's prefetch()
+
+
+def _enable_copy_on_write():
+    """pandas >= 3 always copies on write; pandas 2 needs the option for lazy copies to be safe."""
+    if int(pd.__version__.split(".")[0]) < 3:
+        pd.set_option("mode.copy_on_write", True)
+
+
+_enable_copy_on_write()
+
+
+# ==============================
+# Change bus
+# ==============================
+class ChangeBus:
+    """Monotonic version number per worksheet, shared by every session in the process."""
+
+    def __init__(self):
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def publish(self, sheet: str) -> int:
+        with self._lock:
+            self._versions[sheet] = self._versions.get(sheet, 0) + 1
+            return self._versions[sheet]
+
+    def version(self, sheet: str) -> int:
+        return self._versions.get(sheet, 0)
+
+    def versions(self, sheets) -> tuple:
+        return tuple(self.version(s) for s in sheets)
+
+
+bus = ChangeBus()
+
+
+def sheet_key(ws) -> str:
+    return ws.title
+
+
+def _scope(ws):
+    """Worksheets whose revisions move together: the whole spreadsheet for Google Sheets."""
+    return getattr(ws, "spreadsheet_id", None) or sheet_key(ws)
+
+
+# ==============================
+# Snapshot cache
+# ==============================
+_snapshots = {}       # sheet -> {"version", "revision", "expected", "journal", "loaded_at", "fetched_at", "df", "token", "memory", "derived"}
+_fetch_locks = {}
+_locks_guard = threading.Lock()
+_fetch_seq = 0
+
+
+def _fetch_lock(sheet: str) -> threading.Lock:
+    with _locks_guard:
+        return _fetch_locks.setdefault(sheet, threading.Lock())
+
+
+def _is_fresh(entry, sheet: str) -> bool:
+    return (
+        entry is not None
+        and entry["version"] == bus.version(sheet)
+        and time.monotonic() - entry["fetched_at"] < SNAPSHOT_TTL
+    )
+
+
+def _probe(ws, fresh: bool = False):
+    try:
+        return storage.revision(ws, fresh)
+    except Exception:  # probe failed: fall back to a full reload, which reports the real error
+        return None
+
+
+def _unchanged(entry, version: int, revision) -> bool:
+    """True when the probe shows the sheet is as it was when entry was downloaded."""
+    return (
+        entry is not None
+        and revision is not None
+        and entry["version"] == version
+        and entry["revision"] == revision
+        and time.monotonic() - entry["loaded_at"] < SNAPSHOT_MAX_AGE
+    )
+
+
+def _journal_head(sheet: str):
+    """Journal offset a snapshot of sheet is loaded at, or None when it cannot be caught up."""
+    if sheet not in journal.JOURNAL_SHEETS or not journal.mirrored():
+        return None
+    try:
+        return journal.head()
+    except Exception:  # journal unreadable: this snapshot is refreshed by full downloads only
+        return None
+
+
+def _catch_up(ws, entry, version: int, revision):
+    """
+    entry brought up to date by replaying the journal, or None when only a full download will do:
+    no journal offset, too old, or a revision other than the one this process saw right after
+    its own last journaled write (the sheet also changed outside the journal).
+    """
+    if (
+        entry is None
+        or entry["journal"] is None
+        or revision is None
+        or revision != entry["expected"]
+        or time.monotonic() - entry["loaded_at"] >= SNAPSHOT_MAX_AGE
+    ):
+        return None
+    sheet = sheet_key(ws)
+    try:
+        entries, offset = journal.since(entry["journal"])
+    except Exception:
+        return None
+    mine = [e for e in entries if e["Sheet"] == sheet]
+    if not entries or (version != entry["version"] and not mine):
+        return None  # the sheet changed without a journal entry
+    df = journal.apply(entry["df"], mine)
+    if df is None:
+        return None
+    now = time.monotonic()
+    if df is entry["df"]:  # only other sheets changed
+        entry.update(version=version, revision=revision, expected=revision, journal=offset, fetched_at=now)
+        return entry
+    return _publish(ws, df, version, revision, offset, entry["loaded_at"], entry["memory"]["fetched"])
+
+
+def _publish(ws, df: pd.DataFrame, version: int, revision, offset, loaded_at: float, fetched_bytes: int) -> dict:
+    global _fetch_seq
+    sheet = sheet_key(ws)
+    with _locks_guard:
+        _fetch_seq += 1
+        seq = _fetch_seq
+    entry = {
+        "version": version,
+        "revision": revision,
+        "expected": revision,   # revision if only this process's journaled writes happen (see _write)
+        "scope": _scope(ws),
+        "journal": offset,
+        "loaded_at": loaded_at,
+        "fetched_at": time.monotonic(),
+        "df": df,
+        "token": f"{sheet}:{version}:{seq}",
+        "memory": {"fetched": fetched_bytes, "stored": int(df.memory_usage(deep=True).sum())},
+        "derived": {},
+        "derived_lock": threading.RLock(),
+    }
+    _snapshots[sheet] = entry
+    return entry
+
+
+def _snapshot(ws) -> dict:
+    sheet = sheet_key(ws)
+    entry = _snapshots.get(sheet)
+    if _is_fresh(entry, sheet):
+        metrics.registry.record_snapshot(hit=True)
+        return entry
+    with _fetch_lock(sheet):  # one fetch per sheet even if many sessions miss at once
+        entry = _snapshots.get(sheet)
+        if _is_fresh(entry, sheet):
+            metrics.registry.record_snapshot(hit=True)  # another session fetched it meanwhile
+            return entry
+        version = bus.version(sheet)
+        with perf.timed(f"Probe {sheet}", "sheet"):
+            revision = _probe(ws)  # taken before the download, so edits during it are seen next time
+        if _unchanged(entry, version, revision):
+            entry["fetched_at"] = time.monotonic()
+            metrics.registry.record_probe(changed=False)
+            metrics.registry.record_snapshot(hit=True)
+            return entry
+        if entry is not None and revision is not None:
+            metrics.registry.record_probe(changed=True)
+        metrics.registry.record_snapshot(hit=False)
+        with perf.timed(f"Catch up {sheet}", "sheet"):
+            caught = _catch_up(ws, entry, version, revision)
+        if caught is not None:
+            return caught
+        offset = _journal_head(sheet)  # like the revision, taken before the download
+        with perf.timed(f"Fetch {sheet}", "sheet"):
+            records = ws.get_all_records()
+        with perf.timed(f"Compact {sheet}", "parse"):
+            raw = pd.DataFrame(records) if records else pd.DataFrame()
+            fetched_bytes = int(raw.memory_usage(deep=True).sum())
+            df = schema.compact_frame(raw)
+            del raw, records
+        return _publish(ws, df, version, revision, offset, time.monotonic(), fetched_bytes)
+
+
+def get_records_df(ws) -> pd.DataFrame:
+    """
+    DataFrame of ws.get_all_records(), served from the shared snapshot when still current.
+    A lazy copy: callers may add or overwrite columns without affecting other sessions.
+    """
+    with perf.timed(f"Snapshot {sheet_key(ws)}", "sheet"):
+        return _snapshot(ws)["df"].copy(deep=False)
+
+
+# ==============================
+# Derived views (built once per snapshot, shared, read-only)
+# ==============================
+def derived(ws, key, build):
+    """
+    build(snapshot_df) computed once per snapshot of ws and cached under key for every session.
+    The result is shared: callers must not modify it in place (take .copy(deep=False) first).
+    """
+    return _derived(_snapshot(ws), sheet_key(ws), key, build)
+
+
+def _derived(entry, sheet, key, build):
+    cache = entry["derived"]
+    if key not in cache:
+        with entry["derived_lock"]:  # reentrant: a build may use other views of the same snapshot
+            if key not in cache:
+                with perf.timed(f"Build {key[0] if isinstance(key, tuple) else key} {sheet}", "parse"):
+                    cache[key] = build(entry["df"])
+    return cache[key]
+
+
+def _agent_partitions(df: pd.DataFrame) -> dict:
+    if df.empty or "Agent Name" not in df.columns:
+        return {}
+    return {agent: rows for agent, rows in df.groupby("Agent Name", sort=False, observed=True)}
+
+
+def agent_rows(ws, agent: str) -> pd.DataFrame:
+    """One agent's rows (a lazy copy), keeping the snapshot index so row number = index + 2."""
+    rows = derived(ws, "agent_partitions", _agent_partitions).get(agent)
+    if rows is None:
+        return _snapshot(ws)["df"].iloc[0:0].copy(deep=False)
+    return rows.copy(deep=False)
+
+
+def record_ids(ws) -> frozenset:
+    """Every Record_ID in the sheet, stripped, for duplicate checks."""
+    def build(df):
+        if df.empty or "Record_ID" not in df.columns:
+            return frozenset()
+        return frozenset(df["Record_ID"].astype(str).str.strip())
+
+    return derived(ws, "record_ids", build)
+
+
+def typed(ws) -> pd.DataFrame:
+    """Charge as int64 cents ("Cents") and Timestamp / Date of Charge as datetime64 (schema.typed_columns)."""
+    return derived(ws, "typed", schema.typed_columns)
+
+
+def agent_shift_totals(ws, window_start, window_end) -> pd.Series:
+    """Charged total per agent for Timestamps in [window_start, window_end] (naive PKT)."""
+    entry, sheet = _snapshot(ws), sheet_key(ws)
+
+    def build(df):
+        if df.empty or "Timestamp" not in df.columns:
+            return pd.Series(dtype=float)
+        cols = _derived(entry, sheet, "typed", schema.typed_columns)  # same snapshot as df
+        ts = cols["Timestamp"]
+        mask = (df["Status"] == "Charged") & (ts >= window_start) & (ts <= window_end)
+        dollars = cols.loc[mask, "Cents"].fillna(0).astype("int64") / 100
+        return dollars.groupby(df.loc[mask, "Agent Name"].astype(str)).sum()
+
+    return _derived(entry, sheet, ("shift_totals", window_start, window_end), build)
+
+
+_pool = ThreadPoolExecutor(max_workers=MAX_PARALLEL_FETCHES, thread_name_prefix="twh-fetch")
+
+
+def prefetch(*worksheets):
+    """
+    Refresh the stale snapshots among worksheets concurrently. Errors are left for the
+    get_records_df() call that follows, which retries that sheet and reports as before.
+    """
+    stale = [ws for ws in worksheets if not _is_fresh(_snapshots.get(sheet_key(ws)), sheet_key(ws))]
+    if len(stale) < 2:
+        return
+    rerun = perf.current()
+
+    def fetch(ws):
+        perf.attach(rerun)  # count this worker's API calls in the rerun that asked
+        try:
+            _snapshot(ws)
+        finally:
+            perf.attach(None)
+
+    with perf.timed("Prefetch " + ", ".join(sheet_key(ws) for ws in stale), "sheet"):
+        wait([_pool.submit(fetch, ws) for ws in stale])
+
+
+def snapshot_version(ws) -> str:
+    """Token that changes whenever the snapshot for ws is refetched (used in cache keys)."""
+    return _snapshot(ws)["token"]
+
+
+def memory_report() -> pd.DataFrame:
+    """One row per cached snapshot: rows, MB as fetched (object frame), MB as stored, derived views."""
+    rows = []
+    for sheet, entry in list(_snapshots.items()):
+        views = sum(
+            int(v.memory_usage(deep=True).sum()) for v in list(entry["derived"].values())
+            if isinstance(v, pd.DataFrame)
+        )
+        fetched, stored = entry["memory"]["fetched"], entry["memory"]["stored"]
+        rows.append({
+            "Sheet": sheet,
+            "Rows": len(entry["df"]),
+            "Fetched MB": round(fetched / 2**20, 2),
+            "Stored MB": round(stored / 2**20, 2),
+            "Derived MB": round(views / 2**20, 2),
+            "Saved": f"{1 - stored / fetched:.0%}" if fetched else "-",
+        })
+    return pd.DataFrame(rows, columns=["Sheet", "Rows", "Fetched MB", "Stored MB", "Derived MB", "Saved"])
+
+
+def invalidate(*worksheets):
+    """
+    Make the next read re-check these snapshots (all of them when called without arguments).
+    The probe runs first, so a refresh of an unchanged sheet costs one tiny request.
+    """
+    sheets = [sheet_key(ws) for ws in worksheets] or list(_snapshots)
+    for sheet in sheets:
+        entry = _snapshots.get(sheet)
+        if entry is not None:
+            entry["fetched_at"] = float("-inf")
+
+
+# ==============================
+# Writes (publish on the bus, record in the journal)
+# ==============================
+def _who() -> str:
+    try:
+        return st.session_state.get("user_id") or st.session_state.get("agent_name") or "-"
+    except Exception:  # not in a Streamlit session (CLI jobs)
+        return "-"
+
+
+def _key_text(value) -> str:
+    return "" if value is None or (not isinstance(value, str) and pd.isna(value)) else str(value).strip()
+
+
+def _sheet_row(ws, row: int, key=None):
+    """
+    Row number row of ws as {column: value} from the current snapshot, or None if not held
+    (or if its first column is not key, when given).
+    """
+    entry = _snapshots.get(sheet_key(ws))
+    if entry is None or not 0 <= row - 2 < len(entry["df"]):
+        return None
+    values = entry["df"].iloc[row - 2].to_dict()
+    if key is not None and _key_text(next(iter(values.values()), "")) != _key_text(key):
+        return None
+    return values
+
+
+class StaleRowError(RuntimeError):
+    """A write by row number whose row no longer holds the record the caller read."""
+
+
+def _check_row(ws, row: int, key=None):
+    """
+    Make sure sheet row row still holds key in column A (Record_ID / ID; default: what the snapshot
+    holds there) and return it. Row numbers come from snapshots up to SNAPSHOT_TTL old, and a
+    delete made by another app process shifts every row below it: on a mismatch the snapshot is
+    invalidated and StaleRowError raised instead of writing to someone else's row.
+    """
+    if key is None:
+        held = _sheet_row(ws, row)
+        if not held:
+            return None
+        key = next(iter(held.values()))
+    with perf.timed(f"Check row {sheet_key(ws)}", "sheet"):
+        found = ws.get(f"A{row}")
+    value = str(found[0][0]).strip() if found and found[0] else ""
+    if value != _key_text(key):
+        invalidate(ws)
+        raise StaleRowError(
+            f"Row {row} of {sheet_key(ws)} no longer holds {key} (the sheet changed). Refresh and try again."
+        )
+    return key
+
+
+def _columns(ws) -> list:
+    entry = _snapshots.get(sheet_key(ws))
+    return list(entry["df"].columns) if entry is not None and len(entry["df"].columns) else schema.SHEET_COLUMNS[sheet_key(ws)]
+
+
+def _describe_update(ws, first_row: int, first_col: int, values, key=None) -> list:
+    sheet, who, columns = sheet_key(ws), _who(), _columns(ws)
+    entries = []
+    for i, new in enumerate(values):
+        before = _sheet_row(ws, first_row + i, key if i == 0 else None)
+        if before is None or first_col - 1 + len(new) > len(columns):
+            return [journal.reload(sheet, who)]
+        after = dict(zip(columns[first_col - 1:first_col - 1 + len(new)], new))
+        entries += journal.edits(sheet, before, after, who)
+    return entries
+
+
+def _journaled(ws, describe):
+    """describe() -> journal entries for a write to ws, or None when ws is not journaled."""
+    if sheet_key(ws) not in journal.JOURNAL_SHEETS:
+        return None
+    try:
+        return describe()
+    except Exception:
+        return [journal.reload(sheet_key(ws), _who())]
+
+
+def _record(entries):
+    if not entries:
+        return
+    try:
+        with perf.timed("Journal", "sheet"):
+            journal.record(entries)
+    except Exception:  # the write itself succeeded; readers that find no entry download the sheet
+        pass
+
+
+_expected_lock = threading.Lock()
+
+
+def _expect(ws, before, after, explained: bool):
+    """
+    After a write that moved ws's revision from before to after: snapshots of the same scope that
+    expected before now expect after, if the journal explains the write; every other one of them
+    (and all of them when it does not) is downloaded again on its next refresh.
+    """
+    scope = _scope(ws)
+    with _expected_lock:
+        for entry in list(_snapshots.values()):
+            if entry.get("scope") != scope:
+                continue
+            keep = explained and before is not None and after is not None and entry["expected"] == before
+            entry["expected"] = after if keep else None
+
+
+def _write(ws, name: str, describe, write):
+    """
+    write() with its journal entries from describe(). Journaled sheets are probed right before and
+    right after (journal mirror included), so _catch_up can tell this write from anyone else's.
+    """
+    sheet = sheet_key(ws)
+    entries = _journaled(ws, describe)
+    before = _probe(ws, fresh=True) if entries is not None else None
+    with perf.timed(f"{name} {sheet}", "sheet"):
+        result = write()
+    _record(entries)
+    if entries is not None:
+        explained = bool(entries) and all(e["Field"] != journal.RELOAD for e in entries)
+        _expect(ws, before, _probe(ws, fresh=True), explained)
+    else:
+        _expect(ws, None, None, False)  # e.g. Users on Google Sheets: same revision as the journaled sheets
+    bus.publish(sheet)
+    return result
+
+
+def append_row(ws, row):
+    return _write(
+        ws, "append_row", lambda: [journal.insert(sheet_key(ws), dict(zip(_columns(ws), row)), _who())],
+        lambda: ws.append_row(row),
+    )
+
+
+def update_cell(ws, row, col, value, key=None):
+    """Write one cell of row row; key is the Record_ID the caller read there (see _check_row)."""
+    key = _check_row(ws, row, key)
+    return _write(
+        ws, "update_cell", lambda: _describe_update(ws, row, col, [[value]], key),
+        lambda: ws.update_cell(row, col, value),
+    )
+
+
+def update_range(ws, range_name, values, key=None):
+    """Write values at range_name; key is the Record_ID the caller read in its first row."""
+    first_row, _, first_col, _ = storage.parse_range(range_name)
+    key = _check_row(ws, first_row, key)
+    return _write(
+        ws, "update_range", lambda: _describe_update(ws, first_row, first_col, values, key),
+        lambda: ws.update(values=values, range_name=range_name),
+    )
+
+
+def update_fields(ws, row, fields: dict, key=None):
+    """
+    Write only the named cells of row row ({column: value}) in one request, so cells the
+    caller did not change keep the sheet's own text (snapshot values are numericised:
+    PIN CODE "0123" reads back as 123). key is the Record_ID the caller read there.
+    """
+    from gspread.utils import rowcol_to_a1
+
+    key = _check_row(ws, row, key)
+    columns = _columns(ws)
+    cells = [(columns.index(field) + 1, value) for field, value in fields.items()]
+
+    def describe():
+        return [e for col, value in cells for e in _describe_update(ws, row, col, [[value]], key)]
+
+    return _write(
+        ws, "update_fields", describe,
+        lambda: ws.batch_update([{"range": rowcol_to_a1(row, col), "values": [[value]]} for col, value in cells]),
+    )
+
+
+def delete_rows(ws, index, key=None):
+    """Delete row index; key is the Record_ID the caller read there."""
+    key = _check_row(ws, index, key)
+
+    def describe():
+        before = _sheet_row(ws, index, key)
+        if before is None:
+            return [journal.reload(sheet_key(ws), _who())]
+        return [journal.delete(sheet_key(ws), before, _who())]
+
+    return _write(ws, "delete_rows", describe, lambda: ws.delete_rows(index))
+
+
+# ==============================
+# Cross-session refresh
+# ==============================
+def auto_refresh(worksheets, interval: str = POLL_INTERVAL):
+    """
+    Rerun the page when another session changes one of these worksheets.
+    Polls only the in-memory version numbers; the rerun then refetches just the changed sheet.
+    """
+    sheets = [sheet_key(ws) for ws in worksheets]
+    state_key = "_bus_seen_" + "|".join(sheets)
+    st.session_state[state_key] = bus.versions(sheets)  # this run already reflects these versions
+
+    @st.fragment(run_every=interval)
+    def _poll():
+        current = bus.versions(sheets)
+        if current != st.session_state.get(state_key):
+            st.session_state[state_key] = current
+            st.rerun()
+
+    _poll()
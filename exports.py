@@ -0,0 +1,127 @@
+# exports.py
+# Download exports for the data tables (CSV, Parquet, Excel).
+# Files are only produced when a Download button is clicked, are written to disk in row chunks
+# rather than as one big in-memory string, and are cached by (data version, filter, format)
+# so repeated downloads of an unchanged table are served straight from disk.
+# Chunking bounds the writer's memory only: st.download_button keeps the finished file in memory
+# to serve it, so a clicked export is read whole once (a file object would be read the same way).
+
+import hashlib
+import importlib.util
+import os
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+from charts import frame_version
+
+EXPORT_DIR = Path(os.environ.get("TWH_EXPORT_DIR", ".export_cache"))
+CHUNK_ROWS = 50_000
+MAX_CACHED_EXPORTS = 16
+
+EXPORT_FORMATS = {
+    "CSV": (".csv", "text/csv"),
+    "Parquet": (".parquet", "application/vnd.apache.parquet"),
+    "Excel": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+_lock = threading.Lock()
+
+
+def available_formats() -> list:
+    """Formats whose writer library is installed (Parquet needs pyarrow, Excel needs openpyxl)."""
+    formats = ["CSV"]
+    for fmt, module in (("Parquet", "pyarrow"), ("Excel", "openpyxl")):
+        if importlib.util.find_spec(module) is not None:
+            formats.append(fmt)
+    return formats
+
+
+# ==============================
+# Chunked writers
+# ==============================
+def _chunks(df: pd.DataFrame):
+    for start in range(0, max(len(df), 1), CHUNK_ROWS):
+        yield start, df.iloc[start:start + CHUNK_ROWS]
+
+
+def _write_csv(frames: dict, path: Path):
+    df = next(iter(frames.values()))
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for start, chunk in _chunks(df):
+            chunk.to_csv(f, index=False, header=(start == 0))
+
+
+def _write_parquet(frames: dict, path: Path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    df = next(iter(frames.values()))
+    # Sheet columns mix numbers and text; store everything that is not numeric/datetime as string.
+    df = df.astype({c: "string" for c in df.columns if df[c].dtype == object})
+    schema = pa.Schema.from_pandas(df.iloc[:0], preserve_index=False)
+    with pq.ParquetWriter(path, schema) as writer:
+        for _, chunk in _chunks(df):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+def _write_excel(frames: dict, path: Path):
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        for name, df in frames.items():
+            sheet_name = name[:31]  # Excel limit
+            for start, chunk in _chunks(df):
+                chunk.to_excel(
+                    writer, sheet_name=sheet_name, index=False,
+                    header=(start == 0), startrow=start + (1 if start else 0),
+                )
+
+
+_WRITERS = {"CSV": _write_csv, "Parquet": _write_parquet, "Excel": _write_excel}
+
+
+# ==============================
+# Cache
+# ==============================
+def _prune():
+    files = sorted(EXPORT_DIR.glob("export_*"), key=lambda p: p.stat().st_mtime)
+    for old in files[:-MAX_CACHED_EXPORTS]:
+        old.unlink(missing_ok=True)
+
+
+def export_file(frames: dict, fmt: str, filter_key: str = "") -> Path:
+    """
+    Write frames ({sheet name: DataFrame}) in the given format and return the file path.
+    CSV and Parquet use the first frame only; Excel writes one worksheet per frame.
+    """
+    version = "|".join(f"{name}={frame_version(df)}" for name, df in frames.items())
+    digest = hashlib.sha1(f"{version}|{filter_key}|{fmt}".encode("utf-8")).hexdigest()[:20]
+    path = EXPORT_DIR / f"export_{digest}{EXPORT_FORMATS[fmt][0]}"
+    with _lock:
+        if path.exists():
+            os.utime(path)  # keep recently used exports at the end of the prune order
+            return path
+        EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        _WRITERS[fmt](frames, tmp)
+        tmp.replace(path)
+        _prune()
+    return path
+
+
+def lazy_export(frames: dict, fmt: str, filter_key: str = ""):
+    """
+    Callable for st.download_button(data=...): the export is built (or found on disk) only when
+    clicked, then handed to Streamlit as bytes, which it holds in memory while serving them.
+    """
+    def build():
+        return export_file(frames, fmt, filter_key).read_bytes()
+    return build
+
+
+def export_file_name(label: str, fmt: str) -> str:
+    return f"{label.replace(' ', '_').lower()}_data{EXPORT_FORMATS[fmt][0]}"
+
+
+def export_mime(fmt: str) -> str:
+    return EXPORT_FORMATS[fmt][1]
@@ -0,0 +1,333 @@
+# fake_sheets_server.py
+# Local stand-in for the Google Sheets v4 / Drive v3 endpoints gspread uses, for benchmarks.
+#
+# Serves: Drive files list (gc.open) and get (freshness probe), spreadsheet metadata, values get / batchGet / update /
+# append / batchUpdate, and spreadsheet batchUpdate with addSheet (add_worksheet) and
+# deleteDimension (delete_rows).
+# Every call sleeps for the configured latency, and calls beyond the per-minute quota get the
+# same 429 RESOURCE_EXHAUSTED error Google returns, so caching and batching changes can be
+# measured end to end. Worksheets are storage.MemoryWorksheet objects seeded from
+# synthetic_data; GET /_stats returns call counts for the benchmark scripts.
+#
+# Usage:
+#   python fake_sheets_server.py --port 8765 --rows 10000 --latency 0.2 --quota 300
+#   TWH_SHEETS_ENDPOINT=http://127.0.0.1:8765 streamlit run manager.py
+
+import json
+import re
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from storage import MemoryWorksheet
+
+SHEET_NAME = "Company_Transactions"
+SPREADSHEET_ID = "fake-company-transactions"
+GOOGLE_HOSTS = ("https://sheets.googleapis.com", "https://www.googleapis.com")
+
+
+class FakeSheets:
+    """State shared by all request handlers: worksheets, latency, quota window and counters."""
+
+    def __init__(self, workbook: dict, latency: float = 0.0, quota_per_minute: int = 0,
+                 title: str = SHEET_NAME, spreadsheet_id: str = SPREADSHEET_ID):
+        self.title = title
+        self.spreadsheet_id = spreadsheet_id
+        self.latency = latency
+        self.quota_per_minute = quota_per_minute
+        self.worksheets = {t: MemoryWorksheet(t, rows) for t, rows in workbook.items()}
+        self.sheet_ids = {t: i for i, t in enumerate(workbook)}
+        self.calls = Counter()
+        self.throttled = 0
+        self.bytes_sent = 0
+        self.version = 1          # Drive file version, bumped by every write
+        self._window = deque()
+        self._lock = threading.Lock()
+
+    def admit(self, method: str) -> bool:
+        """Count the call and apply the sliding one-minute quota. False means answer 429."""
+        now = time.monotonic()
+        with self._lock:
+            self.calls[method] += 1
+            while self._window and now - self._window[0] >= 60:
+                self._window.popleft()
+            if self.quota_per_minute and len(self._window) >= self.quota_per_minute:
+                self.throttled += 1
+                return False
+            self._window.append(now)
+            return True
+
+    def stats(self) -> dict:
+        return {
+            "calls": dict(self.calls),
+            "total_calls": sum(self.calls.values()),
+            "throttled": self.throttled,
+            "bytes_sent": self.bytes_sent,
+            "rows": {t: len(ws.get_all_values()) for t, ws in self.worksheets.items()},
+        }
+
+    # --- Sheets resources ---
+    def metadata(self) -> dict:
+        sheets = []
+        for title, ws in self.worksheets.items():
+            values = ws.get_all_values()
+            sheets.append({"properties": {
+                "sheetId": self.sheet_ids[title],
+                "title": title,
+                "index": self.sheet_ids[title],
+                "sheetType": "GRID",
+                "gridProperties": {
+                    "rowCount": max(len(values), 1000),
+                    "columnCount": max((len(r) for r in values), default=26),
+                },
+            }})
+        return {
+            "spreadsheetId": self.spreadsheet_id,
+            "properties": {"title": self.title, "locale": "en_US", "timeZone": "Asia/Karachi"},
+            "sheets": sheets,
+        }
+
+    def split(self, a1: str):
+        """"'Sheet1'!A2:C5" -> (worksheet, "A2:C5" or None for the whole sheet)."""
+        title, _, cells = unquote(a1).rpartition("!")
+        if not title:
+            title, cells = cells, ""
+        title = title.strip("'").replace("''", "'")
+        if title not in self.worksheets:
+            raise KeyError(title)
+        return self.worksheets[title], cells or None
+
+    def read(self, a1: str, major: str = "ROWS") -> dict:
+        ws, cells = self.split(a1)
+        values = ws.get(cells) if cells else ws.get_all_values()
+        while values and not any(values[-1]):  # Sheets trims trailing empty rows
+            values.pop()
+        if major == "COLUMNS":
+            width = max((len(r) for r in values), default=0)
+            values = [[r[c] if c < len(r) else "" for r in values] for c in range(width)]
+        return {"range": a1, "majorDimension": major, "values": values}
+
+    def touch(self):
+        with self._lock:
+            self.version += 1
+
+    def file(self) -> dict:
+        return {"id": self.spreadsheet_id, "name": self.title, "version": str(self.version),
+                "createdTime": "2026-01-01T00:00:00.000Z", "modifiedTime": "2026-01-01T00:00:00.000Z"}
+
+    def write(self, a1: str, values: list) -> dict:
+        ws, cells = self.split(a1)
+        ws.update(cells or "A1", values)
+        self.touch()
+        return {"spreadsheetId": self.spreadsheet_id, "updatedRange": a1,
+                "updatedRows": len(values), "updatedCells": sum(len(r) for r in values)}
+
+    def append(self, a1: str, values: list) -> dict:
+        ws, _ = self.split(a1)
+        first = len(ws.get_all_values()) + 1
+        ws.append_rows(values)
+        self.touch()
+        updated = f"'{ws.title}'!A{first}:{first + len(values) - 1}"
+        return {"spreadsheetId": self.spreadsheet_id, "tableRange": f"'{ws.title}'",
+                "updates": {"updatedRange": updated, "updatedRows": len(values)}}
+
+    def add_sheet(self, properties: dict) -> dict:
+        title = properties["title"]
+        with self._lock:
+            if title in self.worksheets:
+                raise ValueError(f'A sheet with the name "{title}" already exists.')
+            self.worksheets[title] = MemoryWorksheet(title, [])
+            self.sheet_ids[title] = max(self.sheet_ids.values(), default=-1) + 1
+        self.touch()
+        grid = properties.get("gridProperties", {})
+        return {"sheetId": self.sheet_ids[title], "title": title, "index": self.sheet_ids[title],
+                "sheetType": "GRID", "gridProperties": {"rowCount": grid.get("rowCount", 1000),
+                                                        "columnCount": grid.get("columnCount", 26)}}
+
+    def batch_update(self, requests: list) -> dict:
+        replies = []
+        for request in requests:
+            if "addSheet" in request:
+                replies.append({"addSheet": {"properties": self.add_sheet(request["addSheet"]["properties"])}})
+                continue
+            if "deleteDimension" not in request:
+                raise ValueError(f"unsupported request {next(iter(request), '')}")
+            rng = request["deleteDimension"]["range"]
+            if rng.get("dimension") != "ROWS":
+                raise ValueError("only ROWS deleteDimension is supported")
+            titles = {i: t for t, i in self.sheet_ids.items()}
+            self.worksheets[titles[rng["sheetId"]]].delete_rows(rng["startIndex"] + 1, rng["endIndex"])
+            replies.append({})
+        self.touch()
+        return {"spreadsheetId": self.spreadsheet_id, "replies": replies}
+
+
+def make_handler(state: FakeSheets):
+    sheets_prefix = "/v4/spreadsheets/"
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):  # keep benchmark output clean
+            pass
+
+        def _send(self, status: int, body: dict):
+            payload = json.dumps(body).encode()
+            with state._lock:
+                state.bytes_sent += len(payload)
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=UTF-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _error(self, status: int, message: str, reason: str):
+            self._send(status, {"error": {"code": status, "message": message, "status": reason}})
+
+        def _body(self) -> dict:
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"{}") if length else {}
+
+        def _dispatch(self, verb: str):
+            url = urlsplit(self.path)
+            query = parse_qs(url.query)
+            path = url.path
+            body = self._body() if verb in ("POST", "PUT") else {}
+
+            if path == "/_stats":
+                return self._send(200, state.stats())
+
+            if not state.admit(f"{verb} {_route_name(path)}"):
+                return self._error(429, "Quota exceeded for quota metric 'Read requests' and limit "
+                                        "'Read requests per minute per user'.", "RESOURCE_EXHAUSTED")
+            if state.latency:
+                time.sleep(state.latency)
+
+            try:
+                if path == "/drive/v3/files":
+                    wanted = re.search(r"name = '((?:[^'\\]|\\.)*)'", query.get("q", [""])[0])
+                    files = []
+                    if not wanted or wanted.group(1).replace("\\'", "'") == state.title:
+                        files.append(state.file())
+                    return self._send(200, {"kind": "drive#fileList", "files": files})
+                if path == "/drive/v3/files/" + state.spreadsheet_id:
+                    return self._send(200, state.file())
+
+                if not path.startswith(sheets_prefix + state.spreadsheet_id):
+                    return self._error(404, "Requested entity was not found.", "NOT_FOUND")
+                rest = path[len(sheets_prefix + state.spreadsheet_id):]
+                major = query.get("majorDimension", ["ROWS"])[0]
+
+                if rest == "" and verb == "GET":
+                    return self._send(200, state.metadata())
+                if rest == ":batchUpdate" and verb == "POST":
+                    return self._send(200, state.batch_update(body.get("requests", [])))
+                if rest == "/values:batchGet" and verb == "GET":
+                    ranges = [state.read(r, major) for r in query.get("ranges", [])]
+                    return self._send(200, {"spreadsheetId": state.spreadsheet_id, "valueRanges": ranges})
+                if rest == "/values:batchUpdate" and verb == "POST":
+                    responses = [state.write(d["range"], d["values"]) for d in body.get("data", [])]
+                    return self._send(200, {"spreadsheetId": state.spreadsheet_id, "responses": responses})
+                if rest.startswith("/values/"):
+                    a1 = rest[len("/values/"):]
+                    if a1.endswith(":append") and verb == "POST":
+                        return self._send(200, state.append(a1[:-len(":append")], body.get("values", [])))
+                    if verb == "GET":
+                        return self._send(200, state.read(a1, major))
+                    if verb == "PUT":
+                        return self._send(200, state.write(a1, body.get("values", [])))
+                return self._error(404, f"Unsupported call {verb} {path}", "NOT_FOUND")
+            except KeyError as e:
+                return self._error(400, f"Unable to parse range: {e}", "INVALID_ARGUMENT")
+            except ValueError as e:
+                return self._error(400, str(e), "INVALID_ARGUMENT")
+
+        def do_GET(self):
+            self._dispatch("GET")
+
+        def do_POST(self):
+            self._dispatch("POST")
+
+        def do_PUT(self):
+            self._dispatch("PUT")
+
+    return Handler
+
+
+def _route_name(path: str) -> str:
+    """Stable label for call counting: 'values.get', 'values.append', 'drive.files.list', ..."""
+    if path.startswith("/drive/"):
+        return "drive.files.list" if path.rstrip("/").endswith("/files") else "drive.files.get"
+    if "/values:batchGet" in path:
+        return "values.batchGet"
+    if "/values:batchUpdate" in path:
+        return "values.batchUpdate"
+    if path.endswith(":append"):
+        return "values.append"
+    if "/values/" in path:
+        return "values"
+    if path.endswith(":batchUpdate"):
+        return "batchUpdate"
+    return "spreadsheets.get"
+
+
+def start_server(workbook: dict = None, port: int = 0, latency: float = 0.0, quota_per_minute: int = 0,
+                 rows: int = 1000, seed: int = 0):
+    """
+    Start the fake server on a daemon thread. Returns (server, state, base_url);
+    call server.shutdown() when done. Without a workbook, synthetic data is generated.
+    """
+    if workbook is None:
+        from synthetic_data import generate_workbook
+
+        workbook = generate_workbook(rows, seed)
+    state = FakeSheets(workbook, latency, quota_per_minute)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+# ==============================
+# gspread client pointed at the fake server
+# ==============================
+def fake_client(base_url: str):
+    """gspread.Client whose requests go to base_url instead of Google (no credentials needed)."""
+    import gspread
+    import requests
+
+    class RedirectSession(requests.Session):
+        def request(self, method, url, *args, **kwargs):
+            for host in GOOGLE_HOSTS:
+                if url.startswith(host):
+                    url = base_url.rstrip("/") + url[len(host):]
+                    break
+            return super().request(method, url, *args, **kwargs)
+
+    return gspread.Client(auth=None, session=RedirectSession())
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a local fake Google Sheets server.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rows", type=int, default=10_000, help="Sheet1 rows to seed (Sheet2 gets a quarter)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds added to every call")
+    parser.add_argument("--quota", type=int, default=300, help="calls per minute before 429 (0 = unlimited)")
+    args = parser.parse_args()
+
+    server, _, url = start_server(port=args.port, latency=args.latency, quota_per_minute=args.quota,
+                                  rows=args.rows, seed=args.seed)
+    print(f"Fake Sheets server on {url} ({args.rows} rows, {args.latency}s latency, quota {args.quota}/min)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+# filters.py
+# Filter expressions for the "Updated Data" tables.
+#
+#   Status == "Charged" and Charge > 100 and Agent in ("Haziq", "Arham Ali") and Timestamp >= 2026-10-01
+#
+# Grammar (keywords are case-insensitive):
+#   expr       := term ("or" term)*
+#   term       := factor ("and" factor)*
+#   factor     := "not" factor | "(" expr ")" | comparison
+#   comparison := column OP value                      OP: == != > >= < <=
+#               | column ["not"] "in" "(" value ("," value)* ")"
+#               | column "contains" "text"
+#   column     := a column name (case, spaces and underscores ignored: record_id, AgentName),
+#                 a `back quoted` name, or an alias from ALIASES (Agent, ID, Phone, ...)
+#   value      := "text" | 'text' | number | YYYY-MM-DD [HH:MM[:SS]]
+#
+# The value decides how the column is compared: numbers against the column read as money/number,
+# dates against the column read as timestamps (== on a bare date matches the whole day), text
+# against the stripped cell text (contains ignores case). Nothing is ever evaluated as Python.
+#
+# compile_filter() parses an expression once into a plan (cached per expression); a plan builds
+# one vectorized boolean mask per comparison and combines them with & | ~. filter_frame() also
+# caches the resulting mask per (data version, expression), so an unchanged filter costs nothing
+# on the next rerun.
+
+import re
+from datetime import timedelta
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+import schema
+from charts import ChartCache
+
+MASK_CACHE_SIZE = 32
+ALIASES = {
+    "agent": "Agent Name",
+    "id": "Record_ID",
+    "orderid": "Record_ID",
+    "client": "Name",
+    "phone": "Ph Number",
+    "card": "Card Number",
+    "pin": "PIN CODE",
+    "date": "Date of Charge",
+}
+HELP = (
+    'e.g. Status == "Charged" and Charge > 100 and Agent in ("Haziq", "Arham Ali") '
+    "and Timestamp >= 2026-10-01. Operators: == != > >= < <=, in (...), not in (...), contains, "
+    "and / or / not, parentheses."
+)
+
+_masks = ChartCache(MASK_CACHE_SIZE)
+
+
+class FilterError(ValueError):
+    """The expression could not be parsed or does not match the table's columns."""
+
+
+# ==============================
+# Tokenizer
+# ==============================
+TOKEN = re.compile(r"""
+    \s*(?:
+      (?P<date>\d{4}-\d{2}-\d{2}(?:[ T]\d{1,2}:\d{2}(?::\d{2})?)?)
+    | (?P<number>-?\d+(?:\.\d+)?)
+    | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+    | (?P<quoted>`[^`]+`)
+    | (?P<op>==|!=|>=|<=|>|<|=)
+    | (?P<punct>[(),])
+    | (?P<word>[A-Za-z_][A-Za-z0-9_]*)
+    )""", re.X)
+KEYWORDS = {"and", "or", "not", "in", "contains"}
+TOKEN_NAMES = {
+    "column": "a column", "op": "an operator", "punct": "a bracket or comma",
+    "string": '"text"', "number": "a number", "date": "a date",
+}
+
+
+def tokenize(expr: str) -> list:
+    """[(kind, value, position), ...]; kind is date, number, string, column, op, punct or a keyword."""
+    tokens, pos = [], 0
+    expr = expr.rstrip()
+    while pos < len(expr):
+        m = TOKEN.match(expr, pos)
+        if not m or m.end() == pos:
+            raise FilterError(f"Unexpected character at position {pos + 1}: {expr[pos:pos + 10]!r}")
+        kind = m.lastgroup
+        text = m.group(kind)
+        start = m.start(kind)
+        if kind == "string":
+            tokens.append(("string", re.sub(r"\\(.)", r"\1", text[1:-1]), start))
+        elif kind == "quoted":
+            tokens.append(("column", text[1:-1], start))
+        elif kind == "word" and text.lower() in KEYWORDS:
+            tokens.append((text.lower(), text, start))
+        elif kind == "word":
+            tokens.append(("column", text, start))
+        elif kind == "op":
+            tokens.append(("op", "==" if text == "=" else text, start))
+        else:
+            tokens.append((kind, text, start))
+        pos = m.end()
+    return tokens
+
+
+# ==============================
+# Parser -> AST
+# ==============================
+# ("or", a, b) | ("and", a, b) | ("not", a)
+# ("cmp", column, op, value) | ("in", column, values) | ("contains", column, text)
+# value: ("string", str) | ("number", float) | ("date", Timestamp, whole_day)
+class _Parser:
+    def __init__(self, tokens: list):
+        self.tokens = tokens
+        self.i = 0
+
+    def peek(self, *kinds):
+        return self.i < len(self.tokens) and self.tokens[self.i][0] in kinds
+
+    def take(self, *kinds):
+        if not self.peek(*kinds):
+            wanted = " or ".join(TOKEN_NAMES.get(k, repr(k)) for k in kinds)
+            if self.i >= len(self.tokens):
+                raise FilterError(f"Expression ends early, expected {wanted}")
+            kind, text, pos = self.tokens[self.i]
+            raise FilterError(f"Expected {wanted} at position {pos + 1}, found {text!r}")
+        token = self.tokens[self.i]
+        self.i += 1
+        return token
+
+    def parse(self):
+        node = self.expr()
+        if self.i < len(self.tokens):
+            _, text, pos = self.tokens[self.i]
+            raise FilterError(f"Unexpected {text!r} at position {pos + 1}")
+        return node
+
+    def expr(self):
+        node = self.term()
+        while self.peek("or"):
+            self.take("or")
+            node = ("or", node, self.term())
+        return node
+
+    def term(self):
+        node = self.factor()
+        while self.peek("and"):
+            self.take("and")
+            node = ("and", node, self.factor())
+        return node
+
+    def factor(self):
+        if self.peek("not"):
+            self.take("not")
+            return ("not", self.factor())
+        if self.peek("punct") and self.tokens[self.i][1] == "(":
+            self.take("punct")
+            node = self.expr()
+            self._close()
+            return node
+        return self.comparison()
+
+    def comparison(self):
+        column = self.take("column")[1]
+        if self.peek("not"):
+            self.take("not")
+            self.take("in")
+            return ("not", ("in", column, self._values()))
+        if self.peek("in"):
+            self.take("in")
+            return ("in", column, self._values())
+        if self.peek("contains"):
+            self.take("contains")
+            return ("contains", column, self.take("string")[1])
+        op = self.take("op")[1]
+        return ("cmp", column, op, self.value())
+
+    def value(self):
+        kind, text, pos = self.take("string", "number", "date")
+        if kind == "number":
+            return ("number", float(text))
+        if kind == "date":
+            try:
+                return ("date", pd.Timestamp(text), len(text) == 10)
+            except ValueError:
+                raise FilterError(f"Invalid date {text!r} at position {pos + 1}") from None
+        return ("string", text)
+
+    def _values(self):
+        kind, text, pos = self.take("punct")
+        if text != "(":
+            raise FilterError(f"Expected '(' at position {pos + 1}")
+        values = [self.value()]
+        while self.peek("punct") and self.tokens[self.i][1] == ",":
+            self.take("punct")
+            values.append(self.value())
+        self._close()
+        if len({v[0] for v in values}) > 1:
+            raise FilterError("Values in an in (...) list must all be text, numbers or dates")
+        return tuple(values)
+
+    def _close(self):
+        _, text, pos = self.take("punct")
+        if text != ")":
+            raise FilterError(f"Expected ')' at position {pos + 1}")
+
+
+def parse(expr: str):
+    if not expr.strip():
+        raise FilterError("Empty filter")
+    return _Parser(tokenize(expr)).parse()
+
+
+# ==============================
+# Compiler -> vectorized masks
+# ==============================
+def _norm(name: str) -> str:
+    return re.sub(r"[\s_]", "", name).lower()
+
+
+def resolve_column(name: str, columns) -> str:
+    by_norm = {_norm(c): c for c in columns}
+    key = _norm(name)
+    if key in by_norm:
+        return by_norm[key]
+    alias = ALIASES.get(key)
+    if alias in columns:
+        return alias
+    raise FilterError(f"Unknown column {name!r}. Columns: {', '.join(columns)}")
+
+
+class _Columns:
+    """Typed views of the frame's columns, converted at most once per plan evaluation."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self._typed = {}
+
+    def get(self, column: str, kind: str) -> pd.Series:
+        key = (column, kind)
+        if key not in self._typed:
+            values = self.df[column]
+            if kind == "number":
+                text = values.astype(str).str.replace(r"[\$,]", "", regex=True).str.strip()
+                self._typed[key] = pd.to_numeric(text, errors="coerce")
+            elif kind == "date":
+                self._typed[key] = schema.parse_timestamps(values)
+            else:
+                self._typed[key] = values.astype(str).str.strip()
+        return self._typed[key]
+
+
+def _compare(series: pd.Series, op: str, value, whole_day: bool = False) -> np.ndarray:
+    if whole_day and op in ("==", "!="):
+        inside = (series >= value) & (series < value + timedelta(days=1))
+        return (inside if op == "==" else ~inside).to_numpy()
+    if whole_day and op in (">", "<="):  # "after 2026-10-01" means after that day
+        value = value + timedelta(days=1) - timedelta(microseconds=1)
+    result = {
+        "==": series.__eq__, "!=": series.__ne__, ">": series.__gt__,
+        ">=": series.__ge__, "<": series.__lt__, "<=": series.__le__,
+    }[op](value)
+    return result.fillna(False).to_numpy(dtype=bool) if op != "!=" else result.to_numpy(dtype=bool)
+
+
+def _build(node):
+    """AST node -> function(columns, cols) returning a boolean ndarray."""
+    kind = node[0]
+    if kind in ("and", "or"):
+        left, right = _build(node[1]), _build(node[2])
+        combine = np.logical_and if kind == "and" else np.logical_or
+        return lambda cols, names: combine(left(cols, names), right(cols, names))
+    if kind == "not":
+        inner = _build(node[1])
+        return lambda cols, names: ~inner(cols, names)
+    if kind == "in":
+        _, column, values = node
+        value_kind = values[0][0]
+        if value_kind == "date":
+            checks = [_build(("cmp", column, "==", v)) for v in values]
+            return lambda cols, names: np.logical_or.reduce([c(cols, names) for c in checks])
+        wanted = [v[1] for v in values]
+        return lambda cols, names: cols.get(names[column], value_kind).isin(wanted).to_numpy()
+    if kind == "contains":
+        _, column, text = node
+        return lambda cols, names: (
+            cols.get(names[column], "string").str.contains(text, case=False, regex=False, na=False).to_numpy()
+        )
+    _, column, op, value = node
+    value_kind = value[0]
+    if value_kind == "string" and op not in ("==", "!="):
+        raise FilterError(f"Use == or != (or contains) to compare {column} with text")
+    whole_day = value_kind == "date" and value[2]
+    return lambda cols, names: _compare(cols.get(names[column], value_kind), op, value[1], whole_day)
+
+
+def _columns_of(node, out: set) -> set:
+    if node[0] in ("and", "or"):
+        _columns_of(node[1], out)
+        _columns_of(node[2], out)
+    elif node[0] == "not":
+        _columns_of(node[1], out)
+    else:
+        out.add(node[1])
+    return out
+
+
+class Plan:
+    """A parsed expression, ready to evaluate against any frame."""
+
+    def __init__(self, expr: str):
+        self.expr = expr
+        self.tree = parse(expr)
+        self.columns = sorted(_columns_of(self.tree, set()))
+        self._mask = _build(self.tree)
+
+    def mask(self, df: pd.DataFrame) -> np.ndarray:
+        names = {c: resolve_column(c, list(df.columns)) for c in self.columns}
+        return self._mask(_Columns(df), names)
+
+
+@lru_cache(maxsize=128)
+def compile_filter(expr: str) -> Plan:
+    """Plan for expr, parsed once per distinct expression. Raises FilterError."""
+    return Plan(expr)
+
+
+def filter_frame(df: pd.DataFrame, expr: str, version=None) -> pd.DataFrame:
+    """
+    Rows of df matching expr (all rows when expr is blank). With a data version (e.g.
+    data_layer.snapshot_version) the mask is cached and reused while the data is unchanged.
+    """
+    expr = expr.strip()
+    if not expr or df.empty:
+        return df
+    plan = compile_filter(expr)
+    key = (version, plan.expr) if version is not None else None
+    mask = _masks.get(key) if key else None
+    if mask is None or len(mask) != len(df):
+        mask = plan.mask(df)
+        if key:
+            _masks.put(key, mask)
+    return df[mask]
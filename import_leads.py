@@ -0,0 +1,81 @@
+# import_leads.py
+# Headless bulk import of partner lead spreadsheets into Spectrum (Sheet1).
+#
+# Validates every row in one vectorized pass with the shared schema (schema.py) used by the agent
+# and edit forms (required fields, Spectrum PIN rule, charge format, card/expiry normalization,
+# unique Order ID against the sheet and within the file), appends the valid rows with append_rows in chunks,
+# and writes rejected rows plus their errors to a CSV report.
+#
+# Usage:
+#   python import_leads.py leads.csv --creds service_account.json [--dry-run]
+
+import argparse
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+import pytz
+
+from schema import SHEET_COLUMNS, validate_frame
+
+tz = pytz.timezone("Asia/Karachi")
+SHEET_NAME = "Company_Transactions"
+CHUNK_SIZE = 500
+
+
+def validate_leads(df: pd.DataFrame, existing_ids, sheet: str = "Sheet1") -> tuple:
+    """
+    Validate and normalize the uploaded rows with the shared schema.
+    Returns (valid, rejects): valid has the worksheet columns ready to append, rejects keeps the
+    original columns plus an "Errors" column.
+    """
+    valid, rejects = validate_frame(df, sheet, existing_ids)
+    valid = valid.assign(Status="Pending", Timestamp=datetime.now(tz).strftime("%Y-%m-%d %I:%M:%S %p"))
+    return valid, rejects
+
+
+def append_in_chunks(ws, rows: list, chunk_size: int = CHUNK_SIZE) -> int:
+    for start in range(0, len(rows), chunk_size):
+        ws.append_rows(rows[start:start + chunk_size])
+        print(f"  appended {min(start + chunk_size, len(rows))}/{len(rows)}")
+    return len(rows)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Bulk import leads from a CSV into Spectrum (Sheet1).")
+    parser.add_argument("csv", help="CSV file with Sheet1 column headers")
+    parser.add_argument("--creds", default=os.environ.get("GOOGLE_APPLICATION_CREDENTIALS"),
+                        help="Service account JSON file")
+    parser.add_argument("--sheet", default="Sheet1", help="Target worksheet (default: Sheet1)")
+    parser.add_argument("--rejects", help="Reject report path (default: <csv>_rejects.csv)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="Validate only, do not append")
+    args = parser.parse_args()
+
+    import journal
+    import storage
+
+    leads = pd.read_csv(args.csv, dtype=str, keep_default_na=False)
+    sh = storage.open_spreadsheet(SHEET_NAME, storage.env_config(args.creds))
+    ws = sh.worksheet(args.sheet)
+    existing_ids = ws.col_values(1)[1:]  # Record_ID column only, not the whole sheet
+
+    valid, rejects = validate_leads(leads, existing_ids, args.sheet)
+    print(f"{len(leads)} rows: {len(valid)} valid, {len(rejects)} rejected")
+
+    if not rejects.empty:
+        report = Path(args.rejects or f"{Path(args.csv).with_suffix('')}_rejects.csv")
+        rejects.to_csv(report, index=False)
+        print(f"Rejects written to {report}")
+
+    if not valid.empty and not args.dry_run:
+        append_in_chunks(ws, valid[SHEET_COLUMNS[args.sheet]].values.tolist(), args.chunk_size)
+        journal.attach(sh)
+        journal.record([journal.reload(args.sheet, "import_leads.py")])  # the apps download the sheet again
+    return 0 if rejects.empty else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,310 @@
+# journal.py
+# Append-only journal of the changes the apps make to the transaction sheets.
+#
+# Approvals, declines and edits overwrite cells in place, and new leads and deletions move rows,
+# so the sheet alone cannot tell what changed. Every write made through data_layer's helpers to a
+# JOURNAL_SHEETS worksheet also records one entry per changed field:
+#   When, Who, Sheet, Record_ID, Field, Old, New
+# (Field is INSERT / DELETE for a whole row, with the row as JSON in New / Old). Card details and
+# PINs (SENSITIVE) are never journaled: their values are written as REDACTED. Entries are
+# written to a local JSON-lines file first (TWH_JOURNAL, default .journal/journal.jsonl) and then
+# mirrored to the "Journal" worksheet, which every app process shares. An entry's offset is its
+# position in the Journal worksheet (sheet row - 1); in the local file it is the line number.
+#
+# data_layer catches a stale snapshot up from the journal: it reads only the entries after the
+# offset it last saw (one range read) and applies them with apply(), instead of downloading the
+# whole sheet again. It does so only when the freshness probe shows the revision taken right after
+# its own last journaled write, so any other change (the Sheets UI, another app server, a failed
+# mirror) means a full download, as does a redacted value, which cannot be replayed. Jobs that write the sheets directly (import_leads.py, archive.py)
+# record a RELOAD entry, which makes every reader download the sheet.
+#
+# The journal is also the audit trail:
+#   python journal.py --after 120            entries after offset 120, from the Journal worksheet
+#   python journal.py --local --record 1042  this host's entries for one Record_ID
+
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+import pytz
+
+import perf
+import schema
+from storage import numericise
+
+tz = pytz.timezone("Asia/Karachi")
+SHEET_NAME = "Company_Transactions"
+JOURNAL_TITLE = "Journal"
+JOURNAL_PATH = Path(os.environ.get("TWH_JOURNAL", ".journal/journal.jsonl"))
+JOURNAL_SHEETS = ["Sheet1", "Sheet2"]   # never Sheet3: it holds password hashes
+COLUMNS = ["When", "Who", "Sheet", "Record_ID", "Field", "Old", "New"]
+LAST_COL = chr(ord("A") + len(COLUMNS) - 1)
+INSERT = "(insert)"
+DELETE = "(delete)"
+RELOAD = "(reload)"     # a write that could not be described: readers download the sheet again
+SENSITIVE = {"Card Number", "Expiry Date", "CVC", "PIN CODE"}   # kept out of the journal, like Sheet3
+REDACTED = "(redacted)"
+
+
+# ==============================
+# Entries
+# ==============================
+def _text(value) -> str:
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return ""
+    return str(value)
+
+
+def _value(field: str, value) -> str:
+    text = _text(value)
+    return REDACTED if field in SENSITIVE and text else text
+
+
+def _row(row: dict) -> str:
+    return json.dumps({k: _value(k, v) for k, v in row.items()})
+
+
+def _entry(sheet: str, record_id, field: str, old, new, who: str) -> dict:
+    return {
+        "When": datetime.now(tz).strftime(schema.TIMESTAMP_FORMAT),
+        "Who": who or "-",
+        "Sheet": sheet,
+        "Record_ID": _text(record_id).strip(),
+        "Field": field,
+        "Old": old,
+        "New": new,
+    }
+
+
+def edits(sheet: str, before: dict, after: dict, who: str) -> list:
+    """One entry per field whose text differs between two versions of a row (SENSITIVE ones redacted)."""
+    record_id = before.get("Record_ID", "")
+    return [
+        _entry(sheet, record_id, field, _value(field, before.get(field)), _value(field, value), who)
+        for field, value in after.items()
+        if _text(before.get(field)) != _text(value)
+    ]
+
+
+def insert(sheet: str, row: dict, who: str) -> dict:
+    return _entry(sheet, row.get("Record_ID", ""), INSERT, "", _row(row), who)
+
+
+def delete(sheet: str, row: dict, who: str) -> dict:
+    return _entry(sheet, row.get("Record_ID", ""), DELETE, _row(row), "", who)
+
+
+def reload(sheet: str, who: str) -> dict:
+    return _entry(sheet, "", RELOAD, "", "", who)
+
+
+# ==============================
+# Replay
+# ==============================
+def _compact(frame: pd.DataFrame) -> pd.DataFrame:
+    """Storage form with the dtypes a fresh download would get (all-number columns stay numeric)."""
+    return schema.compact_frame(frame.infer_objects())
+
+
+def apply(df: pd.DataFrame, entries: list):
+    """
+    df with entries applied, rows matched by Record_ID and the index reset so row number stays
+    index + 2. Entries already reflected in df (a delete whose row is gone, an edit setting the
+    current value) change nothing, so a replay that overlaps the download is safe. None when an
+    entry cannot be applied (edit of an unknown row, RELOAD, a REDACTED value) or its row is
+    ambiguous (a Record_ID held by more than one row, as duplicates are, or an insert of one
+    already present): the caller downloads the sheet instead.
+    """
+    if not entries:
+        return df
+    if "Record_ID" not in df.columns:
+        return None
+    ids = df["Record_ID"].astype(str).str.strip().tolist()
+    where = {rid: i for i, rid in enumerate(ids)}
+    count = {}      # Record_ID -> rows holding it
+    for rid in ids:
+        count[rid] = count.get(rid, 0) + 1
+    cells = {}      # column -> {position: value}
+    added = []      # new rows (positions len(df), len(df) + 1, ...)
+    removed = set()
+    for e in entries:
+        rid, field = e["Record_ID"], e["Field"]
+        if field == RELOAD or count.get(rid, 0) > 1:
+            return None
+        if field == INSERT:
+            row = json.loads(e["New"])
+            if rid in where or REDACTED in row.values():
+                return None
+            where[rid], count[rid] = len(ids) + len(added), 1
+            added.append(row)
+            continue
+        pos = where.get(rid)
+        if field == DELETE:
+            if pos is not None:
+                removed.add(where.pop(rid))
+                count[rid] = 0
+            continue
+        if pos is None or field not in df.columns or e["New"] == REDACTED:
+            return None
+        if pos >= len(ids):
+            added[pos - len(ids)][field] = e["New"]
+        else:
+            cells.setdefault(field, {})[pos] = e["New"]
+        new = e["New"].strip()
+        if field == "Record_ID" and new != rid:
+            count[rid], count[new] = 0, count.get(new, 0) + 1
+            where[new] = where.pop(rid)
+
+    out = df.copy(deep=False)
+    for col, changes in cells.items():  # only the touched columns are rebuilt
+        values = out[col].astype(object).to_numpy(copy=True)
+        for pos, value in changes.items():
+            values[pos] = numericise(value)
+        out[col] = _compact(pd.DataFrame({col: values}, index=out.index))[col]
+    if added:
+        new = pd.DataFrame([{c: numericise(row.get(c, "")) for c in df.columns} for row in added])
+        out = _compact(pd.concat([out, new], ignore_index=True))
+    if removed:
+        out = out.drop(index=out.index[sorted(removed)]).reset_index(drop=True)
+    return out
+
+
+# ==============================
+# Local file + Journal worksheet
+# ==============================
+class Journal:
+    def __init__(self, sh=None, path: Path = JOURNAL_PATH):
+        self.sh = sh
+        self.path = Path(path)
+        self._ws = None
+        self._head = 0          # entries known to be in the Journal worksheet
+        self._local = (0, 0)    # (offset, byte position) where the last local read stopped
+        self._lock = threading.Lock()
+
+    def worksheet(self):
+        """The Journal worksheet, created with its header row on first use."""
+        if self._ws is None:
+            import gspread
+
+            try:
+                ws = self.sh.worksheet(JOURNAL_TITLE)
+            except gspread.WorksheetNotFound:
+                ws = self.sh.add_worksheet(title=JOURNAL_TITLE, rows=1000, cols=len(COLUMNS))
+            if not any(cell for row in ws.get(f"A1:{LAST_COL}1") for cell in row):
+                ws.update(values=[COLUMNS], range_name="A1")
+            self._ws = ws
+        return self._ws
+
+    def record(self, entries: list):
+        """Append entries to the local file, then mirror them to the Journal worksheet."""
+        if not entries:
+            return
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(e) + "\n" for e in entries))
+            if self.sh is not None:
+                with perf.timed(f"append_rows {JOURNAL_TITLE}", "sheet"):
+                    self.worksheet().append_rows(
+                        [[e[c] for c in COLUMNS] for e in entries], value_input_option="RAW"
+                    )
+
+    def head(self) -> int:
+        """Offset of the last entry in the Journal worksheet (reads only entries not seen yet)."""
+        with self._lock:
+            with perf.timed(f"Head {JOURNAL_TITLE}", "sheet"):
+                rows = self.worksheet().get(f"A{self._head + 2}:A")
+            self._head += len(rows)
+            return self._head
+
+    def since(self, after: int) -> tuple:
+        """(entries after offset after, new offset), each entry with its Offset."""
+        with self._lock:
+            with perf.timed(f"Replay {JOURNAL_TITLE}", "sheet"):
+                rows = self.worksheet().get(f"A{after + 2}:{LAST_COL}")
+            entries = [
+                {**dict(zip(COLUMNS, row + [""] * (len(COLUMNS) - len(row)))), "Offset": after + i + 1}
+                for i, row in enumerate(rows)
+            ]
+            self._head = max(self._head, after + len(rows))
+            return entries, after + len(rows)
+
+    def read_local(self, after: int = 0) -> tuple:
+        """(entries of the local file after line offset after, new offset)."""
+        with self._lock:
+            offset, pos = self._local if self._local[0] <= after else (0, 0)
+            entries = []
+            if self.path.exists():
+                with open(self.path, "rb") as f:
+                    f.seek(pos)
+                    for line in f:
+                        if not line.endswith(b"\n"):  # a write still in progress
+                            break
+                        offset, pos = offset + 1, pos + len(line)
+                        if offset > after:
+                            entries.append({**json.loads(line), "Offset": offset})
+            self._local = (offset, pos)
+            return entries, offset
+
+
+_journal = Journal()
+_attach_lock = threading.Lock()
+
+
+def attach(sh):
+    """Mirror to (and replay from) the Journal worksheet of sh. Without it the journal is local only."""
+    global _journal
+    with _attach_lock:
+        if _journal.sh is not sh:
+            _journal = Journal(sh, _journal.path)
+
+
+def mirrored() -> bool:
+    return _journal.sh is not None
+
+
+def record(entries: list):
+    _journal.record(entries)
+
+
+def head() -> int:
+    return _journal.head()
+
+
+def since(after: int) -> tuple:
+    return _journal.since(after)
+
+
+def read_local(after: int = 0) -> tuple:
+    return _journal.read_local(after)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Print journal entries after an offset.")
+    parser.add_argument("--after", type=int, default=0, help="print entries after this offset")
+    parser.add_argument("--record", help="only entries for this Record_ID")
+    parser.add_argument("--local", action="store_true", help=f"read {JOURNAL_PATH} instead of the worksheet")
+    parser.add_argument("--creds", default=os.environ.get("GOOGLE_APPLICATION_CREDENTIALS"),
+                        help="Service account JSON file")
+    args = parser.parse_args()
+
+    if not args.local:
+        import storage
+
+        attach(storage.open_spreadsheet(SHEET_NAME, storage.env_config(args.creds)))
+    entries, offset = read_local(args.after) if args.local else since(args.after)
+    if args.record:
+        entries = [e for e in entries if e["Record_ID"] == args.record.strip()]
+    for e in entries:
+        print(f"{e['Offset']:>6}  {e['When']}  {e['Who']:<12} {e['Sheet']:<7} {e['Record_ID']:<10} "
+              f"{e['Field']}: {e['Old']!r} -> {e['New']!r}")
+    print(f"offset {offset}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,122 +5,36 @@
 # Columns in Sheet3: ID | Password | Role | Agent Name
 
 import streamlit as st
-import gspread
 import pandas as pd
 import pytz
 import requests
 import hashlib
-import random
-from pathlib import Path
 from datetime import datetime, timedelta, time as dtime
+from shift_report import shift_report_panel
+from chargebacks import chargeback_panel
+from summary import summary_panel
+import archive
+import cube
+import filters
+import schema
+import theme
+import storage
+import journal
+import perf
+import metrics
+from charts import CHART_TYPES, POINT_BUDGET, RENDERERS, chart_key, render_chart, show_chart
+from data_layer import (
+    StaleRowError, agent_rows, agent_shift_totals, append_row, auto_refresh, delete_rows, get_records_df,
+    invalidate, prefetch, record_ids, snapshot_version, update_cell, update_fields, update_range,
+)
 
 st.set_page_config(page_title="Client Management System — Techware Hub", layout="wide")
+perf.start_rerun("auth")
 
 # ==============================
-# Load external CSS (theme.css)
-# ==============================
-def load_css():
-    try:
-        css = Path("theme.css").read_text(encoding="utf-8")
-        st.markdown(f"<style>{css}</style>", unsafe_allow_html=True)
-    except Exception as e:
-        st.warning(f"theme.css not found or failed to load: {e}")
-
-load_css()
-
-# ==============================
-# Theme definitions (unchanged)
+# Theme (CSS compiled once per process; switching reruns only the picker fragment)
 # ==============================
-light_themes = {
-    "Sunlit Coral":    {"bg1": "#fff8f2", "bg2": "#ffe8df", "accent": "#ff6f61"},
-    "Skyline Blue":    {"bg1": "#f0f8ff", "bg2": "#dcefff", "accent": "#3b82f6"},
-    "Golden Sand":     {"bg1": "#fffbea", "bg2": "#fff2d1", "accent": "#f59e0b"},
-    "Lilac Mist":      {"bg1": "#faf5ff", "bg2": "#f3e8ff", "accent": "#a78bfa"},
-    "Mint Breeze":     {"bg1": "#f0fff9", "bg2": "#d7fff0", "accent": "#10b981"},
-    "Blush Quartz":    {"bg1": "#fff5f7", "bg2": "#ffe3eb", "accent": "#ec4899"},
-    "Azure Frost":     {"bg1": "#f5fbff", "bg2": "#e0f2fe", "accent": "#0284c7"},
-    "Citrus Bloom":    {"bg1": "#fffef2", "bg2": "#fff8d6", "accent": "#facc15"},
-    "Pearl Sage":      {"bg1": "#f9fff9", "bg2": "#e6f7e6", "accent": "#65a30d"},
-    "Creamy Mocha":    {"bg1": "#fffaf5", "bg2": "#f5ebe0", "accent": "#c08457"},
-}
-dark_themes = {
-    "Midnight Gold":   {"bg1": "#0d0d0d", "bg2": "#1a1a1a", "accent": "#ffd700"},
-    "Obsidian Night":  {"bg1": "#0b0c10", "bg2": "#1f2833", "accent": "#66fcf1"},
-    "Crimson":  {"bg1": "#1c0b0b", "bg2": "#2a0f0f", "accent": "#ff4444"},
-    "Neon Violet":     {"bg1": "#12001e", "bg2": "#1e0033", "accent": "#bb00ff"},
-    "Emerald Abyss":   {"bg1": "#001a14", "bg2": "#00322b", "accent": "#00ff99"},
-    "Cyber Pink":      {"bg1": "#0a0014", "bg2": "#1a0033", "accent": "#ff00aa"},
-    "Deep Ocean":      {"bg1": "#0a1b2a", "bg2": "#0d2c4a", "accent": "#1f8ef1"},
-    "Steel Indigo":    {"bg1": "#0c0f1a", "bg2": "#1c2333", "accent": "#7dd3fc"},
-    "Velvet Crimson":  {"bg1": "#1a0000", "bg2": "#330000", "accent": "#e11d48"},
-    "Arctic Noir":     {"bg1": "#050b12", "bg2": "#0e1822", "accent": "#38bdf8"},
-}
-
-if "theme_mode" not in st.session_state:
-    st.session_state.theme_mode = "Dark"
-if "selected_theme" not in st.session_state:
-    theme_set = dark_themes if st.session_state.theme_mode == "Dark" else light_themes
-    random_theme_name = random.choice(list(theme_set.keys()))
-    st.session_state.selected_theme = random_theme_name
-
-def get_contrast_color(hex_color: str) -> str:
-    hex_color = hex_color.lstrip('#')
-    r, g, b = tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-    brightness = (r * 299 + g * 587 + b * 114) / 1000
-    return "#000000" if brightness > 155 else "#ffffff"
-
-def apply_theme_vars():
-    themes = light_themes if st.session_state.theme_mode == "Light" else dark_themes
-    if st.session_state.selected_theme not in themes:
-        st.session_state.selected_theme = list(themes.keys())[0]
-    selected = themes[st.session_state.selected_theme]
-    bg1, bg2, accent = selected["bg1"], selected["bg2"], selected["accent"]
-    text_color = "#111" if st.session_state.theme_mode == "Light" else "#e6e6e6"
-    st.markdown(
-        f"<style>:root{{--bg1:{bg1};--bg2:{bg2};--accent:{accent};--text:{text_color};}}</style>",
-        unsafe_allow_html=True,
-    )
-    return bg1, bg2, accent, text_color
-
-bg1, bg2, accent, text_color = apply_theme_vars()
-title_text_color = get_contrast_color(accent)
-
-st.markdown(
-    f"""
-<div class="app-title" style="font-size:22px; margin: 12px 0 22px;">
-  Client Management System — Techware Hub
-</div>
-""",
-    unsafe_allow_html=True,
-)
-
-col_tm1, col_tm2, _ = st.columns([1, 1, 6])
-with col_tm1:
-    st.markdown("<div style='display:flex; justify-content:center;'>", unsafe_allow_html=True)
-    if st.button("Light Mode", use_container_width=True):
-        if st.session_state.theme_mode != "Light":
-            st.session_state.theme_mode = "Light"
-            st.session_state.selected_theme = list(light_themes.keys())[0]
-            st.rerun()
-    st.markdown("</div>", unsafe_allow_html=True)
-
-with col_tm2:
-    st.markdown("<div style='display:flex; justify-content:center;'>", unsafe_allow_html=True)
-    if st.button("Dark Mode", use_container_width=True):
-        if st.session_state.theme_mode != "Dark":
-            st.session_state.theme_mode = "Dark"
-            st.session_state.selected_theme = list(dark_themes.keys())[0]
-            st.rerun()
-    st.markdown("</div>", unsafe_allow_html=True)
-
-themes = light_themes if st.session_state.theme_mode == "Light" else dark_themes
-
-cols_palette = st.columns(len(themes))
-for i, (theme_name, data) in enumerate(themes.items()):
-    if cols_palette[i].button(theme_name.replace(" ", "\n"), key=f"theme_{theme_name}"):
-        if st.session_state.selected_theme != theme_name:
-            st.session_state.selected_theme = theme_name
-            st.rerun()
+theme.apply_theme()
 
 
 
@@ -132,26 +46,27 @@ SHEET_NAME = "Company_Transactions"
 
 # ==============================
 # Google Sheets setup
+# (storage backend from [storage] in secrets / TWH_STORAGE: gsheets, sqlite or memory)
 # ==============================
-creds = st.secrets["gcp_service_account"]
-gc = gspread.service_account_from_dict(creds)
-ws_spectrum = gc.open(SHEET_NAME).worksheet("Sheet1")
-ws_insurance = gc.open(SHEET_NAME).worksheet("Sheet2")
-ws_users = gc.open(SHEET_NAME).worksheet("Sheet3")
+sh = storage.open_spreadsheet(SHEET_NAME, storage.secrets_config(st.secrets))
+journal.attach(sh)  # status / field changes are journaled to the "Journal" worksheet
+ws_spectrum = sh.worksheet("Sheet1")
+ws_insurance = sh.worksheet("Sheet2")
+ws_users = sh.worksheet("Sheet3")
 
 # ==============================
 # Agent constants (unchanged)
 # ==============================
-AGENTS = ["Select Agent", "Arham Kaleem", "Arham Ali", "Haziq"]
-LLC_OPTIONS = ["Select LLC", "Bite Bazaar LLC", "Apex Prime Solutions"]
-PROVIDERS = ["Select Provider", "Spectrum", "Insurance", "Xfinity", "Frontier", "Optimum"]
+AGENTS = ["Select Agent"] + schema.AGENTS
+LLC_OPTIONS = ["Select LLC"] + schema.SPEC_LLCS
+PROVIDERS = ["Select Provider"] + schema.PROVIDERS
 
 # ==============================
 # Auth utilities (Sheet3)
 # ==============================
 def load_users_df() -> pd.DataFrame:
-    rows = ws_users.get_all_records()
-    return pd.DataFrame(rows) if rows else pd.DataFrame(columns=["ID", "Password", "Role", "Agent Name"])
+    df = get_records_df(ws_users)
+    return df if not df.empty else pd.DataFrame(columns=["ID", "Password", "Role", "Agent Name"])
 
 def hash_password(password: str) -> str:
     return hashlib.sha256(password.encode()).hexdigest()
@@ -178,7 +93,7 @@ def migrate_plain_password_if_needed(user_id: str, input_plain: str) -> bool:
             stored_pw = row[pw_idx]
             if stored_pw == input_plain:
                 new_hash = hash_password(input_plain)
-                ws_users.update_cell(r_idx + 1, pw_idx + 1, new_hash)  # +1: 1-based
+                update_cell(ws_users, r_idx + 1, pw_idx + 1, new_hash, key=row[0])  # +1: 1-based
                 return True
             break
     return False
@@ -217,7 +132,10 @@ def create_user(user_id: str, password: str, role: str, agent_name: str = "") ->
     elif role != "Manager":
         return "Role must be Manager or Agent."
     hashed = hash_password(password)
-    ws_users.append_row([user_id, hashed, role, agent_name if role == "Agent" else ""])
+    append_row(ws_users, schema.to_row(
+        {"ID": user_id, "Password": hashed, "Role": role, "Agent Name": agent_name if role == "Agent" else ""},
+        "Sheet3",
+    ))
     return ""
 
 # ==============================
@@ -228,7 +146,8 @@ def send_pushbullet(title: str, message: str):
         token = st.secrets["pushbullet_token"]
         headers = {"Access-Token": token, "Content-Type": "application/json"}
         data = {"type": "note", "title": title, "body": message}
-        r = requests.post("https://api.pushbullet.com/v2/pushes", json=data, headers=headers, timeout=15)
+        with metrics.pushbullet_timer():
+            r = requests.post("https://api.pushbullet.com/v2/pushes", json=data, headers=headers, timeout=15)
         if r.status_code != 200:
             st.warning(f"Pushbullet failed: {r.status_code}")
     except Exception as e:
@@ -238,8 +157,7 @@ def send_pushbullet(title: str, message: str):
 # Data helpers
 # ==============================
 def load_df(ws) -> pd.DataFrame:
-    records = ws.get_all_records()
-    df = pd.DataFrame(records) if records else pd.DataFrame()
+    df = get_records_df(ws)
     if "Expiry Date" in df.columns:
         df["Expiry Date"] = (
             df["Expiry Date"].astype(str).str.replace("/", "", regex=False).str.strip().str.zfill(4)
@@ -278,20 +196,26 @@ def time_in_range(start: dtime, end: dtime, x: dtime) -> bool:
 
 from datetime import datetime, timedelta, time as dtime
 
+def night_window():
+    """(start, end) of the badge window as naive PKT datetimes."""
+    now = datetime.now(tz)
+
+    # Night window always from today 6 PM to tomorrow 9 AM
+    window_start = datetime.combine(now.date(), dtime(10, 0))  # 6:00 PM today
+    window_end = datetime.combine(now.date() + timedelta(days=1), dtime(9, 0))  # 9:00 AM tomorrow
+    return window_start, window_end
+
+
 def compute_night_window_totals(df_all: pd.DataFrame, agent_filter: str = None) -> float:
     if df_all.empty:
         return 0.0
 
-    df = df_all.copy()
+    df = df_all.copy(deep=False)
     df["Timestamp"] = pd.to_datetime(df["Timestamp"], errors="coerce")
     df = df.dropna(subset=["Timestamp"])
     df = ensure_numeric_charge(df)
 
-    now = datetime.now(tz)
-
-    # Night window always from today 6 PM to tomorrow 9 AM
-    window_start = datetime.combine(now.date(), dtime(10, 0))  # 6:00 PM today
-    window_end = datetime.combine(now.date() + timedelta(days=1), dtime(9, 0))  # 9:00 AM tomorrow
+    window_start, window_end = night_window()
 
     def in_window(ts):
         return window_start <= ts <= window_end
@@ -364,8 +288,10 @@ def auth_screen():
 
 # Guard: show auth if not logged in
 if "logged_in" not in st.session_state or not st.session_state["logged_in"]:
-    auth_screen()
+    auth_screen()  # reads Sheet3 (Users) only
+    perf.finish_rerun()
     st.stop()
+prefetch(ws_spectrum, ws_insurance)  # one round-trip for both instead of two in a row, once logged in
 
 # Logout button
 st.markdown(
@@ -374,10 +300,10 @@ st.markdown(
         <form action="" method="get">
             <button type="submit"
                 style="
-                    background-color:{accent};
-                    color:{get_contrast_color(accent)};
+                    background-color:var(--accent);
+                    color:var(--on-accent);
                     border:none;padding:8px 14px;border-radius:10px;font-weight:700;cursor:pointer;
-                    box-shadow:0 2px 6px {accent}55;transition:all .2s ease;"
+                    box-shadow:0 2px 6px color-mix(in srgb, var(--accent) 33%, transparent);transition:all .2s ease;"
                 name="logout"
             >
                 Logout
@@ -451,7 +377,11 @@ def manager_view():
                         col1, col2 = st.columns(2)
                         with col1:
                             if st.button("Approve", key=f"approve_{label}_{i}"):
-                                worksheet.update_cell(row_number, col_number, "Charged")
+                                try:
+                                    update_cell(worksheet, row_number, col_number, "Charged", key=row["Record_ID"])
+                                except StaleRowError as e:
+                                    st.error(str(e))
+                                    st.stop()
                                 message = (
                                     f"Charge: {row.get('Charge', 'Nil')}\n"
                                     f"Client Name: {row.get('Name', 'Nil')}\n"
@@ -465,24 +395,32 @@ def manager_view():
                                 st.rerun()
                         with col2:
                             if st.button("Decline", key=f"decline_{label}_{i}"):
-                                worksheet.update_cell(row_number, col_number, "Declined")
+                                try:
+                                    update_cell(worksheet, row_number, col_number, "Declined", key=row["Record_ID"])
+                                except StaleRowError as e:
+                                    st.error(str(e))
+                                    st.stop()
                                 st.error("Declined successfully.")
                                 st.rerun()
     if st.button("Refresh Page", key="agent_refresh_btn"):
+        invalidate(ws_spectrum, ws_insurance)
         st.rerun()
+    auto_refresh([ws_spectrum, ws_insurance])  # rerun when an agent submits or another manager acts
+    perf.lap("Load sheets", "sheet")
     tab1, tab2, tab3 = st.tabs(["Spectrum", "Insurance", "Updated Data"])
     with tab1:
         render_transaction_tabs(df_spectrum, ws_spectrum, "spectrum")
+        perf.lap("Spectrum queue", "render")
     with tab2:
         render_transaction_tabs(df_insurance, ws_insurance, "insurance")
+        perf.lap("Insurance queue", "render")
     with tab3:
         st.subheader("Edit Transaction Status (by Record ID)")
         sheet_option = st.selectbox("Select Sheet", ["Spectrum (Sheet1)", "Insurance (Sheet2)"])
         worksheet = ws_spectrum if sheet_option.startswith("Spectrum") else ws_insurance
 
         try:
-            all_records = worksheet.get_all_records()
-            df_all = pd.DataFrame(all_records) if all_records else pd.DataFrame()
+            df_all = get_records_df(worksheet)
         except Exception as e:
             st.error(f"Error loading sheet data: {e}")
             df_all = pd.DataFrame()
@@ -496,7 +434,15 @@ def manager_view():
                 if not matched.empty:
                     record = matched.iloc[0]
                 else:
-                    st.warning("No matching Record ID found.")
+                    archived = archive.find_record(worksheet.title, record_id_input, sh)
+                    if not archived.empty:
+                        st.info(
+                            f"Record ID {record_id_input} is archived ({', '.join(archived['Partition'].unique())}); "
+                            "archived records are read-only."
+                        )
+                        st.dataframe(archived, use_container_width=True)
+                    else:
+                        st.warning("No matching Record ID found.")
 
             if record is not None:
                 st.info(f"Editing Record ID: {record['Record_ID']}")
@@ -534,7 +480,7 @@ def manager_view():
                         row_index = df_all.index[df_all["Record_ID"] == record["Record_ID"]].tolist()
                         if row_index:
                             row_num = row_index[0] + 2
-                            worksheet.delete_rows(row_num)
+                            delete_rows(worksheet, row_num, key=record["Record_ID"])
                             st.success(f"Record {record['Record_ID']} deleted successfully.")
                             st.rerun()
                         else:
@@ -547,45 +493,7 @@ def manager_view():
                         row_index = df_all.index[df_all["Record_ID"] == record["Record_ID"]].tolist()
                         if row_index:
                             row_num = row_index[0] + 2
-                            if sheet_option.startswith("Spectrum"):
-                                updated_data = [
-                                    str(record["Record_ID"]),
-                                    str(record["Agent Name"]),
-                                    str(record["Name"]),
-                                    str(record["Ph Number"]),
-                                    str(record["Address"]),
-                                    str(record["Email"]),
-                                    str(record["Card Holder Name"]),
-                                    str(record["Card Number"]),
-                                    str(record["Expiry Date"]),
-                                    int(record["CVC"]) if pd.notna(record["CVC"]) else 0,
-                                    str(new_charge),
-                                    str(record["LLC"]),
-                                    str(record["Provider"]),
-                                    str(record["Date of Charge"]),
-                                    str(new_status),
-                                    str(record["Timestamp"]),
-                                ]
-                                worksheet.update(f"A{row_num}:P{row_num}", [updated_data])
-                            else:
-                                updated_data = [
-                                    str(record["Record_ID"]),
-                                    str(record["Agent Name"]),
-                                    str(record["Name"]),
-                                    str(record["Ph Number"]),
-                                    str(record["Address"]),
-                                    str(record["Email"]),
-                                    str(record["Card Holder Name"]),
-                                    str(record["Card Number"]),
-                                    str(record["Expiry Date"]),
-                                    int(record["CVC"]) if pd.notna(record["CVC"]) else 0,
-                                    str(new_charge),
-                                    str(record["LLC"]),
-                                    str(record["Date of Charge"]),
-                                    str(new_status),
-                                    str(record["Timestamp"]),
-                                ]
-                                worksheet.update(f"A{row_num}:O{row_num}", [updated_data])
+                            update_fields(worksheet, row_num, {"Charge": new_charge, "Status": new_status}, key=record["Record_ID"])
                             st.success(f"Record {record['Record_ID']} updated successfully.")
                             st.rerun()
                         else:
@@ -605,115 +513,114 @@ def manager_view():
         if df_all.empty:
             st.info("No data available in the selected sheet.")
         else:
-            st.dataframe(style_status_rows(df_all), use_container_width=True)
+            filter_expr = st.text_input("Filter", key="ud_filter_expr", help=filters.HELP,
+                                        placeholder='Status == "Charged" and Charge > 100')
+            try:
+                df_shown = filters.filter_frame(df_all, filter_expr, snapshot_version(worksheet))
+            except filters.FilterError as e:
+                st.error(f"Filter: {e}")
+                df_shown = df_all
+            if filter_expr.strip():
+                st.caption(f"{len(df_shown):,} of {len(df_all):,} rows match.")
+            st.dataframe(style_status_rows(df_shown), use_container_width=True)
         
         # --- Per-sheet analysis (scoped to the selected sheet) ---
+        perf.lap("Edit & tables", "render")
         st.divider()
         st.subheader("Transaction Analysis (Selected Sheet)")
         
         try:
-            import matplotlib.pyplot as plt
-            import matplotlib.dates as mdates
-            import seaborn as sns
+            import matplotlib  # noqa: F401  (charts.py draws the static charts with it)
         except Exception:
-            st.info("Matplotlib/Seaborn not available. Skipping charts.")
+            st.info("Matplotlib not available. Skipping charts.")
         else:
             if df_all.empty:
                 st.info("No data available for analysis in the selected sheet.")
             else:
-                df_analysis = df_all.copy()
-        
-                # Parse fields
-                df_analysis["Timestamp"] = pd.to_datetime(df_analysis["Timestamp"], errors="coerce")
-                df_analysis = df_analysis.dropna(subset=["Timestamp"])
-                df_analysis["ChargeFloat"] = pd.to_numeric(
-                    df_analysis["Charge"].replace('[\\$,]', '', regex=True), errors="coerce"
-                ).fillna(0.0)
+                # Pre-aggregated cube of the snapshot (cube.py); every widget below slices it
+                live_cube = cube.for_worksheet(worksheet)
         
                 # Filters
                 c1, c2, c3 = st.columns(3)
                 with c1:
-                    ag_list = ["All Agents"] + sorted(df_analysis["Agent Name"].dropna().unique().tolist())
+                    ag_list = ["All Agents"] + sorted(cube.members(live_cube, "Agent Name"))
                     agent_filter = st.selectbox("Filter by Agent", ag_list, key="ud_agent_filter")
                 with c2:
-                    st_list = ["All Status"] + df_analysis["Status"].dropna().unique().tolist()
+                    st_list = ["All Status"] + cube.members(live_cube, "Status")
                     status_filter = st.selectbox("Filter by Status", st_list, key="ud_status_filter")
                 with c3:
-                    chart_type = st.selectbox("Chart Type", ["Bar", "Line", "Stacked Bar"], key="ud_chart_type")
+                    chart_type = st.selectbox("Chart Type", CHART_TYPES, key="ud_chart_type")
+                col_r1, col_r2 = st.columns([3, 1])
+                with col_r1:
+                    renderer = st.radio("Renderer", RENDERERS, horizontal=True, key="ud_renderer")
+                with col_r2:
+                    full_resolution = st.checkbox(
+                        "Full resolution", value=False, key="ud_full_resolution",
+                        help=f"Draw every hourly point. By default charts are reduced to {POINT_BUDGET} points.",
+                    )
+                max_points = None if full_resolution else POINT_BUDGET
         
                 d1, d2 = st.columns(2)
                 with d1:
-                    min_ts = df_analysis["Timestamp"].min()
+                    min_ts = live_cube["Hour"].min()
                     start_date = st.date_input(
                         "From Date",
                         value=min_ts.date() if pd.notna(min_ts) else datetime.now().date(),
                         key="ud_start_date",
                     )
-                    start_time = st.time_input("From Time", value=dtime(0, 0, 0), key="ud_start_time")
+                    start_time = st.time_input("From Time", value=dtime(0, 0), step=timedelta(hours=1), key="ud_start_time")
                 with d2:
-                    max_ts = df_analysis["Timestamp"].max()
+                    max_ts = live_cube["Hour"].max()
                     end_date = st.date_input(
                         "To Date",
                         value=max_ts.date() if pd.notna(max_ts) else datetime.now().date(),
                         key="ud_end_date",
                     )
-                    end_time = st.time_input("To Time", value=dtime(23, 59, 59), key="ud_end_time")
-        
-                start_dt = tz.localize(datetime.combine(start_date, start_time))
-                end_dt = tz.localize(datetime.combine(end_date, end_time))
-        
-                # Apply filters
-                df_plot = df_analysis.copy()
-                if agent_filter != "All Agents":
-                    df_plot = df_plot[df_plot["Agent Name"] == agent_filter]
-                if status_filter != "All Status":
-                    df_plot = df_plot[df_plot["Status"] == status_filter]
+                    end_time = st.time_input(
+                        "To Time", value=dtime(23, 0), step=timedelta(hours=1), key="ud_end_time",
+                        help="Charges are counted per hour: the To hour is included in full.",
+                    )
         
-                # Localize to PKT for display range
-                # If your timestamps are already PKT (not UTC), remove the next line and just filter directly
-                try:
-                    df_plot["Timestamp"] = df_plot["Timestamp"].dt.tz_localize("UTC").dt.tz_convert(tz)
-                except (TypeError, AttributeError, ValueError):
-                    # Already tz-aware or naive: fall back to naive filtering
-                    pass
+                # whole hours, the grain of the cube
+                start_dt = tz.localize(datetime.combine(start_date, start_time.replace(minute=0, second=0)))
+                end_dt = tz.localize(datetime.combine(end_date, end_time.replace(minute=59, second=59)))
         
-                df_plot = df_plot[(df_plot["Timestamp"] >= start_dt) & (df_plot["Timestamp"] <= end_dt)]
+                # Archived months inside the range (only the partitions it overlaps are read)
+                archived_cube, archived_rows, months = cube.for_archive(worksheet.title, start_dt, end_dt, sh)
+                if archived_rows:
+                    st.caption(f"Including {archived_rows:,} archived rows ({', '.join(months)}).")
+
+                # Apply filters (cube cells in the range; timestamps are read as UTC, shown in PKT)
+                df_plot = cube.select(
+                    cube.merge(live_cube, archived_cube), start_dt, end_dt, tz,
+                    where={
+                        "Agent Name": None if agent_filter == "All Agents" else agent_filter,
+                        "Status": None if status_filter == "All Status" else status_filter,
+                    },
+                )
         
                 if df_plot.empty:
                     st.info("No data available for selected filters and date range.")
                 else:
-                    df_plot["Hour"] = df_plot["Timestamp"].dt.floor("h")
-                    hourly_sum = df_plot.groupby("Hour")["ChargeFloat"].sum().reset_index()
-        
-                    sns.set_palette("tab20")
-                    fig, ax = plt.subplots(figsize=(12, 6))
-                    if chart_type == "Bar":
-                        ax.bar(hourly_sum["Hour"], hourly_sum["ChargeFloat"])
-                    elif chart_type == "Line":
-                        ax.plot(hourly_sum["Hour"], hourly_sum["ChargeFloat"], marker="o", linestyle="-")
-                    else:
-                        df_stack = df_plot.pivot_table(
-                            index="Hour", columns="Status", values="ChargeFloat", aggfunc="sum", fill_value=0
-                        )
-                        df_stack.plot(kind="bar", stacked=True, ax=ax)
+                    hourly_sum = cube.hourly(df_plot)
         
-                    ax.xaxis.set_major_formatter(mdates.DateFormatter("%Y-%m-%d %H:%M:%S"))
-                    plt.xticks(rotation=45)
-                    ax.set_xlabel("Timestamp")
-                    ax.set_ylabel("Total Charge ($)")
-                    ax.set_title(
+                    title = (
                         f"Total Charges from {start_dt.strftime('%Y-%m-%d %H:%M:%S')} "
                         f"to {end_dt.strftime('%Y-%m-%d %H:%M:%S')} — {sheet_option.split()[0]}"
                     )
-                    ax.grid(alpha=0.3)
-                    st.pyplot(fig)
+                    key = chart_key(
+                        (snapshot_version(worksheet), archive.catalog_version()), sheet_option, agent_filter,
+                        status_filter, chart_type, start_dt, end_dt, renderer, max_points,
+                    )
+                    chart = render_chart(key, hourly_sum, df_plot, chart_type, title, renderer, max_points=max_points)
+                    show_chart(chart, len(hourly_sum), max_points)
         
                     # Summary metrics (selected sheet only)
                     m1, m2, m3, m4 = st.columns(4)
                     with m1:
                         st.metric("Total Charge (Selected Sheet)", f"${df_plot['ChargeFloat'].sum():,.2f}")
                     with m2:
-                        st.metric("Total Transactions", f"{len(df_plot):,}")
+                        st.metric("Total Transactions", f"{df_plot['Count'].sum():,}")
                     with m3:
                         avg_per_hour = hourly_sum["ChargeFloat"].mean() if not hourly_sum.empty else 0.0
                         st.metric("Average per Hour", f"${avg_per_hour:,.2f}")
@@ -727,7 +634,7 @@ def manager_view():
                     st.divider()
                     
                     if not df_all.empty:
-                        night_total = compute_night_window_totals(df_all.copy())
+                        night_total = compute_night_window_totals(df_all)
                     
                         # This won't render multiline label properly in st.metric
                         st.metric(
@@ -741,16 +648,16 @@ def manager_view():
                             f"""
                             <div class="badge-fixed-top-right"
                                 style="
-                                    background-color: {accent};
-                                    box-shadow: 0 2px 6px {accent}55;
+                                    background-color: var(--accent);
+                                    box-shadow: 0 2px 6px color-mix(in srgb, var(--accent) 33%, transparent);
                                     border-radius: 10px;
                                     padding: 8px 14px;
                                     font-weight: 900;
                                 "
                             >
-                              <span class="badge-label" style="color: {get_contrast_color(accent)};">Night Charged Total</span>
-                              <span class="badge-label" style="color: {get_contrast_color(accent)};">Today's Total</span>
-                              <span class="badge-amount" style="color: {get_contrast_color(accent)};">{badge_amount}</span>
+                              <span class="badge-label" style="color: var(--on-accent);">Night Charged Total</span>
+                              <span class="badge-label" style="color: var(--on-accent);">Today's Total</span>
+                              <span class="badge-amount" style="color: var(--on-accent);">{badge_amount}</span>
                             </div>
                             """,
                             unsafe_allow_html=True,
@@ -760,6 +667,17 @@ def manager_view():
                     else:
                         st.metric("Night Charged Total — Selected Sheet (Today's Window)", "$0.00")
 
+        perf.lap("Analysis & night totals", "render")
+        st.divider()
+        shift_report_panel({"Spectrum": df_spectrum, "Insurance": df_insurance})
+        perf.lap("Shift report", "render")
+        st.divider()
+        chargeback_panel([ws_spectrum, ws_insurance], sh)
+        perf.lap("Chargebacks", "render")
+        st.divider()
+        summary_panel(sh)
+        perf.lap("Shift summaries", "render")
+
 
 # ==============================
 # AGENT VIEW
@@ -773,13 +691,14 @@ def agent_view(agent_name: str):
     col_b1, col_b2 = st.columns(2)
     with col_b1:
         if st.button("Refresh Page", key="agent_refresh_btn"):
+            invalidate(ws_spectrum)
             st.rerun()
     with col_b2:
         if st.button("Clear Form", key="agent_clear_btn"):
             for k in [
                 "order_id", "name", "phone", "address", "email",
                 "card_holder", "card_number", "expiry", "cvc",
-                "charge", "llc", "provider", "date_of_charge"
+                "charge", "llc", "provider", "pin_code", "date_of_charge"
             ]:
                 if k in st.session_state:
                     del st.session_state[k]
@@ -787,18 +706,20 @@ def agent_view(agent_name: str):
             st.rerun()
 
     # ---------------------------------------------------------
-    # Load Spectrum rows for duplicate check + "My Submissions"
+    # This agent's Spectrum rows + all Record IDs (duplicate check), from the shared snapshot
     # ---------------------------------------------------------
     try:
-        all_records = ws_spectrum.get_all_records()
-        df_all = pd.DataFrame(all_records) if all_records else pd.DataFrame()
+        df_mine_all = agent_rows(ws_spectrum, agent_name)
+        existing_ids = record_ids(ws_spectrum)
     except Exception as e:
         st.error(f"Error loading Spectrum data: {e}")
-        df_all = pd.DataFrame()
+        df_mine_all = pd.DataFrame()
+        existing_ids = None
 
     # ---------------------------------------------------------
     # Submit New Client (writes to Spectrum / Sheet1)
     # ---------------------------------------------------------
+    perf.lap("Load Spectrum", "sheet")
     st.subheader("Submit New Client")
     st.write("New submissions are saved to Spectrum (Sheet1). Workflow remains unchanged.")
 
@@ -819,61 +740,34 @@ def agent_view(agent_name: str):
             charge = st.text_input("Charge Amount", key="charge")
             llc = st.selectbox("LLC", LLC_OPTIONS, key="llc")
             provider = st.selectbox("Provider", PROVIDERS, key="provider")
+            pin_code = st.text_input("4-Digit PIN Code", key="pin_code")
             date_of_charge = st.date_input("Date of Charge", key="date_of_charge", value=datetime.now().date())
 
         submitted = st.form_submit_button("Submit", use_container_width=True)
 
     if submitted:
-        missing = []
-        if not record_id_input.strip(): missing.append("Order ID")
-        if not name: missing.append("Client Name")
-        if not phone: missing.append("Phone Number")
-        if not address: missing.append("Address")
-        if not email: missing.append("Email")
-        if not card_holder: missing.append("Card Holder Name")
-        if not card_number: missing.append("Card Number")
-        if not expiry: missing.append("Expiry Date")
-        if not charge: missing.append("Charge Amount")
-        if llc == "Select LLC": missing.append("LLC")
-        if provider == "Select Provider": missing.append("Provider")
-        if missing:
-            st.error(f"Please fill in all required fields: {', '.join(missing)}")
-            st.stop()
-
-        if not df_all.empty and record_id_input.strip() in df_all["Record_ID"].astype(str).values:
-            st.error("Order ID already exists. Please enter a unique Order ID.")
-            st.stop()
-
-        card_number_clean = card_number.replace(" ", "").replace("-", "")
-        expiry_clean = expiry.replace("/", "").replace("-", "").replace(" ", "")
-        try:
-            charge_value = float(str(charge).replace("$", "").strip())
-            charge_fmt = f"${charge_value:.2f}"
-        except ValueError:
-            st.error("Charge amount must be numeric (e.g., 29 or 29.00).")
+        record, errors = schema.validate_record(
+            {
+                "Record_ID": record_id_input, "Agent Name": agent_name, "Name": name,
+                "Ph Number": phone, "Address": address, "Email": email,
+                "Card Holder Name": card_holder, "Card Number": card_number, "Expiry Date": expiry,
+                "CVC": cvc, "Charge": charge, "LLC": llc, "Provider": provider,
+                "Date of Charge": date_of_charge, "Status": "Pending",
+                "Timestamp": datetime.now(tz).strftime("%Y-%m-%d %I:%M:%S %p"), "PIN CODE": pin_code,
+            },
+            "Sheet1",
+            existing_ids=existing_ids or None,
+            choices={"LLC": schema.SPEC_LLCS},
+        )
+        if errors:
+            for message in errors:
+                st.error(message)
             st.stop()
 
-        record_id = record_id_input.strip()
-        timestamp = datetime.now(tz).strftime("%Y-%m-%d %I:%M:%S %p")
-        data = [
-            record_id,
-            agent_name,
-            name,
-            phone,
-            address,
-            email,
-            card_holder,
-            card_number_clean,
-            expiry_clean,
-            cvc,
-            charge_fmt,
-            llc,
-            provider,
-            date_of_charge.strftime("%Y-%m-%d"),
-            "Pending",
-            timestamp,
-        ]
-        ws_spectrum.append_row(data)
+        timestamp = record["Timestamp"]
+        card_number_clean, expiry_clean, charge_fmt = record["Card Number"], record["Expiry Date"], record["Charge"]
+        data = schema.to_row(record, "Sheet1")
+        append_row(ws_spectrum, data)
         st.success(f"Details for {name} added successfully.")
 
         try:
@@ -905,13 +799,14 @@ Submitted At: {timestamp}
     # ---------------------------------------------------------
     # My Submissions
     # ---------------------------------------------------------
+    perf.lap("Submit form", "render")
     st.divider()
     st.subheader("My Submissions")
 
-    if df_all.empty:
+    if not existing_ids:
         st.info("No records available yet.")
     else:
-        df_mine = df_all[df_all["Agent Name"] == agent_name].copy()
+        df_mine = df_mine_all.copy(deep=False)
         if df_mine.empty:
             st.info("No records found for this agent.")
         else:
@@ -951,12 +846,12 @@ Submitted At: {timestamp}
     edit_rid = st.text_input("Enter Record ID to edit", key="agent_edit_rid").strip()
 
     if edit_rid:
-        if df_all.empty:
+        if not existing_ids:
             st.warning("No records available in Spectrum (Sheet1).")
         else:
             # Normalize and filter to the agent's own record
-            df_all["Record_ID"] = df_all["Record_ID"].astype(str).str.strip()
-            df_all_agent = df_all[(df_all["Record_ID"] == edit_rid) & (df_all["Agent Name"] == agent_name)]
+            df_mine_all["Record_ID"] = df_mine_all["Record_ID"].astype(str).str.strip()
+            df_all_agent = df_mine_all[df_mine_all["Record_ID"] == edit_rid]
 
             if df_all_agent.empty:
                 st.error("No matching record found for your Agent Name and this Record ID.")
@@ -993,6 +888,7 @@ Submitted At: {timestamp}
                             index=PROVIDERS.index(record.get("Provider", "Select Provider")) if record.get("Provider", "Select Provider") in PROVIDERS else 0,
                             disabled=not can_edit, key="ae_provider"
                         )
+                        new_pin_code = st.text_input("4-Digit PIN Code", value=str(record.get("PIN CODE", "") or "Nil"), disabled=not can_edit, key="ae_pin")
                         try:
                             default_doc = pd.to_datetime(record.get("Date of Charge")).date()
                         except Exception:
@@ -1005,65 +901,60 @@ Submitted At: {timestamp}
 
                 if do_update:
                     try:
-                        new_card_number_clean = new_card_number.replace(" ", "").replace("-", "")
-                        new_expiry_clean = new_expiry.replace("/", "").replace("-", "").replace(" ", "")
-                        try:
-                            charge_value = float(str(new_charge).replace("$", "").strip())
-                            new_charge_fmt = f"${charge_value:.2f}"
-                        except ValueError:
-                            st.error("Charge amount must be numeric (e.g., 29 or 29.00).")
+                        updated_record, errors = schema.validate_record(
+                            {
+                                "Record_ID": record["Record_ID"], "Agent Name": agent_name, "Name": new_name,
+                                "Ph Number": new_phone, "Address": new_address, "Email": new_email,
+                                "Card Holder Name": new_card_holder, "Card Number": new_card_number,
+                                "Expiry Date": new_expiry, "CVC": new_cvc, "Charge": new_charge,
+                                "LLC": new_llc, "Provider": new_provider, "Date of Charge": new_date_of_charge,
+                                "Status": status_value,                         # keep status unchanged
+                                "Timestamp": record.get("Timestamp", ""),      # preserve original timestamp
+                                "PIN CODE": new_pin_code,
+                            },
+                            "Sheet1",
+                            choices={"LLC": schema.SPEC_LLCS},
+                        )
+                        if errors:
+                            for message in errors:
+                                st.error(message)
                             st.stop()
 
-                        # Find row number in Spectrum sheet and update A:P
-                        row_index = df_all.index[df_all["Record_ID"] == record["Record_ID"]].tolist()
+                        # Find row number in Spectrum sheet and update the full row
+                        row_index = df_mine_all.index[df_mine_all["Record_ID"] == record["Record_ID"]].tolist()
                         if not row_index:
                             st.error("Record not found in sheet. Try refreshing.")
                             st.stop()
                         row_num = row_index[0] + 2  # account for header
 
-                        updated_data = [
-                            str(record["Record_ID"]),
-                            str(agent_name),
-                            str(new_name),
-                            str(new_phone),
-                            str(new_address),
-                            str(new_email),
-                            str(new_card_holder),
-                            str(new_card_number_clean),
-                            str(new_expiry_clean),
-                            str(new_cvc),
-                            str(new_charge_fmt),
-                            str(new_llc),
-                            str(new_provider),
-                            new_date_of_charge.strftime("%Y-%m-%d"),
-                            status_value,                               # keep status unchanged
-                            str(record.get("Timestamp", "")),          # preserve original timestamp
-                        ]
-
-                        ws_spectrum.update(f"A{row_num}:P{row_num}", [updated_data])
+                        update_range(ws_spectrum, schema.row_range("Sheet1", row_num), [schema.to_row(updated_record, "Sheet1")], key=record["Record_ID"])
                         st.success(f"Lead {record['Record_ID']} updated successfully.")
                         st.rerun()
                     except Exception as e:
                         st.error(f"Error updating lead: {e}")
 
+    perf.lap("Submissions & edit", "render")
     # ---------------------------------------------------------
     # Night badge for this agent (Spectrum only)
     # ---------------------------------------------------------
-    total_night_agent = compute_night_window_totals(df_all if 'df_all' in locals() else pd.DataFrame(), agent_filter=agent_name)
+    try:
+        total_night_agent = float(agent_shift_totals(ws_spectrum, *night_window()).get(agent_name, 0.0))
+    except Exception:
+        total_night_agent = 0.0
     total_night_agent_str = f"${total_night_agent:,.2f}"
     st.markdown(
         f"""
     <div class="badge-fixed-top-right" 
          style="
-           background-color: {accent};
-           box-shadow: 0 2px 6px {accent}55;
+           background-color: var(--accent);
+           box-shadow: 0 2px 6px color-mix(in srgb, var(--accent) 33%, transparent);
            border-radius: 10px;
            padding: 8px 14px;
            font-weight: 700;
          ">
-      <span class="badge-label" style="color: {get_contrast_color(accent)};">Night Charged Total</span>
-      <span class="badge-label" style="color: {get_contrast_color(accent)};">Today's Total</span>
-      <span class="badge-amount" style="color: {get_contrast_color(accent)};">{total_night_agent_str}</span>
+      <span class="badge-label" style="color: var(--on-accent);">Night Charged Total</span>
+      <span class="badge-label" style="color: var(--on-accent);">Today's Total</span>
+      <span class="badge-amount" style="color: var(--on-accent);">{total_night_agent_str}</span>
     </div>
     """,
         unsafe_allow_html=True,
@@ -1076,8 +967,15 @@ role = st.session_state.get("role", "")
 agent_identity = st.session_state.get("agent_name", "").strip()
 
 if role == "Manager":
+    perf.set_view("manager")
+    perf.lap("Theme & auth", "render")
     manager_view()
+    perf.performance_panel()
 elif role == "Agent":
+    perf.set_view("agent")
+    perf.lap("Theme & auth", "render")
     agent_view(agent_identity)
+    perf.lap("Night badge", "parse")
+    perf.finish_rerun()
 else:
     st.error("Unknown role. Please check the users sheet.")
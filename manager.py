@@ -1,121 +1,36 @@
 import streamlit as st
-import gspread
 import pandas as pd
 from datetime import datetime, timedelta
 import pytz
 import requests
 import time
-import random
 from datetime import datetime, timedelta, time
-from pathlib import Path
+from shift_report import shift_report_panel
+from chargebacks import chargeback_panel
+from summary import summary_panel
+from data_layer import (
+    StaleRowError, append_row, auto_refresh, delete_rows, get_records_df, invalidate, prefetch,
+    snapshot_version, update_cell, update_fields,
+)
+from exports import available_formats, export_file_name, export_mime, lazy_export
+import archive
+import cube
+import filters
+import schema
+import theme
+import storage
+import journal
+import perf
+import metrics
+from charts import CHART_TYPES, POINT_BUDGET, RENDERERS, chart_key, render_chart, show_chart
 
 st.set_page_config(page_title="Client Management System — Techware Hub", layout="wide")
+perf.start_rerun("auth")
 
 # ==============================
-# Load external CSS (theme.css)
-# ==============================
-def load_css():
-    try:
-        css = Path("theme.css").read_text(encoding="utf-8")
-        st.markdown(f"<style>{css}</style>", unsafe_allow_html=True)
-    except Exception as e:
-        st.warning(f"theme.css not found or failed to load: {e}")
-
-load_css()
-
+# Theme (CSS compiled once per process; switching reruns only the picker fragment)
 # ==============================
-# Theme definitions (unchanged)
-# ==============================
-light_themes = {
-    "Sunlit Coral":    {"bg1": "#fff8f2", "bg2": "#ffe8df", "accent": "#ff6f61"},
-    "Skyline Blue":    {"bg1": "#f0f8ff", "bg2": "#dcefff", "accent": "#3b82f6"},
-    "Golden Sand":     {"bg1": "#fffbea", "bg2": "#fff2d1", "accent": "#f59e0b"},
-    "Lilac Mist":      {"bg1": "#faf5ff", "bg2": "#f3e8ff", "accent": "#a78bfa"},
-    "Mint Breeze":     {"bg1": "#f0fff9", "bg2": "#d7fff0", "accent": "#10b981"},
-    "Blush Quartz":    {"bg1": "#fff5f7", "bg2": "#ffe3eb", "accent": "#ec4899"},
-    "Azure Frost":     {"bg1": "#f5fbff", "bg2": "#e0f2fe", "accent": "#0284c7"},
-    "Citrus Bloom":    {"bg1": "#fffef2", "bg2": "#fff8d6", "accent": "#facc15"},
-    "Pearl Sage":      {"bg1": "#f9fff9", "bg2": "#e6f7e6", "accent": "#65a30d"},
-    "Creamy Mocha":    {"bg1": "#fffaf5", "bg2": "#f5ebe0", "accent": "#c08457"},
-}
-dark_themes = {
-    "Midnight Gold":   {"bg1": "#0d0d0d", "bg2": "#1a1a1a", "accent": "#ffd700"},
-    "Obsidian Night":  {"bg1": "#0b0c10", "bg2": "#1f2833", "accent": "#66fcf1"},
-    "Crimson":  {"bg1": "#1c0b0b", "bg2": "#2a0f0f", "accent": "#ff4444"},
-    "Neon Violet":     {"bg1": "#12001e", "bg2": "#1e0033", "accent": "#bb00ff"},
-    "Emerald Abyss":   {"bg1": "#001a14", "bg2": "#00322b", "accent": "#00ff99"},
-    "Cyber Pink":      {"bg1": "#0a0014", "bg2": "#1a0033", "accent": "#ff00aa"},
-    "Deep Ocean":      {"bg1": "#0a1b2a", "bg2": "#0d2c4a", "accent": "#1f8ef1"},
-    "Steel Indigo":    {"bg1": "#0c0f1a", "bg2": "#1c2333", "accent": "#7dd3fc"},
-    "Velvet Crimson":  {"bg1": "#1a0000", "bg2": "#330000", "accent": "#e11d48"},
-    "Arctic Noir":     {"bg1": "#050b12", "bg2": "#0e1822", "accent": "#38bdf8"},
-}
-
-if "theme_mode" not in st.session_state:
-    st.session_state.theme_mode = "Dark"
-if "selected_theme" not in st.session_state:
-    theme_set = dark_themes if st.session_state.theme_mode == "Dark" else light_themes
-    random_theme_name = random.choice(list(theme_set.keys()))
-    st.session_state.selected_theme = random_theme_name
-
-def get_contrast_color(hex_color: str) -> str:
-    hex_color = hex_color.lstrip('#')
-    r, g, b = tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-    brightness = (r * 299 + g * 587 + b * 114) / 1000
-    return "#000000" if brightness > 155 else "#ffffff"
-
-def apply_theme_vars():
-    themes = light_themes if st.session_state.theme_mode == "Light" else dark_themes
-    if st.session_state.selected_theme not in themes:
-        st.session_state.selected_theme = list(themes.keys())[0]
-    selected = themes[st.session_state.selected_theme]
-    bg1, bg2, accent = selected["bg1"], selected["bg2"], selected["accent"]
-    text_color = "#111" if st.session_state.theme_mode == "Light" else "#e6e6e6"
-    st.markdown(
-        f"<style>:root{{--bg1:{bg1};--bg2:{bg2};--accent:{accent};--text:{text_color};}}</style>",
-        unsafe_allow_html=True,
-    )
-    return bg1, bg2, accent, text_color
-
-bg1, bg2, accent, text_color = apply_theme_vars()
-title_text_color = get_contrast_color(accent)
-
-st.markdown(
-    f"""
-<div class="app-title" style="font-size:22px; margin: 12px 0 22px;">
-  Client Management System — Techware Hub
-</div>
-""",
-    unsafe_allow_html=True,
-)
-
-col_tm1, col_tm2, _ = st.columns([1, 1, 6])
-with col_tm1:
-    st.markdown("<div style='display:flex; justify-content:center;'>", unsafe_allow_html=True)
-    if st.button("Light Mode", use_container_width=True):
-        if st.session_state.theme_mode != "Light":
-            st.session_state.theme_mode = "Light"
-            st.session_state.selected_theme = list(light_themes.keys())[0]
-            st.rerun()
-    st.markdown("</div>", unsafe_allow_html=True)
-
-with col_tm2:
-    st.markdown("<div style='display:flex; justify-content:center;'>", unsafe_allow_html=True)
-    if st.button("Dark Mode", use_container_width=True):
-        if st.session_state.theme_mode != "Dark":
-            st.session_state.theme_mode = "Dark"
-            st.session_state.selected_theme = list(dark_themes.keys())[0]
-            st.rerun()
-    st.markdown("</div>", unsafe_allow_html=True)
-
-themes = light_themes if st.session_state.theme_mode == "Light" else dark_themes
-
-cols_palette = st.columns(len(themes))
-for i, (theme_name, data) in enumerate(themes.items()):
-    if cols_palette[i].button(theme_name.replace(" ", "\n"), key=f"theme_{theme_name}"):
-        if st.session_state.selected_theme != theme_name:
-            st.session_state.selected_theme = theme_name
-            st.rerun()
+theme.apply_theme()
 
 
 tz = pytz.timezone("Asia/Karachi")
@@ -126,26 +41,27 @@ def send_pushbullet_notification(title, message):
         access_token = st.secrets["pushbullet_token"]
         headers = {"Access-Token": access_token, "Content-Type": "application/json"}
         data = {"type": "note", "title": title, "body": message}
-        response = requests.post("https://api.pushbullet.com/v2/pushes", json=data, headers=headers)
+        with metrics.pushbullet_timer():
+            response = requests.post("https://api.pushbullet.com/v2/pushes", json=data, headers=headers)
         if response.status_code != 200:
             st.warning("Pushbullet notification failed to send.")
     except Exception as e:
         st.error(f"Pushbullet error: {e}")
 # --- GOOGLE SHEET SETUP ---
-creds = st.secrets["gcp_service_account"]
-gc = gspread.service_account_from_dict(creds)
+# Google Sheets in production; [storage] in secrets / TWH_STORAGE selects sqlite or memory offline
 SHEET_NAME = "Company_Transactions"
+sh = storage.open_spreadsheet(SHEET_NAME, storage.secrets_config(st.secrets))
+journal.attach(sh)  # status / field changes are journaled to the "Journal" worksheet
 
 import hashlib
 
 # --- USERS SHEET ---
-users_ws = gc.open(SHEET_NAME).worksheet("Sheet3")
+users_ws = sh.worksheet("Sheet3")
 
 # --- FUNCTIONS FOR USERS ---
 def load_users():
     """Load users from Sheet3 into a DataFrame."""
-    records = users_ws.get_all_records()
-    return pd.DataFrame(records)
+    return get_records_df(users_ws)
 
 def hash_password(password):
     """Return a SHA-256 hash of the password."""
@@ -154,7 +70,7 @@ def hash_password(password):
 def add_user(user_id, password):
     """Add a new user to Sheet3 (hashed password)."""
     hashed_pw = hash_password(password)
-    users_ws.append_row([user_id, hashed_pw])
+    append_row(users_ws, [user_id, hashed_pw])
 
 def validate_login(user_id, password):
     """Check login credentials."""
@@ -184,17 +100,17 @@ def style_status_rows(df):
     return df.style.apply(highlight_row, axis=1)
 
 # Access the two worksheets
-spectrum_ws = gc.open(SHEET_NAME).worksheet("Sheet1")
-insurance_ws = gc.open(SHEET_NAME).worksheet("Sheet2")
+spectrum_ws = sh.worksheet("Sheet1")
+insurance_ws = sh.worksheet("Sheet2")
 
 # --- REFRESH BUTTON ---
 if st.button("Refresh Now"):
+    invalidate(spectrum_ws, insurance_ws)
     st.rerun()
 
 # --- LOAD DATA FUNCTION ---
 def load_data(ws):
-    records = ws.get_all_records()
-    df = pd.DataFrame(records)
+    df = get_records_df(ws)
 
     # Ensure 'Expiry Date' keeps leading zeros and no slashes
     if "Expiry Date" in df.columns:
@@ -265,7 +181,11 @@ def render_transaction_tabs(df, worksheet, label):
                     col1, col2 = st.columns(2)
                     with col1:
                         if st.button("Approve", key=f"approve_{label}_{i}"):
-                            worksheet.update_cell(row_number, col_number, "Charged")
+                            try:
+                                update_cell(worksheet, row_number, col_number, "Charged", key=row["Record_ID"])
+                            except StaleRowError as e:
+                                st.error(str(e))
+                                st.stop()
                             message = (
                                 f"Charge: {row.get('Charge', 'Nil')}\n"
                                 f"Client Name: {row.get('Name', 'Nil')}\n"
@@ -279,7 +199,11 @@ def render_transaction_tabs(df, worksheet, label):
                             st.rerun()
                     with col2:
                         if st.button("Decline", key=f"decline_{label}_{i}"):
-                            worksheet.update_cell(row_number, col_number, "Declined")
+                            try:
+                                update_cell(worksheet, row_number, col_number, "Declined", key=row["Record_ID"])
+                            except StaleRowError as e:
+                                st.error(str(e))
+                                st.stop()
                             st.error("Declined successfully!")
                             st.rerun()
 
@@ -336,8 +260,13 @@ def login_signup_screen():
 
 # --- CHECK LOGIN STATE ---
 if "logged_in" not in st.session_state or not st.session_state["logged_in"]:
-    login_signup_screen()
+    login_signup_screen()  # reads Sheet3 (Users) only
+    perf.finish_rerun()
     st.stop()
+perf.set_view("manager")
+
+# Both transaction sheets load together, not one after another (only once logged in)
+prefetch(spectrum_ws, insurance_ws)
 
 st.title("Manager Transaction Dashboard")
 # --- TOP-RIGHT LOGOUT BUTTON ---
@@ -347,10 +276,10 @@ st.markdown(
         <form action="" method="get">
             <button type="submit"
                 style="
-                    background-color:{accent};
-                    color:{get_contrast_color(accent)};
+                    background-color:var(--accent);
+                    color:var(--on-accent);
                     border:none;padding:8px 14px;border-radius:10px;font-weight:700;cursor:pointer;
-                    box-shadow:0 2px 6px {accent}55;transition:all .2s ease;"
+                    box-shadow:0 2px 6px color-mix(in srgb, var(--accent) 33%, transparent);transition:all .2s ease;"
                 name="logout"
             >
                 Logout
@@ -366,18 +295,24 @@ if st.query_params.get("logout") is not None:
     st.session_state["logged_in"] = False
     st.rerun()
 
+perf.lap("Theme & auth", "render")
+
 # --- LOAD DATA FOR BOTH SHEETS ---
 df_spectrum = load_data(spectrum_ws)
 df_insurance = load_data(insurance_ws)
+auto_refresh([spectrum_ws, insurance_ws])  # rerun when another session submits/approves
+perf.lap("Load sheets", "sheet")
 
 # --- EDIT STATUS SECTION ---
 main_tab1, main_tab2, main_tab3 = st.tabs(["Spectrum", "Insurance", "Updated Data"])
 
 with main_tab1:
     render_transaction_tabs(df_spectrum, spectrum_ws, "spectrum")
+    perf.lap("Spectrum queue", "render")
 
 with main_tab2:
     render_transaction_tabs(df_insurance, insurance_ws, "insurance")
+    perf.lap("Insurance queue", "render")
 
 with main_tab3:
     st.subheader("Edit Transaction Status (by Record ID)")
@@ -392,8 +327,7 @@ with main_tab3:
 
     # --- Fetch all data ---
     try:
-        all_records = worksheet.get_all_records()
-        df_all = pd.DataFrame(all_records) if all_records else pd.DataFrame()
+        df_all = get_records_df(worksheet)
     except Exception as e:
         st.error(f"Error loading sheet data: {e}")
         df_all = pd.DataFrame()
@@ -462,7 +396,7 @@ with main_tab3:
     
                             if row_indices:
                                 row_num = row_indices[0] + 2  # account for header row
-                                worksheet.delete_rows(row_num)
+                                delete_rows(worksheet, row_num, key=record["Record_ID"])
                                 st.success(f"Record {record['Record_ID']} deleted successfully!")
                                 st.rerun()
                             else:
@@ -481,45 +415,7 @@ with main_tab3:
                             if row_indices:
                                 row_num = row_indices[0] + 2  # header is row 1
     
-                                if sheet_option.startswith("Spectrum"):
-                                    updated_data = [
-                                        str(record["Record_ID"]),
-                                        str(record["Agent Name"]),
-                                        str(record["Name"]),
-                                        str(record["Ph Number"]),
-                                        str(record["Address"]),
-                                        str(record["Email"]),
-                                        str(record["Card Holder Name"]),
-                                        str(record["Card Number"]),
-                                        str(record["Expiry Date"]),
-                                        int(record["CVC"]) if pd.notna(record["CVC"]) else 0,
-                                        str(new_charge),
-                                        str(record["LLC"]),
-                                        str(record["Provider"]),
-                                        str(record["Date of Charge"]),
-                                        str(new_status),
-                                        str(record["Timestamp"])
-                                    ]
-                                    worksheet.update(f"A{row_num}:P{row_num}", [updated_data])
-                                else:
-                                    updated_data = [
-                                        str(record["Record_ID"]),
-                                        str(record["Agent Name"]),
-                                        str(record["Name"]),
-                                        str(record["Ph Number"]),
-                                        str(record["Address"]),
-                                        str(record["Email"]),
-                                        str(record["Card Holder Name"]),
-                                        str(record["Card Number"]),
-                                        str(record["Expiry Date"]),
-                                        int(record["CVC"]) if pd.notna(record["CVC"]) else 0,
-                                        str(new_charge),
-                                        str(record["LLC"]),
-                                        str(record["Date of Charge"]),
-                                        str(new_status),
-                                        str(record["Timestamp"])
-                                    ]
-                                    worksheet.update(f"A{row_num}:O{row_num}", [updated_data])
+                                update_fields(worksheet, row_num, {"Charge": new_charge, "Status": new_status}, key=record["Record_ID"])
     
                                 st.success(f"Record {record['Record_ID']} updated successfully!")
                                 st.rerun()
@@ -529,7 +425,15 @@ with main_tab3:
                             st.error(f"Error updating record: {e}")
     
             else:
-                st.warning("No matching Record ID found.")
+                archived = archive.find_record(worksheet.title, record_id_input, sh)
+                if not archived.empty:
+                    st.info(
+                        f"Record ID {record_id_input} is archived ({', '.join(archived['Partition'].unique())}); "
+                        "archived records are read-only."
+                    )
+                    st.dataframe(archived, use_container_width=True)
+                else:
+                    st.warning("No matching Record ID found.")
     else:
         st.info("No data available to edit.")
 
@@ -551,7 +455,7 @@ with main_tab3:
         else:
             return [''] * len(row)
     
-    def display_pandas_table(df: pd.DataFrame, label: str):
+    def display_pandas_table(df: pd.DataFrame, label: str, version=None):
         st.subheader(f"{label} Data")
     
         if df.empty:
@@ -559,125 +463,139 @@ with main_tab3:
             return
     
         search_text = st.text_input(f"Search {label} Table", key=f"search_{label}")
+        filter_expr = st.text_input(f"Filter {label} Table", key=f"filter_{label}", help=filters.HELP,
+                                    placeholder='Status == "Charged" and Charge > 100')
     
-        if search_text:
-            mask = df.apply(lambda row: row.astype(str).str.contains(search_text, case=False, na=False).any(), axis=1)
-            filtered_df = df[mask]
-        else:
+        try:
+            filtered_df = filters.filter_frame(df, filter_expr, version)
+        except filters.FilterError as e:
+            st.error(f"Filter: {e}")
             filtered_df = df
+        if search_text:
+            mask = filtered_df.apply(lambda row: row.astype(str).str.contains(search_text, case=False, na=False).any(), axis=1)
+            filtered_df = filtered_df[mask]
+        if search_text or filter_expr.strip():
+            st.caption(f"{len(filtered_df):,} of {len(df):,} rows match.")
     
         # Display with styling for Status column rows
         styled_df = filtered_df.style.apply(style_status_rows, axis=1)
     
         st.dataframe(styled_df, use_container_width=True, height=600)
     
-        csv = filtered_df.to_csv(index=False).encode('utf-8')
-        st.download_button(
-            label=f"Download {label} CSV",
-            data=csv,
-            file_name=f"{label.replace(' ', '_').lower()}_data.csv",
-            mime="text/csv",
-            key=f"download_{label}"
-        )
+        # Export is generated only when the button is clicked (cached by data version + search)
+        col_x1, col_x2 = st.columns([1, 3])
+        with col_x1:
+            fmt = st.selectbox("Format", available_formats(), key=f"export_fmt_{label}")
+        with col_x2:
+            st.download_button(
+                label=f"Download {label} {fmt}",
+                data=lazy_export({label: filtered_df}, fmt, filter_key=f"{label}|{search_text}|{filter_expr.strip()}"),
+                file_name=export_file_name(label, fmt),
+                mime=export_mime(fmt),
+                key=f"download_{label}"
+            )
     
     # Usage example:
-    display_pandas_table(df_spectrum, "Spectrum (Sheet1)")
-    display_pandas_table(df_insurance, "Insurance (Sheet2)")
+    display_pandas_table(df_spectrum, "Spectrum (Sheet1)", snapshot_version(spectrum_ws))
+    display_pandas_table(df_insurance, "Insurance (Sheet2)", snapshot_version(insurance_ws))
 
+    if "Excel" in available_formats():
+        st.download_button(
+            label="Download All Sheets (Excel)",
+            data=lazy_export({"Spectrum": df_spectrum, "Insurance": df_insurance}, "Excel", filter_key="all"),
+            file_name="all_sheets_data.xlsx",
+            mime=export_mime("Excel"),
+            key="download_all_sheets"
+        )
 
 
 
-    import matplotlib.pyplot as plt
-    import matplotlib.dates as mdates
-    import seaborn as sns
-    
+
+    perf.lap("Edit & tables", "render")
     st.divider()
     st.subheader("Transaction Analysis Chart")
     
     tz = pytz.timezone("Asia/Karachi")
     
     if not df_all.empty:
-        # --- Preprocess timestamps and charges ---
-        df_all["Timestamp"] = pd.to_datetime(df_all["Timestamp"], errors="coerce")
+        # --- Charges as numbers (used by the night badge below) ---
         df_all["ChargeFloat"] = pd.to_numeric(
             df_all["Charge"].replace('[\$,]', '', regex=True), errors='coerce'
         )
+        # --- Pre-aggregated cube of the snapshot (cube.py); every widget below slices it ---
+        live_cube = cube.for_worksheet(worksheet)
     
         # --- Filters ---
         col_f1, col_f2, col_f3 = st.columns([1, 1, 1])
         with col_f1:
-            AGENTS = ["All Agents"] + sorted(df_all["Agent Name"].dropna().unique().tolist())
+            AGENTS = ["All Agents"] + sorted(cube.members(live_cube, "Agent Name"))
             agent_filter = st.selectbox("Filter by Agent", AGENTS)
         with col_f2:
-            STATUS = ["All Status"] + df_all["Status"].dropna().unique().tolist()
+            STATUS = ["All Status"] + cube.members(live_cube, "Status")
             status_filter = st.selectbox("Filter by Status", STATUS)
         with col_f3:
-            chart_type = st.selectbox("Chart Type", ["Bar", "Line", "Stacked Bar"])
+            chart_type = st.selectbox("Chart Type", CHART_TYPES)
+        col_r1, col_r2 = st.columns([3, 1])
+        with col_r1:
+            renderer = st.radio("Renderer", RENDERERS, horizontal=True)
+        with col_r2:
+            full_resolution = st.checkbox(
+                "Full resolution", value=False,
+                help=f"Draw every hourly point. By default charts are reduced to {POINT_BUDGET} points.",
+            )
+        max_points = None if full_resolution else POINT_BUDGET
     
         # --- Timestamp range selection (compatible way) ---
         col_d1, col_d2 = st.columns(2)
+        first_hour, last_hour = live_cube["Hour"].min(), live_cube["Hour"].max()
         with col_d1:
-            start_date = st.date_input("From Date", value=df_all["Timestamp"].min().date())
-            start_time = st.time_input("From Time", value=time(0, 0, 0))
+            start_date = st.date_input("From Date", value=first_hour.date() if pd.notna(first_hour) else datetime.now().date())
+            start_time = st.time_input("From Time", value=time(0, 0), step=timedelta(hours=1))
         with col_d2:
-            end_date = st.date_input("To Date", value=df_all["Timestamp"].max().date())
-            end_time = st.time_input("To Time", value=time(23, 59, 59))
-    
-        # Combine date and time
-        start_datetime = tz.localize(datetime.combine(start_date, start_time))
-        end_datetime = tz.localize(datetime.combine(end_date, end_time))
-    
-        # --- Apply filters ---
-        df_chart = df_all.copy()
-        if agent_filter != "All Agents":
-            df_chart = df_chart[df_chart["Agent Name"] == agent_filter]
-        if status_filter != "All Status":
-            df_chart = df_chart[df_chart["Status"] == status_filter]
-    
-        # Localize timestamps for comparison
-        df_chart["Timestamp"] = df_chart["Timestamp"].dt.tz_localize("UTC").dt.tz_convert(tz)
-        df_chart = df_chart[
-            (df_chart["Timestamp"] >= start_datetime) &
-            (df_chart["Timestamp"] <= end_datetime)
-        ]
+            end_date = st.date_input("To Date", value=last_hour.date() if pd.notna(last_hour) else datetime.now().date())
+            end_time = st.time_input("To Time", value=time(23, 0), step=timedelta(hours=1),
+                                     help="Charges are counted per hour: the To hour is included in full.")
+    
+        # Combine date and time (whole hours, the grain of the cube)
+        start_datetime = tz.localize(datetime.combine(start_date, start_time.replace(minute=0, second=0)))
+        end_datetime = tz.localize(datetime.combine(end_date, end_time.replace(minute=59, second=59)))
+    
+        # --- Archived months inside the range (only the partitions it overlaps are read) ---
+        archived_cube, archived_rows, months = cube.for_archive(worksheet.title, start_datetime, end_datetime, sh)
+        if archived_rows:
+            st.caption(f"Including {archived_rows:,} archived rows ({', '.join(months)}).")
+
+        # --- Apply filters (cube cells in the range, Hour in PKT) ---
+        df_chart = cube.select(
+            cube.merge(live_cube, archived_cube), start_datetime, end_datetime, tz,
+            where={
+                "Agent Name": None if agent_filter == "All Agents" else agent_filter,
+                "Status": None if status_filter == "All Status" else status_filter,
+            },
+        )
     
         # --- Check if data is available ---
         if df_chart.empty:
             st.info("No data available for selected filters and timestamp range.")
         else:
             # --- Aggregate data ---
-            df_chart["Hour"] = df_chart["Timestamp"].dt.floor("h")
-            hourly_sum = df_chart.groupby("Hour")["ChargeFloat"].sum().reset_index()
-    
-            # --- Chart setup ---
-            sns.set_palette("tab20")
-            fig, ax = plt.subplots(figsize=(12, 6))
-    
-            if chart_type == "Bar":
-                ax.bar(hourly_sum["Hour"], hourly_sum["ChargeFloat"],
-                       color=sns.color_palette("tab20", len(hourly_sum)))
-            elif chart_type == "Line":
-                ax.plot(hourly_sum["Hour"], hourly_sum["ChargeFloat"],
-                        marker='o', linestyle='-', color='tab:blue')
-            elif chart_type == "Stacked Bar":
-                df_stack = df_chart.pivot_table(
-                    index="Hour", columns="Status", values="ChargeFloat",
-                    aggfunc="sum", fill_value=0
-                )
-                df_stack.plot(kind="bar", stacked=True, ax=ax, colormap="tab20")
-    
-            # --- Axis formatting ---
-            ax.xaxis.set_major_formatter(mdates.DateFormatter("%Y-%m-%d %H:%M:%S"))
-            plt.xticks(rotation=45)
-            ax.set_xlabel("Timestamp")
-            ax.set_ylabel("Total Charge ($)")
-            ax.set_title(
+            hourly_sum = cube.hourly(df_chart)
+    
+            # --- Chart (cached per data version + filters) ---
+            title = (
                 f"Total Charges from {start_datetime.strftime('%Y-%m-%d %H:%M:%S')} "
-                f"to {end_datetime.strftime('%Y-%m-%d %H:%M:%S')}",
-                fontsize=16, fontweight='bold'
+                f"to {end_datetime.strftime('%Y-%m-%d %H:%M:%S')}"
+            )
+            key = chart_key(
+                (snapshot_version(worksheet), archive.catalog_version()), sheet_option, agent_filter,
+                status_filter, chart_type, start_datetime, end_datetime, renderer, max_points,
+            )
+            chart = render_chart(
+                key, hourly_sum, df_chart, chart_type, title, renderer,
+                palette="tab20", title_style={"fontsize": 16, "fontweight": "bold"},
+                max_points=max_points,
             )
-            ax.grid(alpha=0.3)
-            st.pyplot(fig)
+            show_chart(chart, len(hourly_sum), max_points)
     
             # --- Ultra Analytics ---
             st.markdown("### Ultra Analytics Options")
@@ -685,7 +603,7 @@ with main_tab3:
             with col_u1:
                 st.metric("Total Charge", f"${df_chart['ChargeFloat'].sum():,.2f}")
             with col_u2:
-                st.metric("Total Transactions", f"{len(df_chart):,}")
+                st.metric("Total Transactions", f"{df_chart['Count'].sum():,}")
             with col_u3:
                 st.metric("Average Charge per Hour", f"${hourly_sum['ChargeFloat'].mean():,.2f}")
             with col_u4:
@@ -694,16 +612,17 @@ with main_tab3:
     
             # --- Insights ---
             st.markdown("#### Top Agents by Total Charge")
-            top_agents = df_chart.groupby("Agent Name")["ChargeFloat"].sum().sort_values(ascending=False).head(5)
+            top_agents = cube.total(df_chart, "Agent Name").head(5)
             st.bar_chart(top_agents)
     
             st.markdown("#### Status Distribution")
-            status_counts = df_chart["Status"].value_counts()
+            status_counts = cube.total(df_chart, "Status", "Count")
             st.bar_chart(status_counts)
     
     else:
         st.info("No transaction data available to generate chart.")
 
+    perf.lap("Analysis chart", "render")
     st.divider()
     st.subheader("Find Duplicate Records by Order ID")
 
@@ -730,6 +649,29 @@ with main_tab3:
             with st.expander("Show duplicate records details"):
                 st.dataframe(duplicates.sort_values(by="Record_ID"), use_container_width=True)
 
+        # Same rules as the submit/edit forms and the bulk importer (schema.py)
+        dup_sheet = "Sheet1" if dup_sheet_option.startswith("Spectrum") else "Sheet2"
+        problems = schema.check_frame(df_to_check, dup_sheet)
+        problems = problems[problems != ""]
+        with st.expander(f"Data integrity ({len(problems)} row(s) failing schema checks)"):
+            if problems.empty:
+                st.success("All rows pass the schema checks.")
+            else:
+                st.dataframe(
+                    df_to_check.loc[problems.index].assign(Errors=problems), use_container_width=True
+                )
+
+    perf.lap("Duplicates & integrity", "parse")
+    st.divider()
+    shift_report_panel({"Spectrum": df_spectrum, "Insurance": df_insurance})
+    perf.lap("Shift report", "render")
+    st.divider()
+    chargeback_panel([spectrum_ws, insurance_ws], sh)
+    perf.lap("Chargebacks", "render")
+    st.divider()
+    summary_panel(sh)
+    perf.lap("Shift summaries", "render")
+
 # --- NIGHT WINDOW CHARGED TRANSACTIONS & DISPLAY ---
 import pytz
 from datetime import datetime, time, timedelta
@@ -794,45 +736,42 @@ else:
 
 total_night_charge_str = f"${total_night_charge:,.2f}"
 
-amount_text_color = get_contrast_color(accent)
-
-label_text_color = get_contrast_color(accent)
                 
 st.markdown(f"""
 <div style="
     position: fixed;
     top: 20px;
     right: 30px;
-    background: {accent};
+    background: var(--accent);
     padding: 16px 24px;
     border-radius: 16px;
     font-size: 18px;
     font-weight: 700;
-    box-shadow: 0 8px 24px {accent}77;
+    box-shadow: 0 8px 24px color-mix(in srgb, var(--accent) 47%, transparent);
     z-index: 9999;
     text-align: center;
     transition: all 0.3s ease;
     backdrop-filter: blur(6px);
 ">
     <!-- Label -->
-    <div style='font-size:14px; opacity:0.85; color:{label_text_color}; margin-bottom:2px;'>
+    <div style='font-size:14px; opacity:0.85; color:var(--on-accent); margin-bottom:2px;'>
         🌙 Night Charged Total
     </div>
     <!-- Sub-label for clarity -->
-    <div style='font-size:12px; opacity:0.75; color:{label_text_color}; margin-bottom:4px;'>
+    <div style='font-size:12px; opacity:0.75; color:var(--on-accent); margin-bottom:4px;'>
         Today's Total
     </div>
     <!-- Amount -->
-    <div style='font-size:26px; font-weight:800; color:{amount_text_color};'>
+    <div style='font-size:26px; font-weight:800; color:var(--on-accent);'>
         {total_night_charge_str}
     </div>
 </div>
 
 <style>
 @keyframes pulseGlow {{
-    0% {{ box-shadow: 0 0 0px {accent}44; }}
-    50% {{ box-shadow: 0 0 20px {accent}aa; }}
-    100% {{ box-shadow: 0 0 0px {accent}44; }}
+    0% {{ box-shadow: 0 0 0px color-mix(in srgb, var(--accent) 27%, transparent); }}
+    50% {{ box-shadow: 0 0 20px color-mix(in srgb, var(--accent) 67%, transparent); }}
+    100% {{ box-shadow: 0 0 0px color-mix(in srgb, var(--accent) 27%, transparent); }}
 }}
 
 div[style*="{total_night_charge_str}"] {{
@@ -840,3 +779,5 @@ div[style*="{total_night_charge_str}"] {{
 }}
 </style>
 """, unsafe_allow_html=True)
+perf.lap("Night badge", "parse")
+perf.performance_panel()
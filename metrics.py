@@ -0,0 +1,262 @@
+# metrics.py
+# Process-level metrics for sizing Sheets quota and hardware.
+#
+# Collected from the hooks the apps already have (perf, data_layer, storage):
+#   twh_sheets_api_calls_total{method,worksheet}   Sheets/Drive HTTP calls
+#   twh_sheets_api_throttled_total{method}         429 responses
+#   twh_snapshot_requests_total{result}            snapshot cache hits / misses
+#   twh_snapshot_probes_total{result}              freshness probes: unchanged (reload skipped) / changed
+#   twh_pushbullet_send_seconds                    Pushbullet send latency (histogram)
+#   twh_active_sessions                            sessions with a rerun in the last ACTIVE_WINDOW s
+#   twh_rerun_duration_seconds{view}               rerun time per view: auth, agent, manager
+#
+# Exporters (both optional, enabled by environment variables, started once per process):
+#   TWH_METRICS_PORT=9108        Prometheus text format on http://127.0.0.1:<port>/metrics
+#   TWH_METRICS_LOG=metrics.jsonl  one JSON snapshot every TWH_METRICS_INTERVAL seconds (default 60),
+#                                rotated at 5 MB, 5 files kept
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import unquote, urlsplit
+
+ACTIVE_WINDOW = 300
+RERUN_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PUSH_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 5
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def as_dict(self) -> dict:
+        return {"count": self.count, "sum": round(self.sum, 6),
+                "buckets": {str(b): c for b, c in zip(self.buckets, self.counts)}}
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.api_calls = {}          # (method, worksheet) -> n
+        self.throttled = {}          # method -> n
+        self.snapshots = {"hit": 0, "miss": 0}
+        self.probes = {"unchanged": 0, "changed": 0}
+        self.pushbullet = Histogram(PUSH_BUCKETS)
+        self.reruns = {}             # view -> Histogram
+        self.sessions = {}           # session id -> last rerun (monotonic)
+
+    def record_api(self, method: str, worksheet: str, status: int):
+        with self._lock:
+            key = (method, worksheet)
+            self.api_calls[key] = self.api_calls.get(key, 0) + 1
+            if status == 429:
+                self.throttled[method] = self.throttled.get(method, 0) + 1
+
+    def record_snapshot(self, hit: bool):
+        with self._lock:
+            self.snapshots["hit" if hit else "miss"] += 1
+
+    def record_probe(self, changed: bool):
+        with self._lock:
+            self.probes["changed" if changed else "unchanged"] += 1
+
+    def record_pushbullet(self, seconds: float):
+        with self._lock:
+            self.pushbullet.observe(seconds)
+
+    def record_rerun(self, view: str, seconds: float, session_id: str = None):
+        with self._lock:
+            self.reruns.setdefault(view or "unknown", Histogram(RERUN_BUCKETS)).observe(seconds)
+            if session_id:
+                self.sessions[session_id] = time.monotonic()
+
+    def active_sessions(self) -> int:
+        cutoff = time.monotonic() - ACTIVE_WINDOW
+        with self._lock:
+            for sid in [s for s, t in self.sessions.items() if t < cutoff]:
+                del self.sessions[sid]
+            return len(self.sessions)
+
+    def snapshot(self) -> dict:
+        active = self.active_sessions()
+        with self._lock:
+            hits, misses = self.snapshots["hit"], self.snapshots["miss"]
+            return {
+                "ts": time.time(),
+                "api_calls": [{"method": m, "worksheet": w, "count": n} for (m, w), n in self.api_calls.items()],
+                "throttled": dict(self.throttled),
+                "snapshot_hits": hits,
+                "snapshot_misses": misses,
+                "cache_hit_ratio": round(hits / (hits + misses), 4) if hits + misses else None,
+                "probes": dict(self.probes),
+                "pushbullet_send_seconds": self.pushbullet.as_dict(),
+                "active_sessions": active,
+                "rerun_duration_seconds": {v: h.as_dict() for v, h in self.reruns.items()},
+            }
+
+
+registry = Registry()
+
+
+# ==============================
+# Recording helpers
+# ==============================
+def api_method(method: str, url: str) -> tuple:
+    """(API method, worksheet) for a Sheets/Drive request URL."""
+    path = unquote(urlsplit(url).path)
+    if "/drive/" in path:
+        return ("drive.files.list" if path.rstrip("/").endswith("/files") else "drive.files.get"), "-"
+    if "/values:batchGet" in path:
+        return "values.batchGet", "-"
+    if "/values:batchUpdate" in path:
+        return "values.batchUpdate", "-"
+    if "/values/" in path:
+        a1 = path.split("/values/", 1)[1]
+        worksheet = a1.rsplit("!", 1)[0] if "!" in a1 else a1.split(":")[0]
+        worksheet = worksheet.strip("'")
+        if a1.endswith(":append"):
+            return "values.append", worksheet.replace(":append", "")
+        if a1.endswith(":clear"):
+            return "values.clear", worksheet
+        return ("values.get" if method == "GET" else "values.update"), worksheet
+    if path.endswith(":batchUpdate"):
+        return "spreadsheets.batchUpdate", "-"
+    return "spreadsheets.get", "-"
+
+
+def record_response(response):
+    """Count one Sheets API response (called from perf's requests hook)."""
+    method, worksheet = api_method(response.request.method, response.request.url)
+    registry.record_api(method, worksheet, response.status_code)
+
+
+@contextmanager
+def pushbullet_timer():
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.record_pushbullet(time.perf_counter() - start)
+
+
+# ==============================
+# Exporters
+# ==============================
+def _esc(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _histogram_lines(name: str, hist: Histogram, labels: str = "") -> list:
+    sep = "," if labels else ""
+    lines = [f'{name}_bucket{{{labels}{sep}le="{b}"}} {c}' for b, c in zip(hist.buckets, hist.counts)]
+    lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {hist.count}')
+    suffix = f"{{{labels}}}" if labels else ""
+    lines += [f"{name}_sum{suffix} {hist.sum:.6f}", f"{name}_count{suffix} {hist.count}"]
+    return lines
+
+
+def prometheus_text() -> str:
+    snap = registry.snapshot()
+    lines = ["# TYPE twh_sheets_api_calls_total counter"]
+    for item in snap["api_calls"]:
+        lines.append(
+            f'twh_sheets_api_calls_total{{method="{_esc(item["method"])}",worksheet="{_esc(item["worksheet"])}"}} '
+            f'{item["count"]}'
+        )
+    lines.append("# TYPE twh_sheets_api_throttled_total counter")
+    for method, n in snap["throttled"].items():
+        lines.append(f'twh_sheets_api_throttled_total{{method="{_esc(method)}"}} {n}')
+    lines.append("# TYPE twh_snapshot_requests_total counter")
+    lines.append(f'twh_snapshot_requests_total{{result="hit"}} {snap["snapshot_hits"]}')
+    lines.append(f'twh_snapshot_requests_total{{result="miss"}} {snap["snapshot_misses"]}')
+    lines.append("# TYPE twh_snapshot_probes_total counter")
+    for result, n in snap["probes"].items():
+        lines.append(f'twh_snapshot_probes_total{{result="{result}"}} {n}')
+    lines.append("# TYPE twh_active_sessions gauge")
+    lines.append(f"twh_active_sessions {snap['active_sessions']}")
+    with registry._lock:
+        lines.append("# TYPE twh_pushbullet_send_seconds histogram")
+        lines += _histogram_lines("twh_pushbullet_send_seconds", registry.pushbullet)
+        lines.append("# TYPE twh_rerun_duration_seconds histogram")
+        for view, hist in registry.reruns.items():
+            lines += _histogram_lines("twh_rerun_duration_seconds", hist, f'view="{_esc(view)}"')
+    return "\n".join(lines) + "\n"
+
+
+def _serve_prometheus(port: int):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="twh-metrics-http", daemon=True).start()
+    return server
+
+
+def _log_snapshots(path: str, interval: float):
+    import logging
+    from logging.handlers import RotatingFileHandler
+
+    logger = logging.getLogger("twh.metrics")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS))
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            logger.info(json.dumps(registry.snapshot()))
+
+    threading.Thread(target=loop, name="twh-metrics-log", daemon=True).start()
+
+
+_started = False
+_start_lock = threading.Lock()
+
+
+def ensure_started():
+    """Start the exporters configured in the environment (once per process)."""
+    global _started
+    if _started:
+        return
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+        port = os.environ.get("TWH_METRICS_PORT")
+        if port:
+            try:
+                _serve_prometheus(int(port))
+            except OSError:  # another app process on this host already serves the port
+                pass
+        log_path = os.environ.get("TWH_METRICS_LOG")
+        if log_path:
+            _log_snapshots(log_path, float(os.environ.get("TWH_METRICS_INTERVAL", "60")))
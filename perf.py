@@ -0,0 +1,185 @@
+# perf.py
+# Per-rerun timing instrumentation.
+#
+# Each Streamlit rerun calls start_rerun() at the top of the script. Hot paths then record into
+# that rerun:
+#   with perf.timed("Load Spectrum", "sheet"): ...     # wrap one call
+#   perf.lap("Pending queue", "render")                  # time since the previous lap
+# Sheets API calls and response bytes are counted by the HTTP hook that storage installs on the
+# gspread session; every call and finished rerun also feeds the process-level metrics
+# (metrics.py). performance_panel() shows the current rerun's breakdown and rolling p50/p95
+# over the last HISTORY reruns of this session, plus the memory held by the shared snapshots.
+#
+# Outside a Streamlit rerun (CLI jobs, benchmarks) nothing is recorded.
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import metrics
+
+HISTORY = 50            # reruns kept per session for p50/p95
+KINDS = ["sheet", "parse", "render"]
+
+_local = threading.local()
+
+
+class Rerun:
+    """Timings of one rerun: spans (label, kind, ms), API calls and bytes fetched."""
+
+    def __init__(self, view: str = ""):
+        self.view = view
+        self.started = time.perf_counter()
+        self.last_lap = self.started
+        self.spans = []
+        self.api_calls = 0
+        self.api_bytes = 0
+        self.total_ms = None
+        self._lock = threading.Lock()
+
+    def add(self, label: str, kind: str, ms: float):
+        with self._lock:
+            self.spans.append((label, kind, ms))
+
+    def count_api(self, nbytes: int):
+        with self._lock:
+            self.api_calls += 1
+            self.api_bytes += nbytes
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+
+def current():
+    """The Rerun being recorded on this thread, or None."""
+    return getattr(_local, "rerun", None)
+
+
+def attach(rerun):
+    """Record into rerun from another thread (e.g. a worker fetching a worksheet)."""
+    _local.rerun = rerun
+
+
+def start_rerun(view: str = "") -> Rerun:
+    metrics.ensure_started()
+    _local.rerun = Rerun(view)
+    return _local.rerun
+
+
+def set_view(view: str):
+    rerun = current()
+    if rerun is not None:
+        rerun.view = view
+
+
+@contextmanager
+def timed(label: str, kind: str = "parse"):
+    rerun = current()
+    if rerun is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        rerun.add(label, kind, (time.perf_counter() - start) * 1000)
+
+
+def lap(label: str, kind: str = "render"):
+    """Record the time since the previous lap (or rerun start) under label."""
+    rerun = current()
+    if rerun is None:
+        return
+    now = time.perf_counter()
+    rerun.add(label, kind, (now - rerun.last_lap) * 1000)
+    rerun.last_lap = now
+
+
+def count_api(nbytes: int = 0):
+    rerun = current()
+    if rerun is not None:
+        rerun.count_api(nbytes)
+
+
+def count_response(response, *args, **kwargs):
+    """requests response hook: one Sheets API call and its payload size."""
+    count_api(len(response.content or b""))
+    metrics.record_response(response)
+    return response
+
+
+def finish_rerun():
+    """Close the current rerun and add it to the session history. Returns the Rerun."""
+    rerun = current()
+    if rerun is None or rerun.total_ms is not None:
+        return rerun
+    rerun.total_ms = rerun.elapsed_ms()
+    import streamlit as st
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx()
+    metrics.registry.record_rerun(rerun.view, rerun.total_ms / 1000, ctx.session_id if ctx else None)
+
+    history = st.session_state.setdefault("_perf_history", deque(maxlen=HISTORY))
+    history.append(rerun)
+    return rerun
+
+
+def percentiles(values, qs=(50, 95)) -> list:
+    if not values:
+        return [0.0 for _ in qs]
+    ordered = sorted(values)
+    return [ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))] for q in qs]
+
+
+def performance_panel():
+    """Collapsible "Performance" section for managers; call it last in the script."""
+    import pandas as pd
+    import streamlit as st
+
+    rerun = finish_rerun()
+    if rerun is None:
+        return
+    history = list(st.session_state.get("_perf_history", []))
+
+    with st.expander("Performance"):
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("This rerun", f"{rerun.total_ms:,.0f} ms")
+        c2.metric("Sheets API calls", f"{rerun.api_calls}")
+        c3.metric("Bytes fetched", _human_bytes(rerun.api_bytes))
+        p50, p95 = percentiles([r.total_ms for r in history])
+        c4.metric(f"p50 / p95 (last {len(history)})", f"{p50:,.0f} / {p95:,.0f} ms")
+
+        if rerun.spans:
+            spans = pd.DataFrame(rerun.spans, columns=["Step", "Kind", "ms"])
+            by_kind = spans.groupby("Kind")["ms"].sum().reindex(KINDS, fill_value=0.0)
+            st.caption(" · ".join(f"{k}: {v:,.0f} ms" for k, v in by_kind.items()))
+            st.dataframe(spans.round({"ms": 1}), use_container_width=True, hide_index=True)
+
+        rows = {}
+        for r in history:
+            for label, kind, ms in r.spans:
+                rows.setdefault((label, kind), []).append(ms)
+        if rows:
+            rolling = pd.DataFrame(
+                [(label, kind, len(v), *percentiles(v)) for (label, kind), v in rows.items()],
+                columns=["Step", "Kind", "Reruns", "p50 ms", "p95 ms"],
+            )
+            st.markdown("**Rolling per step**")
+            st.dataframe(rolling.round(1), use_container_width=True, hide_index=True)
+
+        from data_layer import memory_report
+
+        memory = memory_report()
+        if not memory.empty:
+            st.markdown("**Snapshot memory (shared by all sessions)**")
+            st.dataframe(memory, use_container_width=True, hide_index=True)
+
+
+def _human_bytes(n: int) -> str:
+    for unit in ("B", "KB", "MB"):
+        if n < 1024:
+            return f"{n:,.0f} {unit}"
+        n /= 1024
+    return f"{n:,.1f} GB"
@@ -0,0 +1,303 @@
+# schema.py
+# Declarative record schema shared by every form and bulk path.
+#
+# SHEET_COLUMNS fixes the column order of each worksheet; FIELDS holds the rules for each field.
+# compile_validator(sheet) turns those into one vectorized function that validates and normalizes
+# a whole DataFrame in a single pass; validate_record() runs the same compiled validator on one
+# form submission, so the agent form, the edit forms, the bulk importer and dashboard integrity
+# checks can no longer drift apart.
+
+import re
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import pytz
+
+tz = pytz.timezone("Asia/Karachi")
+
+AGENTS = ["Arham Kaleem", "Arham Ali", "Haziq"]
+AGENT_LLCS = ["Visionary Pathways"]                          # agents.py form
+SPEC_LLCS = ["Bite Bazaar LLC", "Apex Prime Solutions"]      # manager-spec.py agent form
+LLC_OPTIONS = AGENT_LLCS + SPEC_LLCS                         # any LLC a stored row may carry
+PROVIDERS = ["Spectrum", "Insurance", "Xfinity", "Frontier", "Optimum"]
+STATUSES = ["Pending", "Charged", "Declined", "Charge Back"]
+ROLES = ["Manager", "Agent"]
+TIMESTAMP_FORMAT = "%Y-%m-%d %I:%M:%S %p"   # Timestamp column, as the forms write it
+
+# Snapshot storage (compact_frame / typed_columns)
+CATEGORY_COLUMNS = ["Agent Name", "Status", "LLC", "Provider"]
+DATE_COLUMNS = ["Timestamp", "Date of Charge"]
+
+# ==============================
+# Worksheet layouts
+# ==============================
+SHEET_COLUMNS = {
+    # Spectrum
+    "Sheet1": [
+        "Record_ID", "Agent Name", "Name", "Ph Number", "Address", "Email", "Card Holder Name",
+        "Card Number", "Expiry Date", "CVC", "Charge", "LLC", "Provider", "Date of Charge",
+        "Status", "Timestamp", "PIN CODE",
+    ],
+    # Insurance (no Provider / PIN CODE columns)
+    "Sheet2": [
+        "Record_ID", "Agent Name", "Name", "Ph Number", "Address", "Email", "Card Holder Name",
+        "Card Number", "Expiry Date", "CVC", "Charge", "LLC", "Date of Charge",
+        "Status", "Timestamp",
+    ],
+    # Users
+    "Sheet3": ["ID", "Password", "Role", "Agent Name"],
+}
+
+# ==============================
+# Field rules
+# ==============================
+# label     : name shown in error messages
+# required  : must be non-empty ("Select ..." placeholders count as empty)
+# choices   : allowed values when non-empty
+# strip     : regex removed from the value (normalization)
+# kind      : "money" -> numeric, stored as $0.00; "date" -> YYYY-MM-DD, blank = today;
+#             "pin" -> 4 digits when Provider is Spectrum, otherwise stored as "Nil"
+# unique    : value must not already exist (checked against existing_ids and within the frame)
+FIELDS = {
+    "Record_ID":        {"label": "Order ID", "required": True, "unique": True},
+    "Agent Name":       {"label": "Agent Name", "required": True, "choices": AGENTS},
+    "Name":             {"label": "Client Name", "required": True},
+    "Ph Number":        {"label": "Phone Number", "required": True},
+    "Address":          {"label": "Address", "required": True},
+    "Email":            {"label": "Email", "required": True},
+    "Card Holder Name": {"label": "Card Holder Name", "required": True},
+    "Card Number":      {"label": "Card Number", "required": True, "strip": r"[ -]"},
+    "Expiry Date":      {"label": "Expiry Date", "required": True, "strip": r"[/ -]"},
+    "CVC":              {"label": "CVC"},
+    "Charge":           {"label": "Charge Amount", "required": True, "kind": "money"},
+    "LLC":              {"label": "LLC", "required": True, "choices": LLC_OPTIONS},
+    "Provider":         {"label": "Provider", "required": True, "choices": PROVIDERS},
+    "Date of Charge":   {"label": "Date of Charge", "kind": "date"},
+    "Status":           {"label": "Status", "choices": STATUSES},
+    "Timestamp":        {"label": "Timestamp"},
+    "PIN CODE":         {"label": "PIN Code", "kind": "pin"},
+    "ID":               {"label": "User ID", "required": True, "unique": True},
+    "Password":         {"label": "Password", "required": True},
+    "Role":             {"label": "Role", "required": True, "choices": ROLES},
+}
+
+MESSAGES = {
+    "missing": "Please fill in all required fields: {}",
+    "choice": "Unknown {}.",
+    "money": "Charge amount must be numeric (e.g., 29 or 29.00).",
+    "date": "Invalid {}.",
+    "pin": "PIN Code must be exactly 4 digits when Provider is Spectrum.",
+    "exists": "{} already exists. Please enter a unique {}.",
+    "repeated": "{} repeated in file.",
+}
+ERROR_SEP = "; "
+
+
+def _text(df: pd.DataFrame, col: str) -> pd.Series:
+    if col not in df.columns:
+        return pd.Series("", index=df.index, dtype=object)
+    s = df[col].astype(object).where(df[col].notna(), "").astype(str).str.strip()
+    return s.mask(s.str.startswith("Select "), "")  # selectbox placeholders
+
+
+def _parse_dates(text: pd.Series) -> pd.Series:
+    """YYYY-MM-DD in one strict pass; other formats per value (no format inferred from the first row)."""
+    value = pd.to_datetime(text, format="%Y-%m-%d", errors="coerce")
+    other = value.isna() & (text != "")
+    if other.any():
+        value[other] = pd.to_datetime(text[other], errors="coerce", format="mixed")
+    return value
+
+
+def _choices_key(choices) -> tuple:
+    """{column: allowed values} as a hashable compile_validator argument."""
+    return tuple(sorted((col, tuple(values)) for col, values in (choices or {}).items()))
+
+
+@lru_cache(maxsize=None)
+def compile_validator(sheet: str, choices: tuple = ()):
+    """
+    Build the validator for one worksheet. The returned function takes
+    (df, existing_ids=None, check_repeats=True) and returns (normalized, errors):
+    normalized has the worksheet's columns in order, errors is a per-row message string
+    ("" when the row is valid). choices is ((column, allowed values), ...) overriding
+    FIELDS for a form that offers fewer values (see _choices_key).
+    """
+    columns = SHEET_COLUMNS[sheet]
+    rules = [(col, FIELDS.get(col, {})) for col in columns]
+    required = [(col, r["label"]) for col, r in rules if r.get("required")]
+    override = dict(choices)
+    choices = [(col, r["label"], frozenset(override.get(col, r.get("choices"))))
+               for col, r in rules if override.get(col, r.get("choices"))]
+    strips = [(col, re.compile(r["strip"])) for col, r in rules if r.get("strip")]
+    kinds = [(col, r["label"], r["kind"]) for col, r in rules if r.get("kind")]
+    unique = [(col, r["label"]) for col, r in rules if r.get("unique")]
+    has_provider = "Provider" in columns
+
+    def validate(df: pd.DataFrame, existing_ids=None, check_repeats: bool = True):
+        out = pd.DataFrame({col: _text(df, col) for col in columns}, index=df.index)
+        issues = []
+
+        missing = pd.Series("", index=df.index)
+        for col, label in required:
+            missing = missing.where(out[col] != "", missing + label + ", ")
+        missing = missing.str.rstrip(", ")
+        has_missing = missing != ""
+
+        for col, label, allowed in choices:
+            issues.append(((out[col] != "") & ~out[col].isin(allowed), MESSAGES["choice"].format(label)))
+        for col, pattern in strips:
+            out[col] = out[col].str.replace(pattern, "", regex=True)
+
+        for col, label, kind in kinds:
+            if kind == "money":
+                value = pd.to_numeric(out[col].str.replace("$", "", regex=False).str.strip(), errors="coerce")
+                issues.append(((out[col] != "") & value.isna(), MESSAGES["money"]))
+                out[col] = value.map(lambda v: f"${v:.2f}", na_action="ignore").fillna(out[col])
+            elif kind == "date":
+                today = datetime.now(tz).strftime("%Y-%m-%d")
+                value = _parse_dates(out[col].replace("", today))
+                issues.append((value.isna(), MESSAGES["date"].format(label)))
+                out[col] = value.dt.strftime("%Y-%m-%d").fillna(out[col])
+            elif kind == "pin" and has_provider:
+                if col in df.columns:  # a loaded sheet's "0123" comes back from get_all_records as 123
+                    number = df[col].map(lambda v: isinstance(v, (int, float, np.number)) and not pd.isna(v))
+                    out[col] = out[col].mask(number, df[col][number].map(lambda v: str(int(v)).zfill(4)))
+                is_spectrum = out["Provider"] == "Spectrum"
+                issues.append((is_spectrum & ~out[col].str.fullmatch(r"\d{4}"), MESSAGES["pin"]))
+                out[col] = out[col].where(is_spectrum, "Nil")
+
+        for col, label in unique:
+            present = out[col] != ""
+            if existing_ids is not None:
+                existing = (existing_ids if isinstance(existing_ids, (set, frozenset))
+                            else {str(x).strip() for x in existing_ids})
+                issues.append((present & out[col].isin(existing), MESSAGES["exists"].format(label, label)))
+            if check_repeats:
+                issues.append((present & out[col].duplicated(keep=False), MESSAGES["repeated"].format(label)))
+
+        errors = (MESSAGES["missing"].format("") + missing).where(has_missing, "")
+        for mask, message in issues:
+            errors = errors.where(~mask, errors.where(errors == "", errors + ERROR_SEP) + message)
+        return out, errors
+
+    return validate
+
+
+def validate_frame(df: pd.DataFrame, sheet: str, existing_ids=None, check_repeats: bool = True, choices=None):
+    """Vectorized validation of many rows. Returns (valid rows, rejects with an "Errors" column)."""
+    normalized, errors = compile_validator(sheet, _choices_key(choices))(df, existing_ids, check_repeats)
+    bad = errors != ""
+    rejects = df[bad].copy()
+    rejects["Errors"] = errors[bad]
+    return normalized[~bad], rejects
+
+
+def validate_record(record: dict, sheet: str, existing_ids=None, choices=None):
+    """
+    Validate one form submission. Returns (normalized record dict, list of error messages).
+    choices ({column: allowed values}) narrows FIELDS to what the calling form offers.
+    """
+    normalized, errors = compile_validator(sheet, _choices_key(choices))(pd.DataFrame([record]), existing_ids, False)
+    message = errors.iloc[0]
+    clean = normalized.iloc[0].to_dict()
+    # keep fields the caller set that the validator does not touch (e.g. Status/Timestamp given as-is)
+    for key, value in record.items():
+        if key not in clean:
+            clean[key] = value
+    return clean, (message.split(ERROR_SEP) if message else [])
+
+
+def check_frame(df: pd.DataFrame, sheet: str) -> pd.Series:
+    """Integrity check of a loaded sheet: per-row error message ("" when valid)."""
+    if df.empty:
+        return pd.Series(dtype=str)
+    _, errors = compile_validator(sheet)(df, None, True)
+    return errors
+
+
+def to_row(record, sheet: str) -> list:
+    """Values of record in the worksheet's column order (missing/NaN -> "")."""
+    row = []
+    for col in SHEET_COLUMNS[sheet]:
+        value = record.get(col, "") if hasattr(record, "get") else ""
+        row.append("" if value is None or (not isinstance(value, str) and pd.isna(value)) else str(value))
+    return row
+
+
+def parse_timestamps(values: pd.Series) -> pd.Series:
+    """
+    Timestamp column -> datetime64 (NaT when unparseable). The forms' format is parsed in one
+    vectorized pass; only values edited by hand fall back to format inference.
+    """
+    text = values.astype(str).str.strip()
+    ts = pd.to_datetime(text, format=TIMESTAMP_FORMAT, errors="coerce")
+    other = ts.isna() & (text != "") & (text != "nan")
+    if other.any():
+        ts[other] = pd.to_datetime(text[other], errors="coerce", format="mixed")
+    return ts
+
+
+# ==============================
+# Compact snapshots
+# ==============================
+def _text_dtype():
+    """Arrow-backed strings with NaN for missing values (pandas 3's str), or object without pyarrow."""
+    try:
+        return pd.StringDtype("pyarrow", na_value=np.nan)
+    except (ImportError, TypeError):
+        return object
+
+
+TEXT_DTYPE = _text_dtype()
+
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Storage form of a sheet snapshot: CATEGORY_COLUMNS as categoricals, other text and mixed
+    columns as Arrow string arrays (one buffer per column instead of a Python object per cell;
+    copies share it). Numeric columns are kept. Cell text is unchanged, so rows still round-trip
+    to the sheet exactly.
+    """
+    if df.empty:
+        return df
+    out = {}
+    for col in df.columns:
+        values = df[col]
+        if pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+            out[col] = values
+            continue
+        text = values.astype(TEXT_DTYPE) if TEXT_DTYPE is not object else values.astype(str)
+        out[col] = text.astype("category") if col in CATEGORY_COLUMNS else text
+    return pd.DataFrame(out, index=df.index)
+
+
+def charge_cents(values: pd.Series) -> pd.Series:
+    """Charge column -> Int64 cents (<NA> when not a number)."""
+    dollars = pd.to_numeric(values.astype(str).str.replace(r"[\$,]", "", regex=True).str.strip(), errors="coerce")
+    return (dollars * 100).round().astype("Int64")
+
+
+def typed_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Charge as int64 cents ("Cents") and DATE_COLUMNS as datetime64, aligned with df."""
+    out = pd.DataFrame(index=df.index)
+    if "Charge" in df.columns:
+        out["Cents"] = charge_cents(df["Charge"])
+    for col in DATE_COLUMNS:
+        if col in df.columns:
+            out[col] = parse_timestamps(df[col])
+    return out
+
+
+def memory_usage(df: pd.DataFrame) -> pd.DataFrame:
+    """Per column: dtype and bytes held (strings and categories counted in full)."""
+    nbytes = df.memory_usage(deep=True, index=False)
+    return pd.DataFrame({"Column": df.columns, "Dtype": df.dtypes.astype(str).values, "Bytes": nbytes.values})
+
+
+def row_range(sheet: str, row_num: int) -> str:
+    """A1 range covering one full row of the worksheet, e.g. "A5:Q5"."""
+    last = chr(ord("A") + len(SHEET_COLUMNS[sheet]) - 1)
+    return f"A{row_num}:{last}{row_num}"
@@ -0,0 +1,291 @@
+# shift_report.py
+# Nightly shift report (PDF, built with reportlab).
+# Covers one night window (7 PM -> 6 AM, Asia/Karachi): totals per agent, status breakdown,
+# chargebacks and an hourly chart. Reports are built in a background worker process so the
+# dashboard never blocks, and are cached on disk by shift date so reopening one is instant.
+#
+# Usage from cron (after the shift closes):
+#   python shift_report.py --date 2026-10-18 --creds service_account.json
+
+import os
+import threading
+from datetime import date, datetime, time, timedelta
+from io import BytesIO
+from pathlib import Path
+
+import pandas as pd
+import pytz
+
+tz = pytz.timezone("Asia/Karachi")
+SHEET_NAME = "Company_Transactions"
+REPORT_DIR = Path(os.environ.get("TWH_REPORT_DIR", ".reports"))
+NIGHT_START = time(19, 0)
+NIGHT_END = time(6, 0)
+
+# ==============================
+# Shift window helpers
+# ==============================
+def shift_window(shift_date: date):
+    """Naive PKT datetimes bounding the night that starts on shift_date."""
+    start = datetime.combine(shift_date, NIGHT_START)
+    end = datetime.combine(shift_date + timedelta(days=1), NIGHT_END)
+    return start, end
+
+
+def last_closed_shift(now: datetime = None) -> date:
+    """Date of the most recent night window that has already ended."""
+    now = (now or datetime.now(tz)).replace(tzinfo=None)
+    if now.time() >= NIGHT_END:
+        return now.date() - timedelta(days=1)
+    return now.date() - timedelta(days=2)
+
+
+def report_path(shift_date: date) -> Path:
+    return REPORT_DIR / f"shift_report_{shift_date.isoformat()}.pdf"
+
+
+def shift_rows(frames: dict, shift_date: date) -> pd.DataFrame:
+    """Rows of every sheet ({label: DataFrame}) whose Timestamp falls in the shift window."""
+    start, end = shift_window(shift_date)
+    parts = []
+    for label, df in frames.items():
+        if df.empty or "Timestamp" not in df.columns:
+            continue
+        ts = pd.to_datetime(df["Timestamp"], errors="coerce")
+        part = df[(ts >= start) & (ts <= end)]
+        part["Timestamp"] = ts[part.index]
+        part["Sheet"] = label
+        parts.append(part)
+    if not parts:
+        return pd.DataFrame(columns=["Sheet", "Agent Name", "Status", "Charge", "Timestamp", "ChargeFloat"])
+    rows = pd.concat(parts, ignore_index=True)
+    rows["ChargeFloat"] = pd.to_numeric(
+        rows["Charge"].astype(str).replace('[\\$,]', '', regex=True), errors="coerce"
+    ).fillna(0.0)
+    rows["Status"] = rows["Status"].astype(str).str.strip()
+    return rows
+
+
+# ==============================
+# PDF generation (runs in the worker process)
+# ==============================
+def _hourly_chart_png(rows: pd.DataFrame, start: datetime, end: datetime) -> bytes:
+    import matplotlib
+    import matplotlib.pyplot as plt
+
+    hours = pd.date_range(start, end, freq="h")
+    charged = rows[rows["Status"] == "Charged"]
+    hourly = charged.groupby(charged["Timestamp"].dt.floor("h"))["ChargeFloat"].sum()
+    hourly = hourly.reindex(hours, fill_value=0.0)
+
+    fig, ax = plt.subplots(figsize=(8, 3.2))
+    try:
+        colors = matplotlib.colormaps["tab20"].colors
+        ax.bar([h.strftime("%H:%M") for h in hourly.index], hourly.values,
+               color=[colors[i % len(colors)] for i in range(len(hourly))])
+        ax.set_ylabel("Charged ($)")
+        ax.tick_params(axis="x", labelrotation=45, labelsize=8)
+        ax.grid(alpha=0.3, axis="y")
+        fig.tight_layout()
+        buf = BytesIO()
+        fig.savefig(buf, format="png", dpi=120)
+        return buf.getvalue()
+    finally:
+        plt.close(fig)
+
+
+def _money(x: float) -> str:
+    return f"${x:,.2f}"
+
+
+def generate_report(rows: pd.DataFrame, shift_date: date, path: str) -> str:
+    """Write the PDF for one shift to path and return the path."""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import cm
+    from reportlab.platypus import Image, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    start, end = shift_window(shift_date)
+    styles = getSampleStyleSheet()
+    table_style = TableStyle([
+        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#1f2833")),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
+        ("FONTSIZE", (0, 0), (-1, -1), 9),
+        ("ALIGN", (1, 1), (-1, -1), "RIGHT"),
+    ])
+
+    charged = rows[rows["Status"] == "Charged"]
+    story = [
+        Paragraph(f"Night Shift Report — {shift_date.isoformat()}", styles["Title"]),
+        Paragraph(
+            f"Window: {start.strftime('%Y-%m-%d %I:%M %p')} to {end.strftime('%Y-%m-%d %I:%M %p')} (PKT)",
+            styles["Normal"],
+        ),
+        Spacer(1, 0.4 * cm),
+        Paragraph(
+            f"Charged total: <b>{_money(charged['ChargeFloat'].sum())}</b> across "
+            f"{len(charged):,} transactions ({len(rows):,} submissions in window).",
+            styles["Normal"],
+        ),
+        Spacer(1, 0.5 * cm),
+    ]
+
+    # Totals per agent
+    story.append(Paragraph("Totals per Agent", styles["Heading2"]))
+    is_charged = rows["Status"] == "Charged"
+    per_agent = (
+        rows.assign(Charged=is_charged.astype(int), ChargedTotal=rows["ChargeFloat"].where(is_charged, 0.0))
+        .groupby("Agent Name", observed=True)
+        .agg(Submissions=("Status", "size"), Charged=("Charged", "sum"), ChargedTotal=("ChargedTotal", "sum"))
+        .sort_values("ChargedTotal", ascending=False)
+    )
+    data = [["Agent", "Submissions", "Charged", "Charged Total"]]
+    for agent, r in per_agent.iterrows():
+        data.append([agent, f"{int(r['Submissions']):,}", f"{int(r['Charged']):,}", _money(r["ChargedTotal"])])
+    story += [Table(data, style=table_style, hAlign="LEFT"), Spacer(1, 0.5 * cm)]
+
+    # Status breakdown
+    story.append(Paragraph("Status Breakdown", styles["Heading2"]))
+    status = rows.groupby("Status", observed=True)["ChargeFloat"].agg(["count", "sum"])
+    data = [["Status", "Count", "Amount"]]
+    for name, r in status.iterrows():
+        data.append([name, f"{int(r['count']):,}", _money(r["sum"])])
+    story += [Table(data, style=table_style, hAlign="LEFT"), Spacer(1, 0.5 * cm)]
+
+    # Chargebacks
+    story.append(Paragraph("Chargebacks", styles["Heading2"]))
+    chargebacks = rows[rows["Status"] == "Charge Back"]
+    if chargebacks.empty:
+        story.append(Paragraph("No chargebacks in this shift.", styles["Normal"]))
+    else:
+        data = [["Record ID", "Sheet", "Agent", "Client", "Charge"]]
+        for _, r in chargebacks.iterrows():
+            data.append([str(r.get("Record_ID", "")), r["Sheet"], str(r.get("Agent Name", "")),
+                         str(r.get("Name", "")), _money(r["ChargeFloat"])])
+        story.append(Table(data, style=table_style, hAlign="LEFT"))
+    story.append(Spacer(1, 0.5 * cm))
+
+    # Hourly chart
+    story.append(Paragraph("Hourly Charged Total", styles["Heading2"]))
+    story.append(Image(BytesIO(_hourly_chart_png(rows, start, end)), width=17 * cm, height=6.8 * cm))
+
+    tmp = Path(f"{path}.tmp")
+    tmp.parent.mkdir(parents=True, exist_ok=True)
+    SimpleDocTemplate(str(tmp), pagesize=A4, title=f"Shift Report {shift_date.isoformat()}").build(story)
+    tmp.replace(path)
+    return path
+
+
+# ==============================
+# Background worker
+# ==============================
+_executor = None
+_pending = {}           # shift_date -> future; a failed one stays until Regenerate
+_lock = threading.Lock()
+POLL_INTERVAL = "3s"    # status check while a report is pending
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        # spawn: forking a threaded Streamlit server is unsafe
+        _executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+def request_report(frames: dict, shift_date: date, force: bool = False) -> str:
+    """
+    Make sure a report for shift_date exists or is being built.
+    Returns "ready", "pending", "open" (the night has not ended: no partial report is cached)
+    or "failed: <error>" (kept, not retried, until force).
+    """
+    if shift_date > last_closed_shift():
+        return "open"
+    path = report_path(shift_date)
+    with _lock:
+        future = _pending.get(shift_date)
+        if future is not None:
+            if not future.done():
+                return "pending"
+            if future.exception() is not None and not force:
+                return f"failed: {future.exception()}"
+            del _pending[shift_date]
+        if path.exists() and not force:
+            return "ready"
+        rows = shift_rows(frames, shift_date)
+        _pending[shift_date] = _get_executor().submit(generate_report, rows, shift_date, str(path))
+    return "pending"
+
+
+def shift_report_panel(frames: dict):
+    """Manager-view section: pick a shift date, generate in the background, download when ready."""
+    import streamlit as st
+
+    st.subheader("Night Shift Report (PDF)")
+    c1, c2 = st.columns([1, 1])
+    with c1:
+        last = last_closed_shift()
+        shift_date = st.date_input("Shift date (night starting)", value=last, max_value=last, key="shift_report_date")
+    with c2:
+        force = st.button("Regenerate Report", key="shift_report_regen")
+
+    state = request_report(frames, shift_date, force=force)
+    path = report_path(shift_date)
+
+    # while the report is pending only this status block reruns, until it is ready or failed
+    @st.fragment(run_every=POLL_INTERVAL if state == "pending" else None)
+    def _status():
+        state = request_report(frames, shift_date)
+        if state == "ready":
+            st.download_button(
+                label=f"Download Shift Report {shift_date.isoformat()}",
+                data=lambda: path.read_bytes(),
+                file_name=path.name,
+                mime="application/pdf",
+                key="shift_report_download",
+            )
+        elif state == "pending":
+            st.info("Report is being generated in the background; the download appears here when it is ready.")
+        elif state == "open":
+            st.info(f"The shift of {shift_date.isoformat()} has not closed yet; its report is built once the night window ends.")
+        else:
+            st.error(f"Report generation {state}. Click Regenerate Report to try again.")
+
+    _status()
+
+
+# ==============================
+# CLI (nightly cron)
+# ==============================
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate the night shift PDF report.")
+    parser.add_argument("--date", help="Shift date YYYY-MM-DD (default: last closed shift)")
+    parser.add_argument("--creds", default=os.environ.get("GOOGLE_APPLICATION_CREDENTIALS"),
+                        help="Service account JSON file")
+    args = parser.parse_args()
+
+    import storage
+
+    shift_date = date.fromisoformat(args.date) if args.date else last_closed_shift()
+    if shift_date > last_closed_shift():
+        parser.error(f"the shift of {shift_date.isoformat()} has not closed yet (last closed: {last_closed_shift()})")
+    sh = storage.open_spreadsheet(SHEET_NAME, storage.env_config(args.creds))
+    frames = {
+        "Spectrum": pd.DataFrame(sh.worksheet("Sheet1").get_all_records()),
+        "Insurance": pd.DataFrame(sh.worksheet("Sheet2").get_all_records()),
+    }
+    path = report_path(shift_date)
+    generate_report(shift_rows(frames, shift_date), shift_date, str(path))
+    print(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,482 @@
+# storage.py
+# Pluggable storage backends behind the gspread worksheet API.
+#
+# The apps only use a small subset of gspread's Worksheet. Every backend hands out worksheet
+# handles with that subset, so the dashboards run unchanged against:
+#   gsheets : Google Sheets through gspread (production)
+#   sqlite  : a local SQLite file (offline use, reproducible benchmarks)
+#   memory  : plain Python lists (load tests at 1M rows, no I/O at all)
+#
+# Worksheet protocol (positions are 1-based sheet rows, row 1 is the header):
+#   read snapshot : get_all_values(), get_all_records()
+#   read range    : get(range_name), col_values(col)
+#   append rows   : append_row(row), append_rows(rows)
+#   update rows   : update(range_name, values), update_cell(row, col, value)
+#   batch update  : batch_update([{"range": ..., "values": ...}, ...])
+#   delete        : delete_rows(start, end=None)
+#
+# revision(ws) is a cheap change token for the snapshot cache: the Drive file version for Google
+# Sheets (one tiny request per spreadsheet, shared by its worksheets for PROBE_INTERVAL seconds),
+# a write counter for the local backends.
+#
+# The backend is chosen by configuration: [storage] backend = "sqlite" in st.secrets, or the
+# TWH_STORAGE environment variable (default "gsheets"). TWH_SHEETS_ENDPOINT sends the gsheets
+# backend to a local fake_sheets_server.py instead of Google.
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import perf
+from schema import SHEET_COLUMNS
+
+BACKENDS = ["gsheets", "sqlite", "memory"]
+DEFAULT_SQLITE_PATH = "twh_sheets.db"
+PROBE_INTERVAL = 2.0    # seconds one Drive revision answer is reused for every worksheet
+
+_A1 = re.compile(r"^([A-Za-z]*)(\d*)$")
+
+
+# ==============================
+# A1 helpers
+# ==============================
+def col_index(letters: str) -> int:
+    """'A' -> 1, 'Q' -> 17, 'AA' -> 27."""
+    n = 0
+    for ch in letters.upper():
+        n = n * 26 + ord(ch) - 64
+    return n
+
+
+def parse_range(range_name: str):
+    """
+    A1 range -> (first_row, last_row, first_col, last_col), 1-based and inclusive.
+    Open ends ("A:P", "A5") are returned as None.
+    """
+    range_name = range_name.split("!")[-1]
+    start, _, end = range_name.partition(":")
+    m1, m2 = _A1.match(start), _A1.match(end or start)
+    if not m1 or not m2:
+        raise ValueError(f"Invalid range: {range_name}")
+    first_col = col_index(m1.group(1)) if m1.group(1) else 1
+    last_col = col_index(m2.group(1)) if m2.group(1) else None
+    first_row = int(m1.group(2)) if m1.group(2) else 1
+    last_row = int(m2.group(2)) if m2.group(2) else None
+    if not end:  # single cell: the range is anchored there, values decide the extent
+        last_row = last_col = None
+    return first_row, last_row, first_col, last_col
+
+
+def numericise(value):
+    """Same conversion gspread's get_all_records applies: numeric strings become int/float."""
+    if value == "" or not isinstance(value, str):
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def _cell(value) -> str:
+    return "" if value is None else str(value)
+
+
+# ==============================
+# Worksheet handles (sqlite / memory)
+# ==============================
+class TableWorksheet:
+    """
+    gspread-compatible worksheet built on four row primitives that each backend implements:
+    _read(first, last), _write(first, rows), _append(rows), _delete(first, last).
+    """
+
+    def __init__(self, title: str):
+        self.title = title
+        self._lock = threading.RLock()
+        self._writes = 0
+
+    def revision(self):
+        """Changes whenever a row is written, appended or deleted through this handle."""
+        return self._writes
+
+    # --- read snapshot ---
+    def get_all_values(self) -> list:
+        with self._lock:
+            return self._read(1, None)
+
+    def get_all_records(self) -> list:
+        values = self.get_all_values()
+        if not values:
+            return []
+        header = values[0]
+        return [
+            {key: numericise(row[i] if i < len(row) else "") for i, key in enumerate(header)}
+            for row in values[1:]
+        ]
+
+    # --- read range ---
+    def get(self, range_name: str) -> list:
+        first_row, last_row, first_col, last_col = parse_range(range_name)
+        with self._lock:
+            rows = self._read(first_row, last_row)
+        return [row[first_col - 1:last_col] for row in rows]
+
+    def col_values(self, col: int) -> list:
+        return [row[col - 1] if len(row) >= col else "" for row in self.get_all_values()]
+
+    # --- append rows ---
+    def append_row(self, values, **kwargs):
+        return self.append_rows([values])
+
+    def append_rows(self, values, **kwargs):
+        with self._lock:
+            self._append([[_cell(v) for v in row] for row in values])
+            self._writes += 1
+
+    # --- update rows ---
+    def update(self, range_name, values=None, **kwargs):
+        if values is None or isinstance(range_name, list):  # gspread also accepts update(values, range_name)
+            range_name, values = values, range_name
+        first_row, _, first_col, _ = parse_range(range_name or "A1")
+        with self._lock:
+            current = self._read(first_row, first_row + len(values) - 1)
+            patched = []
+            for i, new in enumerate(values):
+                row = list(current[i]) if i < len(current) else []
+                end = first_col - 1 + len(new)
+                row += [""] * (end - len(row))
+                row[first_col - 1:end] = [_cell(v) for v in new]
+                patched.append(row)
+            self._write(first_row, patched)
+            self._writes += 1
+
+    def update_cell(self, row: int, col: int, value):
+        self.update(f"{_col_letters(col)}{row}", [[value]])
+
+    def batch_update(self, data, **kwargs):
+        with self._lock:
+            for item in data:
+                self.update(item["range"], item["values"])
+
+    # --- delete ---
+    def delete_rows(self, start_index: int, end_index: int = None):
+        with self._lock:
+            self._delete(start_index, end_index or start_index)
+            self._writes += 1
+
+
+def _col_letters(col: int) -> str:
+    letters = ""
+    while col:
+        col, rem = divmod(col - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+class MemoryWorksheet(TableWorksheet):
+    def __init__(self, title: str, rows=None):
+        super().__init__(title)
+        self._rows = [list(r) for r in rows or []]
+
+    def _read(self, first, last):
+        return [list(r) for r in self._rows[first - 1:last]]
+
+    def _write(self, first, rows):
+        self._rows += [[] for _ in range(first - 1 + len(rows) - len(self._rows))]
+        self._rows[first - 1:first - 1 + len(rows)] = rows
+
+    def _append(self, rows):
+        self._rows.extend(rows)
+
+    def _delete(self, first, last):
+        del self._rows[first - 1:last]
+
+
+class SQLiteWorksheet(TableWorksheet):
+    """Rows stored as JSON arrays in one table; sheet row N is the N-th row by id."""
+
+    def __init__(self, title: str, conn: sqlite3.Connection, lock: threading.RLock):
+        super().__init__(title)
+        self._conn = conn
+        self._lock = lock  # one lock per connection, shared by its worksheets
+
+    def revision(self):
+        # data_version moves when another connection (e.g. import_leads.py) commits to the file
+        with self._lock:
+            return self._writes, self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _ids(self, first, last):
+        limit = -1 if last is None else last - first + 1
+        cur = self._conn.execute(
+            "SELECT id FROM rows WHERE sheet = ? ORDER BY id LIMIT ? OFFSET ?", (self.title, limit, first - 1)
+        )
+        return [r[0] for r in cur]
+
+    def _read(self, first, last):
+        limit = -1 if last is None else last - first + 1
+        cur = self._conn.execute(
+            "SELECT data FROM rows WHERE sheet = ? ORDER BY id LIMIT ? OFFSET ?", (self.title, limit, first - 1)
+        )
+        return [json.loads(r[0]) for r in cur]
+
+    def _write(self, first, rows):
+        with self._conn:
+            padding = first - 1 - self._count()
+            if padding > 0:  # writing below the last row, like a sheet with empty rows in between
+                self._conn.executemany("INSERT INTO rows (sheet, data) VALUES (?, '[]')", [(self.title,)] * padding)
+            ids = self._ids(first, first + len(rows) - 1)
+            self._conn.executemany(
+                "UPDATE rows SET data = ? WHERE id = ?", [(json.dumps(r), i) for r, i in zip(rows, ids)]
+            )
+            self._conn.executemany(
+                "INSERT INTO rows (sheet, data) VALUES (?, ?)", [(self.title, json.dumps(r)) for r in rows[len(ids):]]
+            )
+
+    def _count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM rows WHERE sheet = ?", (self.title,)).fetchone()[0]
+
+    def _append(self, rows):
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO rows (sheet, data) VALUES (?, ?)", [(self.title, json.dumps(r)) for r in rows]
+            )
+
+    def _delete(self, first, last):
+        ids = self._ids(first, last)
+        with self._conn:
+            self._conn.executemany("DELETE FROM rows WHERE id = ?", [(i,) for i in ids])
+
+
+# ==============================
+# Spreadsheets / backends
+# ==============================
+class TableSpreadsheet:
+    """Minimal gspread Spreadsheet stand-in: worksheet(title), worksheets(), sheet1."""
+
+    def __init__(self, title: str, factory):
+        self.title = title
+        self._factory = factory
+        self._worksheets = {}
+        self._lock = threading.Lock()
+
+    def worksheet(self, title: str):
+        with self._lock:
+            if title not in self._worksheets:
+                self._worksheets[title] = self._factory(title)
+            return self._worksheets[title]
+
+    def worksheets(self) -> list:
+        return [self.worksheet(t) for t in SHEET_COLUMNS] + [
+            ws for t, ws in self._worksheets.items() if t not in SHEET_COLUMNS
+        ]
+
+    @property
+    def sheet1(self):
+        return self.worksheet("Sheet1")
+
+
+class MemoryBackend:
+    """Worksheets live in process memory; each starts with its schema header row (or seeded rows)."""
+
+    def __init__(self, data: dict = None):
+        self._data = data or {}
+        self._spreadsheets = {}
+
+    def open(self, name: str) -> TableSpreadsheet:
+        def make(title):
+            rows = self._data.get(title)
+            return MemoryWorksheet(title, rows if rows is not None else [SHEET_COLUMNS.get(title, [])])
+        return self._spreadsheets.setdefault(name, TableSpreadsheet(name, make))
+
+
+class SQLiteBackend:
+    def __init__(self, path: str = DEFAULT_SQLITE_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.RLock()
+        self._spreadsheets = {}
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS rows (id INTEGER PRIMARY KEY AUTOINCREMENT, sheet TEXT NOT NULL, data TEXT NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS rows_sheet_id ON rows (sheet, id)")
+
+    def open(self, name: str) -> TableSpreadsheet:
+        def make(title):
+            ws = SQLiteWorksheet(title, self._conn, self._lock)
+            if title in SHEET_COLUMNS and not ws._count():
+                ws.append_row(SHEET_COLUMNS[title])
+            return ws
+        return self._spreadsheets.setdefault(name, TableSpreadsheet(name, make))
+
+
+class GSheetsBackend:
+    def __init__(self, credentials: dict = None, credentials_file: str = None, endpoint: str = None):
+        import gspread
+
+        if endpoint:  # local fake server (fake_sheets_server.py), no credentials needed
+            from fake_sheets_server import fake_client
+
+            self._gc = fake_client(endpoint)
+        elif credentials:
+            self._gc = gspread.service_account_from_dict(credentials)
+        else:
+            self._gc = gspread.service_account(filename=credentials_file)
+        self._gc.http_client.session.hooks["response"].append(perf.count_response)  # API calls / bytes
+        self._spreadsheets = {}
+        self._lock = threading.Lock()
+
+    def open(self, name: str):
+        with self._lock:
+            if name not in self._spreadsheets:
+                self._spreadsheets[name] = GSheetsSpreadsheet(self._gc.open(name))
+            return self._spreadsheets[name]
+
+
+class GSheetsSpreadsheet:
+    """
+    gspread Spreadsheet whose worksheet handles are kept for the life of the process.
+    gspread refetches the spreadsheet metadata on every worksheet() / sheet1 call, which is one
+    blocking round-trip per worksheet per rerun; here the metadata is read once and again only
+    when a title is not known yet (e.g. after add_worksheet). Everything else is delegated.
+    """
+
+    def __init__(self, spreadsheet):
+        self._spreadsheet = spreadsheet
+        self._worksheets = []
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        self._worksheets = self._spreadsheet.worksheets()
+
+    def worksheet(self, title: str):
+        import gspread
+
+        with self._lock:
+            ws = self._find(title)
+            if ws is None:  # first use, or a worksheet added since the last read
+                self._refresh()
+                ws = self._find(title)
+        if ws is None:
+            raise gspread.WorksheetNotFound(title)
+        return ws
+
+    def _find(self, title: str):
+        return next((ws for ws in self._worksheets if ws.title == title), None)
+
+    def worksheets(self) -> list:
+        with self._lock:
+            self._refresh()
+            return list(self._worksheets)
+
+    @property
+    def sheet1(self):
+        with self._lock:
+            if not self._worksheets:
+                self._refresh()
+            return self._worksheets[0]
+
+    def __getattr__(self, name):
+        return getattr(self._spreadsheet, name)
+
+
+# ==============================
+# Freshness probe
+# ==============================
+_revisions = {}        # spreadsheet id -> (checked_at, token)
+_revision_locks = {}
+_revision_guard = threading.Lock()
+
+
+def revision(ws, fresh: bool = False):
+    """
+    Cheap change token for ws: the same token means the worksheet has not changed since it was
+    taken. For Google Sheets this is the spreadsheet's Drive version, so an edit to any of its
+    worksheets changes it; fresh=True skips the PROBE_INTERVAL reuse (right before / after a write).
+    None when the backend cannot tell.
+    """
+    if isinstance(ws, TableWorksheet):
+        return ws.revision()
+    spreadsheet_id = getattr(ws, "spreadsheet_id", None)
+    if spreadsheet_id is None:
+        return None
+    with _revision_guard:
+        lock = _revision_locks.setdefault(spreadsheet_id, threading.Lock())
+    with lock:  # sheets probed together (prefetch) share one request
+        checked_at, token = _revisions.get(spreadsheet_id, (None, None))
+        if fresh or checked_at is None or time.monotonic() - checked_at >= PROBE_INTERVAL:
+            from gspread.urls import DRIVE_FILES_API_V3_URL
+
+            meta = ws.client.request(
+                "get", f"{DRIVE_FILES_API_V3_URL}/{spreadsheet_id}",
+                params={"fields": "version,modifiedTime", "supportsAllDrives": True},
+            ).json()
+            token = meta.get("version") or meta.get("modifiedTime")
+            _revisions[spreadsheet_id] = (time.monotonic(), token)
+        return token
+
+
+# ==============================
+# Configuration
+# ==============================
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def make_backend(config: dict):
+    backend = config.get("backend", "gsheets")
+    if backend == "gsheets":
+        return GSheetsBackend(config.get("credentials"), config.get("credentials_file"), config.get("endpoint"))
+    if backend == "sqlite":
+        return SQLiteBackend(config.get("path", DEFAULT_SQLITE_PATH))
+    if backend == "memory":
+        return MemoryBackend()
+    raise ValueError(f"Unknown storage backend {backend!r} (expected one of {', '.join(BACKENDS)})")
+
+
+def get_backend(config: dict):
+    """
+    Backend for config, created once per process. The memory backend in particular must be
+    shared, otherwise every Streamlit rerun would start from empty sheets.
+    """
+    key = (config.get("backend", "gsheets"), config.get("path"), config.get("credentials_file"), config.get("endpoint"))
+    with _backends_lock:
+        if key not in _backends:
+            _backends[key] = make_backend(config)
+        return _backends[key]
+
+
+def env_config(credentials_file: str = None) -> dict:
+    """
+    Config for CLI jobs: TWH_STORAGE / TWH_SQLITE_PATH, gspread credentials from a file.
+    TWH_SHEETS_ENDPOINT points the gsheets backend at a local fake server instead of Google.
+    """
+    return {
+        "backend": os.environ.get("TWH_STORAGE", "gsheets"),
+        "path": os.environ.get("TWH_SQLITE_PATH", DEFAULT_SQLITE_PATH),
+        "credentials_file": credentials_file,
+        "endpoint": os.environ.get("TWH_SHEETS_ENDPOINT"),
+    }
+
+
+def secrets_config(secrets) -> dict:
+    """Config for the Streamlit apps: [storage] table in st.secrets, falling back to the env."""
+    config = env_config()
+    try:
+        config.update(dict(secrets.get("storage", {})))
+    except Exception:  # no secrets.toml at all (offline run on the memory/sqlite backend)
+        pass
+    if config["backend"] == "gsheets" and not config.get("endpoint"):
+        config["credentials"] = secrets["gcp_service_account"]
+    return config
+
+
+def open_spreadsheet(name: str, config: dict):
+    return get_backend(config).open(name)
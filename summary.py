@@ -0,0 +1,276 @@
+# summary.py
+# Shift-close summaries: a few rows per closed night window instead of the raw history.
+#
+# Once a night window (7 PM -> 6 AM, Asia/Karachi) has closed, the shift-close job computes its
+# totals once, per Sheet and per member of each dimension (Total, Agent Name, LLC, Provider, Status):
+#   Shift, Sheet, Dimension, Member, Transactions, Amount, Charged, Charged Amount, Closed At
+# and appends them to the "Summary" worksheet and to a local cache (TWH_SUMMARY_CACHE, default
+# .summaries/summary.csv). Month-to-date figures and the nightly history on the manager
+# dashboards read these rows (a few dozen per night) rather than the transaction sheets.
+#
+# A shift already in the Summary worksheet is skipped, so the job is safe to rerun. Statuses that
+# change after the close (chargebacks) are not folded back in; --force recomputes a shift, and
+# chargebacks.py tracks chargeback rates from the live data.
+#
+# Usage (cron, after the shift closes):
+#   python summary.py --creds service_account.json
+#   python summary.py --from 2026-10-01 --to 2026-10-17 --force    # backfill / refresh
+#
+# Each run ends by copying the whole Summary worksheet into the local cache. The apps read the
+# Summary worksheet through the shared snapshot cache, so shifts closed from any host show up;
+# the local cache is the fallback when the worksheet cannot be read.
+
+import os
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from pathlib import Path
+
+import pandas as pd
+import pytz
+
+import archive
+import schema
+from shift_report import last_closed_shift, shift_rows, shift_window
+
+tz = pytz.timezone("Asia/Karachi")
+SHEET_NAME = "Company_Transactions"
+SUMMARY_TITLE = "Summary"
+SUMMARY_PATH = Path(os.environ.get("TWH_SUMMARY_CACHE", ".summaries/summary.csv"))
+SHEETS = {"Spectrum": "Sheet1", "Insurance": "Sheet2"}
+DIMENSIONS = ["Total", "Agent Name", "LLC", "Provider", "Status"]
+COLUMNS = [
+    "Shift", "Sheet", "Dimension", "Member", "Transactions", "Amount", "Charged", "Charged Amount", "Closed At",
+]
+MEASURES = ["Transactions", "Amount", "Charged", "Charged Amount"]
+
+
+# ==============================
+# Computing a shift's rows
+# ==============================
+def summarize(rows: pd.DataFrame, shift_date: date) -> pd.DataFrame:
+    """Summary rows of one shift from its transactions (shift_report.shift_rows)."""
+    if rows.empty:
+        return pd.DataFrame(columns=COLUMNS)
+    charged = rows["Status"] == "Charged"
+    facts = pd.DataFrame({
+        "Sheet": rows["Sheet"],
+        "Amount": rows["ChargeFloat"],
+        "Charged": charged.astype("int64"),
+        "Charged Amount": rows["ChargeFloat"].where(charged, 0.0),
+    })
+    parts = []
+    for dim in DIMENSIONS:
+        if dim == "Total":
+            member = pd.Series("All", index=rows.index)
+        elif dim in rows.columns:
+            member = rows[dim].astype("string").str.strip()  # missing (Insurance has no Provider) -> dropped
+        else:
+            continue
+        grouped = facts.groupby([facts["Sheet"], member.rename("Member")], sort=True).agg(
+            Transactions=("Amount", "size"), Amount=("Amount", "sum"),
+            Charged=("Charged", "sum"), **{"Charged Amount": ("Charged Amount", "sum")},
+        )
+        parts.append(grouped.reset_index().assign(Dimension=dim))
+    out = pd.concat(parts, ignore_index=True)
+    out = out[out["Member"] != ""]
+    out["Shift"] = shift_date.isoformat()
+    out["Closed At"] = datetime.now(tz).strftime(schema.TIMESTAMP_FORMAT)
+    out[["Amount", "Charged Amount"]] = out[["Amount", "Charged Amount"]].round(2)
+    return out[COLUMNS].reset_index(drop=True)
+
+
+def live_frames(sh) -> dict:
+    return {label: pd.DataFrame(sh.worksheet(sheet).get_all_records()) for label, sheet in SHEETS.items()}
+
+
+def shift_frames(sh, shift_date: date, live: dict = None) -> dict:
+    """{label: rows} of the live sheets (read once per backfill via live) plus archived partitions covering the shift."""
+    start, end = shift_window(shift_date)
+    live = live if live is not None else live_frames(sh)
+    frames = {}
+    for label, sheet in SHEETS.items():
+        archived = archive.load_range(sheet, start, end, sh)
+        frames[label] = pd.concat([live[label], archived], ignore_index=True) if not archived.empty else live[label]
+    return frames
+
+
+# ==============================
+# Local cache + Summary worksheet
+# ==============================
+def _open_summary_sheet(sh):
+    import gspread
+
+    try:
+        ws = sh.worksheet(SUMMARY_TITLE)
+    except gspread.WorksheetNotFound:
+        ws = sh.add_worksheet(title=SUMMARY_TITLE, rows=1000, cols=len(COLUMNS))
+    if not any(cell for row in ws.get("A1:I1") for cell in row):
+        ws.update(values=[COLUMNS], range_name="A1")
+    return ws
+
+
+def write_cache(rows: pd.DataFrame, replace_shifts=None):
+    """Put rows into the local cache, replacing what it held for replace_shifts (None: everything)."""
+    cached = load_cache() if replace_shifts is not None else pd.DataFrame(columns=COLUMNS)
+    cached = cached[~cached["Shift"].isin(set(replace_shifts or []))]
+    merged = pd.concat([cached, rows], ignore_index=True) if not cached.empty else rows
+    SUMMARY_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = SUMMARY_PATH.with_suffix(".tmp")
+    merged.sort_values(["Shift", "Sheet", "Dimension", "Member"]).to_csv(tmp, index=False)
+    os.replace(tmp, SUMMARY_PATH)
+
+
+def sync_cache(sh) -> int:
+    """Replace the local cache with the Summary worksheet (shifts closed from other hosts included)."""
+    values = _open_summary_sheet(sh).get_all_values()
+    rows = pd.DataFrame([r + [""] * (len(COLUMNS) - len(r)) for r in values[1:]], columns=COLUMNS)
+    write_cache(rows)
+    return len(rows)
+
+
+def close_shift(sh, shift_date: date, force: bool = False, live: dict = None):
+    """
+    Summarize one closed shift into the Summary worksheet and the local cache.
+    Returns the rows written, or None when the worksheet already has the shift (and not force).
+    """
+    shift = shift_date.isoformat()
+    ws = _open_summary_sheet(sh)
+    held = [i for i, value in enumerate(ws.col_values(1), start=1) if i > 1 and value == shift]
+    if held and not force:
+        return None
+    rows = summarize(shift_rows(shift_frames(sh, shift_date, live), shift_date), shift_date)
+    for start, end in archive.row_runs(held):
+        ws.delete_rows(start, end)
+    if not rows.empty:
+        ws.append_rows(rows.values.tolist(), value_input_option="RAW")
+    write_cache(rows, [shift])
+    return rows
+
+
+# ==============================
+# Readers used by the apps
+# ==============================
+def load_cache() -> pd.DataFrame:
+    try:
+        mtime = SUMMARY_PATH.stat().st_mtime
+    except OSError:
+        return pd.DataFrame(columns=COLUMNS)
+    return _read_cache(str(SUMMARY_PATH), mtime).copy(deep=False)
+
+
+@lru_cache(maxsize=4)
+def _read_cache(path: str, mtime: float) -> pd.DataFrame:
+    return pd.read_csv(path, dtype={"Shift": str, "Sheet": str, "Dimension": str, "Member": str},
+                       keep_default_na=False)
+
+
+def load(sh=None) -> pd.DataFrame:
+    """Summary rows: the Summary worksheet (shared snapshot), else this host's local cache."""
+    if sh is None:
+        return load_cache()
+    from data_layer import get_records_df
+
+    try:
+        rows = get_records_df(sh.worksheet(SUMMARY_TITLE))
+    except Exception:  # no Summary worksheet yet, or Sheets unreachable: this host's copy
+        return load_cache()
+    if rows.empty or "Shift" not in rows.columns:
+        return load_cache()
+    rows = rows.astype({"Shift": str, "Member": str})
+    for col in MEASURES:
+        rows[col] = pd.to_numeric(rows[col], errors="coerce").fillna(0)
+    return rows
+
+
+def month_rows(summaries: pd.DataFrame, month: date) -> pd.DataFrame:
+    """Rows of the shifts that started in month."""
+    return summaries[summaries["Shift"].str.startswith(month.strftime("%Y-%m"))]
+
+
+def totals(summaries: pd.DataFrame, dimension: str) -> pd.DataFrame:
+    """MEASURES summed per member of dimension over the given rows (both sheets), by Charged Amount."""
+    rows = summaries[summaries["Dimension"] == dimension]
+    out = rows.groupby("Member", sort=False)[MEASURES].sum()
+    return out.sort_values("Charged Amount", ascending=False)
+
+
+def nightly(summaries: pd.DataFrame) -> pd.DataFrame:
+    """One row per shift: MEASURES of the Total dimension over both sheets, latest first."""
+    rows = summaries[summaries["Dimension"] == "Total"]
+    return rows.groupby("Shift")[MEASURES].sum().sort_index(ascending=False)
+
+
+def summary_panel(sh=None):
+    """Manager-view section: month-to-date figures and the nightly history from closed shifts."""
+    import streamlit as st
+
+    st.subheader("Closed Shifts — Month to Date")
+    summaries = load(sh)
+    if summaries.empty:
+        st.info("No closed shifts summarized yet. Run `python summary.py` after the shift closes.")
+        return
+
+    months = sorted({s[:7] for s in summaries["Shift"]}, reverse=True)
+    month = st.selectbox("Month", months, key="summary_month")
+    rows = month_rows(summaries, date.fromisoformat(month + "-01"))
+    nights = nightly(rows)
+
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("Charged Total", f"${nights['Charged Amount'].sum():,.2f}")
+    m2.metric("Transactions", f"{int(nights['Transactions'].sum()):,}")
+    m3.metric("Shifts Closed", f"{len(nights)}")
+    if not nights.empty:
+        m4.metric(f"Best Night ({nights['Charged Amount'].idxmax()})", f"${nights['Charged Amount'].max():,.2f}")
+
+    c1, c2 = st.columns(2)
+    with c1:
+        st.caption("Top agents (charged)")
+        st.dataframe(totals(rows, "Agent Name")[["Charged", "Charged Amount"]], use_container_width=True)
+    with c2:
+        st.caption("Status counts")
+        st.dataframe(totals(rows, "Status")[["Transactions", "Amount"]], use_container_width=True)
+    st.caption("Nightly totals")
+    st.dataframe(nights, use_container_width=True)
+
+
+# ==============================
+# CLI (cron, after the shift closes)
+# ==============================
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarize closed night shifts into the Summary worksheet.")
+    parser.add_argument("--date", help="Shift date YYYY-MM-DD (default: last closed shift)")
+    parser.add_argument("--from", dest="start", help="first shift date of a backfill")
+    parser.add_argument("--to", dest="end", help="last shift date of a backfill (default: last closed shift)")
+    parser.add_argument("--force", action="store_true", help="recompute shifts already summarized")
+    parser.add_argument("--creds", default=os.environ.get("GOOGLE_APPLICATION_CREDENTIALS"),
+                        help="Service account JSON file")
+    args = parser.parse_args()
+
+    import storage
+
+    last = last_closed_shift()
+    if args.start:
+        first, final = date.fromisoformat(args.start), date.fromisoformat(args.end) if args.end else last
+    else:
+        first = final = date.fromisoformat(args.date) if args.date else last
+    if final > last:
+        parser.error(f"the shift of {final.isoformat()} has not closed yet (last closed: {last.isoformat()})")
+
+    sh = storage.open_spreadsheet(SHEET_NAME, storage.env_config(args.creds))
+    live = live_frames(sh)
+    day = first
+    while day <= final:
+        rows = close_shift(sh, day, force=args.force, live=live)
+        if rows is None:
+            print(f"{day.isoformat()}: already summarized (use --force to recompute)")
+        else:
+            total = rows[rows["Dimension"] == "Total"]["Charged Amount"].sum()
+            print(f"{day.isoformat()}: {len(rows)} summary row(s), charged ${total:,.2f}")
+        day += timedelta(days=1)
+    print(f"{SUMMARY_PATH}: {sync_cache(sh)} summary row(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# synthetic_data.py
+# Realistic fake Company_Transactions data for offline runs and benchmarks.
+#
+# Rows follow the worksheet layouts in schema.SHEET_COLUMNS and look like what agents actually
+# type: submissions clustered in the night shift, mostly Pending/Charged, a few Order IDs
+# entered twice, and charge strings in every format the sheet has seen ("$29.00", "29",
+# " 1,299.5 ", "N/A"). Generation is vectorized and seeded, so the same (sheet, rows, seed)
+# always gives the same data.
+#
+# Usage:
+#   python synthetic_data.py --rows 100000 --sheet Sheet1 --out spectrum.csv
+
+import hashlib
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from schema import AGENTS, LLC_OPTIONS, PROVIDERS, SHEET_COLUMNS, STATUSES
+
+FIRST_NAMES = ["James", "Maria", "Robert", "Linda", "Michael", "Patricia", "David", "Jennifer",
+               "William", "Elizabeth", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah"]
+LAST_NAMES = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis",
+              "Rodriguez", "Martinez", "Hernandez", "Lopez", "Wilson", "Anderson", "Taylor", "Moore"]
+STREETS = ["Main St", "Oak Ave", "Pine Rd", "Maple Dr", "Cedar Ln", "Elm St", "Lake View", "Park Blvd"]
+STATUS_WEIGHTS = [0.35, 0.45, 0.15, 0.05]       # Pending, Charged, Declined, Charge Back
+PROVIDER_WEIGHTS = [0.6, 0.1, 0.12, 0.1, 0.08]  # Spectrum dominates Sheet1
+DUPLICATE_RATE = 0.002
+DEMO_USERS = [("manager", "Manager", ""), ("haziq", "Agent", "Haziq"), ("arham", "Agent", "Arham Ali")]
+
+
+def _pick(rng, options, n, p=None) -> np.ndarray:
+    return np.asarray(options, dtype=object)[rng.choice(len(options), size=n, p=p)]
+
+
+def _digits(rng, n: int, width: int) -> pd.Series:
+    return pd.Series(rng.integers(0, 10 ** width, size=n)).astype(str).str.zfill(width)
+
+
+def _charges(rng, n: int) -> pd.Series:
+    amount = np.round(rng.gamma(2.0, 60.0, size=n), 2)
+    plain = pd.Series(amount).map(lambda v: f"{v:g}")
+    style = rng.choice(6, size=n, p=[0.55, 0.25, 0.08, 0.06, 0.04, 0.02])
+    out = pd.Series(amount).map(lambda v: f"${v:.2f}")
+    out = out.where(style != 1, plain)
+    out = out.where(style != 2, " " + pd.Series(amount).map(lambda v: f"{v:,.1f}") + " ")
+    out = out.where(style != 3, "$" + plain)
+    out = out.where(style != 4, "")
+    return out.where(style != 5, "N/A")
+
+
+def generate_frame(sheet: str = "Sheet1", rows: int = 1000, seed: int = 0,
+                   months: int = 6, end: datetime = None) -> pd.DataFrame:
+    """DataFrame with the columns of sheet (Sheet1/Sheet2), all values as sheet-style strings."""
+    rng = np.random.default_rng(seed)
+    n = rows
+    end = end or datetime(2026, 10, 1)
+    start = end - timedelta(days=30 * months)
+
+    # Timestamps: mostly inside the 7 PM - 6 AM night shift
+    days = rng.integers(0, (end - start).days, size=n)
+    night = rng.random(n) < 0.85
+    hour = np.where(night, (19 + rng.integers(0, 11, size=n)) % 24, rng.integers(6, 19, size=n))
+    seconds = days * 86400 + hour * 3600 + rng.integers(0, 3600, size=n)
+    ts = pd.Series(pd.Timestamp(start) + pd.to_timedelta(np.sort(seconds), unit="s"))
+
+    first = _pick(rng, FIRST_NAMES, n)
+    last = _pick(rng, LAST_NAMES, n)
+    name = pd.Series(first) + " " + pd.Series(last)
+    ids = "TWH" + pd.Series(np.arange(n)).astype(str).str.zfill(7)
+    dup = rng.random(n) < DUPLICATE_RATE
+    ids = ids.where(~dup, ids.shift(1).fillna(ids))  # re-entered Order IDs
+
+    frame = pd.DataFrame({
+        "Record_ID": ids,
+        "Agent Name": _pick(rng, AGENTS, n),
+        "Name": name,
+        "Ph Number": "+1" + _digits(rng, n, 10),
+        "Address": pd.Series(rng.integers(1, 9999, size=n)).astype(str) + " " + _pick(rng, STREETS, n),
+        "Email": (pd.Series(first).str.lower() + "." + pd.Series(last).str.lower()
+                  + pd.Series(rng.integers(1, 999, size=n)).astype(str) + "@example.com"),
+        "Card Holder Name": name,
+        "Card Number": "4" + _digits(rng, n, 15),
+        "Expiry Date": pd.Series(rng.integers(1, 13, size=n)).astype(str).str.zfill(2)
+                       + pd.Series(rng.integers(26, 32, size=n)).astype(str),
+        "CVC": _digits(rng, n, 3),
+        "Charge": _charges(rng, n),
+        "LLC": _pick(rng, LLC_OPTIONS, n),
+        "Provider": _pick(rng, PROVIDERS, n, PROVIDER_WEIGHTS),
+        "Date of Charge": ts.dt.strftime("%Y-%m-%d"),
+        "Status": _pick(rng, STATUSES, n, STATUS_WEIGHTS),
+        "Timestamp": ts.dt.strftime("%Y-%m-%d %I:%M:%S %p"),
+    })
+    frame["PIN CODE"] = _digits(rng, n, 4).where(frame["Provider"] == "Spectrum", "Nil")
+    return frame.reindex(columns=SHEET_COLUMNS[sheet])
+
+
+def user_rows() -> list:
+    """Sheet3 rows (header first) for the demo users; each password equals the user ID."""
+    rows = [SHEET_COLUMNS["Sheet3"]]
+    for user_id, role, agent in DEMO_USERS:
+        rows.append([user_id, hashlib.sha256(user_id.encode()).hexdigest(), role, agent])
+    return rows
+
+
+def generate_rows(sheet: str = "Sheet1", rows: int = 1000, seed: int = 0, **kwargs) -> list:
+    """Worksheet values (header row first), as returned by get_all_values()."""
+    if sheet == "Sheet3":
+        return user_rows()
+    frame = generate_frame(sheet, rows, seed, **kwargs)
+    return [list(frame.columns)] + frame.values.tolist()
+
+
+def generate_workbook(rows: int = 1000, seed: int = 0) -> dict:
+    """{worksheet title: values} for the whole Company_Transactions spreadsheet."""
+    return {
+        "Sheet1": generate_rows("Sheet1", rows, seed),
+        "Sheet2": generate_rows("Sheet2", max(rows // 4, 1), seed + 1),
+        "Sheet3": user_rows(),
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate synthetic Company_Transactions rows as CSV.")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--sheet", default="Sheet1", choices=["Sheet1", "Sheet2"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+    generate_frame(args.sheet, args.rows, args.seed).to_csv(args.out, index=False)
+    print(args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# Regression tests for journal.apply (run from the repo root: python -m pytest tests)
+import json
+
+import pandas as pd
+
+import journal
+
+ROW = {"Record_ID": "", "Name": "", "Card Number": "", "CVC": "", "Charge": "", "Status": ""}
+
+
+def frame(*ids):
+    return pd.DataFrame([{**ROW, "Record_ID": rid, "Name": f"name {rid}", "Status": "Pending"} for rid in ids])
+
+
+def edit(rid, field, old, new):
+    return journal.edits("Sheet1", {"Record_ID": rid, field: old}, {field: new}, "test")
+
+
+def test_edit_applies_by_record_id():
+    out = journal.apply(frame("1", "2"), edit("2", "Status", "Pending", "Charged"))
+    assert out["Status"].tolist() == ["Pending", "Charged"]
+
+
+def test_duplicate_record_ids_force_a_download():
+    df = frame("1", "2", "1")
+    assert journal.apply(df, edit("1", "Status", "Pending", "Charged")) is None
+    assert journal.apply(df, [journal.delete("Sheet1", {"Record_ID": "1"}, "test")]) is None
+    assert journal.apply(df, edit("2", "Status", "Pending", "Charged")) is not None
+
+
+def test_insert_onto_an_existing_record_id_forces_a_download():
+    entry = journal.insert("Sheet1", {**ROW, "Record_ID": "2", "Name": "again"}, "test")
+    assert journal.apply(frame("1", "2"), [entry]) is None
+
+
+def test_insert_then_edit_of_the_new_row():
+    entries = [journal.insert("Sheet1", {**ROW, "Record_ID": "3", "Name": "new", "Status": "Pending"}, "test")]
+    entries += edit("3", "Status", "Pending", "Charged")
+    out = journal.apply(frame("1", "2"), entries)
+    assert out["Record_ID"].astype(str).tolist() == ["1", "2", "3"]
+    assert out["Status"].tolist() == ["Pending", "Pending", "Charged"]
+
+
+def test_rename_then_edits_in_the_same_batch():
+    entries = edit("1", "Record_ID", "1", "10")
+    entries += edit("10", "Status", "Pending", "Charged")
+    entries += edit("10", "Name", "name 1", "renamed")
+    out = journal.apply(frame("1", "2"), entries)
+    assert out["Record_ID"].astype(str).tolist() == ["10", "2"]
+    assert out["Status"].tolist() == ["Charged", "Pending"]
+    assert out["Name"].tolist() == ["renamed", "name 2"]
+    # the old Record_ID no longer names a row
+    assert journal.apply(frame("1", "2"), entries + edit("1", "Status", "Charged", "Declined")) is None
+
+
+def test_rename_onto_an_existing_record_id_makes_it_ambiguous():
+    entries = edit("1", "Record_ID", "1", "2") + edit("2", "Status", "Pending", "Charged")
+    assert journal.apply(frame("1", "2"), entries) is None
+
+
+def test_card_details_are_redacted_and_not_replayed():
+    row = {**ROW, "Record_ID": "3", "Card Number": "4111111111111111", "CVC": "012"}
+    entry = journal.insert("Sheet1", row, "test")
+    assert "4111111111111111" not in json.dumps(entry)
+    assert json.loads(entry["New"])["CVC"] == journal.REDACTED
+    assert journal.apply(frame("1", "2"), [entry]) is None
+
+    entries = edit("1", "CVC", "123", "456")
+    assert (entries[0]["Old"], entries[0]["New"]) == (journal.REDACTED, journal.REDACTED)
+    assert journal.apply(frame("1", "2"), entries) is None
@@ -0,0 +1,137 @@
+# theme.py
+# Theme assets shared by the apps, compiled once per process.
+#
+# theme.css is read and minified on first use, and every palette below is pre-rendered to a
+# minified :root block (--bg1, --bg2, --accent, --on-accent, --text). Pages colour themed
+# elements with var(--accent) / var(--on-accent) rather than Python strings, so nothing outside
+# theme_picker() depends on the selected theme. theme_picker() is a fragment: a palette or
+# Light/Dark click reruns only the picker, which swaps the variables block in place; the page
+# above and below it (and its worksheets) is not rerun.
+
+import random
+import re
+from functools import lru_cache
+from pathlib import Path
+
+import streamlit as st
+
+CSS_PATH = Path(__file__).with_name("theme.css")
+
+LIGHT_THEMES = {
+    "Sunlit Coral":    {"bg1": "#fff8f2", "bg2": "#ffe8df", "accent": "#ff6f61"},
+    "Skyline Blue":    {"bg1": "#f0f8ff", "bg2": "#dcefff", "accent": "#3b82f6"},
+    "Golden Sand":     {"bg1": "#fffbea", "bg2": "#fff2d1", "accent": "#f59e0b"},
+    "Lilac Mist":      {"bg1": "#faf5ff", "bg2": "#f3e8ff", "accent": "#a78bfa"},
+    "Mint Breeze":     {"bg1": "#f0fff9", "bg2": "#d7fff0", "accent": "#10b981"},
+    "Blush Quartz":    {"bg1": "#fff5f7", "bg2": "#ffe3eb", "accent": "#ec4899"},
+    "Azure Frost":     {"bg1": "#f5fbff", "bg2": "#e0f2fe", "accent": "#0284c7"},
+    "Citrus Bloom":    {"bg1": "#fffef2", "bg2": "#fff8d6", "accent": "#facc15"},
+    "Pearl Sage":      {"bg1": "#f9fff9", "bg2": "#e6f7e6", "accent": "#65a30d"},
+    "Creamy Mocha":    {"bg1": "#fffaf5", "bg2": "#f5ebe0", "accent": "#c08457"},
+}
+DARK_THEMES = {
+    "Midnight Gold":   {"bg1": "#0d0d0d", "bg2": "#1a1a1a", "accent": "#ffd700"},
+    "Obsidian Night":  {"bg1": "#0b0c10", "bg2": "#1f2833", "accent": "#66fcf1"},
+    "Crimson":  {"bg1": "#1c0b0b", "bg2": "#2a0f0f", "accent": "#ff4444"},
+    "Neon Violet":     {"bg1": "#12001e", "bg2": "#1e0033", "accent": "#bb00ff"},
+    "Emerald Abyss":   {"bg1": "#001a14", "bg2": "#00322b", "accent": "#00ff99"},
+    "Cyber Pink":      {"bg1": "#0a0014", "bg2": "#1a0033", "accent": "#ff00aa"},
+    "Deep Ocean":      {"bg1": "#0a1b2a", "bg2": "#0d2c4a", "accent": "#1f8ef1"},
+    "Steel Indigo":    {"bg1": "#0c0f1a", "bg2": "#1c2333", "accent": "#7dd3fc"},
+    "Velvet Crimson":  {"bg1": "#1a0000", "bg2": "#330000", "accent": "#e11d48"},
+    "Arctic Noir":     {"bg1": "#050b12", "bg2": "#0e1822", "accent": "#38bdf8"},
+}
+MODES = {"Light": LIGHT_THEMES, "Dark": DARK_THEMES}
+TEXT_COLORS = {"Light": "#111", "Dark": "#e6e6e6"}
+
+
+def get_contrast_color(hex_color: str) -> str:
+    hex_color = hex_color.lstrip('#')
+    r, g, b = tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+    brightness = (r * 299 + g * 587 + b * 114) / 1000
+    return "#000000" if brightness > 155 else "#ffffff"
+
+
+def minify(css: str) -> str:
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    css = re.sub(r":\s+", ":", css)
+    return css.replace(";}", "}").strip()
+
+
+def _vars_block(mode: str, colors: dict) -> str:
+    return minify(
+        f":root {{ --bg1: {colors['bg1']}; --bg2: {colors['bg2']}; --accent: {colors['accent']}; "
+        f"--on-accent: {get_contrast_color(colors['accent'])}; --text: {TEXT_COLORS[mode]}; }}"
+    )
+
+
+# (mode, theme name) -> "<style>...</style>", built once at import
+THEME_VARS = {
+    (mode, name): f"<style>{_vars_block(mode, colors)}</style>"
+    for mode, themes in MODES.items()
+    for name, colors in themes.items()
+}
+
+
+@lru_cache(maxsize=1)
+def base_css() -> str:
+    """theme.css, minified, wrapped in a <style> tag. Read from disk once per process."""
+    return f"<style>{minify(CSS_PATH.read_text(encoding='utf-8'))}</style>"
+
+
+def load_css():
+    try:
+        st.markdown(base_css(), unsafe_allow_html=True)
+    except Exception as e:
+        st.warning(f"theme.css not found or failed to load: {e}")
+
+
+def init_state():
+    if "theme_mode" not in st.session_state:
+        st.session_state.theme_mode = "Dark"
+    themes = MODES[st.session_state.theme_mode]
+    if st.session_state.get("selected_theme") not in themes:
+        st.session_state.selected_theme = random.choice(list(themes.keys()))
+
+
+def _set_mode(mode: str):
+    if st.session_state.theme_mode != mode:
+        st.session_state.theme_mode = mode
+        st.session_state.selected_theme = list(MODES[mode].keys())[0]
+
+
+def _set_theme(name: str):
+    st.session_state.selected_theme = name
+
+
+@st.fragment
+def theme_picker():
+    """Light/Dark buttons, the palette row and the active variables block."""
+    col_tm1, col_tm2, _ = st.columns([1, 1, 6])
+    col_tm1.button("Light Mode", use_container_width=True, on_click=_set_mode, args=("Light",))
+    col_tm2.button("Dark Mode", use_container_width=True, on_click=_set_mode, args=("Dark",))
+
+    themes = MODES[st.session_state.theme_mode]
+    cols_palette = st.columns(len(themes))
+    for i, theme_name in enumerate(themes):
+        cols_palette[i].button(
+            theme_name.replace(" ", "\n"), key=f"theme_{theme_name}", on_click=_set_theme, args=(theme_name,)
+        )
+    st.markdown(THEME_VARS[(st.session_state.theme_mode, st.session_state.selected_theme)], unsafe_allow_html=True)
+
+
+def apply_theme(title: str = "Client Management System — Techware Hub"):
+    """Base CSS, title banner and theme picker, in the order the pages show them."""
+    init_state()
+    load_css()
+    st.markdown(
+        f"""
+<div class="app-title" style="font-size:22px; margin: 12px 0 22px;">
+  {title}
+</div>
+""",
+        unsafe_allow_html=True,
+    )
+    theme_picker()